@@ -0,0 +1,135 @@
+"""
+Knowledge base agents
+Load fresh shared research for the target company before researching, and
+save what this run fetched afterwards
+"""
+import time
+from utils.state import ResearchState
+from utils.knowledge_base import get_knowledge_base
+from utils.entities import resolve_company
+from agents.research import financial_source_ref
+from utils.metrics import record_cache
+
+# Shared research sources and the workflow node that produces each one
+SOURCE_NODES = {
+    "web_results": "web_search",
+    "financial_data": "financial",
+    "wiki_data": "wikipedia",
+    "news_data": "news",
+    "conflicts": "verification",
+    "synthesized_data": "synthesis",
+}
+
+SOURCE_LABELS = {
+    "web_results": "web",
+    "financial_data": "financials",
+    "wiki_data": "Wikipedia",
+    "news_data": "news",
+    "conflicts": "verification",
+    "synthesized_data": "synthesis",
+}
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 90:
+        return "just now"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f} min ago"
+    if seconds < 2 * 86400:
+        return f"{seconds / 3600:.0f} h ago"
+    return f"{seconds / 86400:.0f} days ago"
+
+
+def load_profile_node(state: ResearchState) -> ResearchState:
+    """
+    Knowledge base agent - reuses fresh research about the target company
+    Reused sources are marked complete so their research nodes are skipped
+    """
+    company = state.get('target_company_name', '')
+    resolved = resolve_company(company)
+    entity_key = resolved['canonical_id']
+
+    state['profile_key'] = entity_key
+    state['reused_sources'] = []
+    if resolved['suggestion']:
+        state['progress_messages'].append(
+            f"💡 Researching \"{company}\" as entered - did you mean {resolved['suggestion']}?"
+        )
+
+    kb = get_knowledge_base()
+    if kb is None or not entity_key:
+        return state
+
+    try:
+        values, fetched_at, _ = kb.load_fresh(entity_key)
+    except Exception as e:
+        state['progress_messages'].append(f"⚠️ Knowledge base lookup failed: {str(e)}")
+        return state
+
+    record_cache("knowledge_base", hits=len(values), misses=len(SOURCE_NODES) - len(values))
+    if not values:
+        return state
+
+    completed = list(state.get('completed_nodes') or [])
+    for source, value in values.items():
+        state[source] = value
+        state['reused_sources'].append(source)
+        completed.append(SOURCE_NODES[source])
+    state['completed_nodes'] = completed
+
+    # Rebuild source attributions the skipped nodes would have added
+    sources = list(state.get('sources') or [])
+    financial_data = values.get('financial_data')
+    if financial_data:
+        sources.append(financial_source_ref(company, financial_data.get('ticker', ''),
+                                            financial_data.get('source', '')))
+    wiki_data = values.get('wiki_data')
+    if wiki_data:
+        sources.append({
+            "title": f"{wiki_data.get('title', company)} - Wikipedia",
+            "url": wiki_data.get('url', ''),
+            "confidence": wiki_data.get('confidence', 0.85)
+        })
+    state['sources'] = sources
+
+    oldest = time.time() - min(fetched_at.values())
+    labels = ", ".join(SOURCE_LABELS[s] for s in SOURCE_NODES if s in values)
+    state['progress_messages'].append(
+        f"♻️ Reusing saved research for {company}: {labels} (oldest fetched {_format_age(oldest)})"
+    )
+    return state
+
+
+def save_profile_node(state: ResearchState) -> ResearchState:
+    """Knowledge base agent - saves the shared research fetched in this run"""
+    kb = get_knowledge_base()
+    entity_key = state.get('profile_key')
+    if kb is None or not entity_key:
+        return state
+
+    reused = set(state.get('reused_sources') or [])
+    completed = set(state.get('completed_nodes') or [])
+    fetched = {
+        source: state.get(source)
+        for source, node in SOURCE_NODES.items()
+        if node in completed and source not in reused
+    }
+    # A failed synthesis is not worth remembering
+    if fetched.get('synthesized_data') is None:
+        fetched.pop('synthesized_data', None)
+    if not fetched:
+        return state
+
+    financial_data = state.get('financial_data') or {}
+    ticker = financial_data.get('ticker')
+    try:
+        kb.save(
+            entity_key,
+            state.get('target_company_name', ''),
+            fetched,
+            ticker=ticker
+        )
+    except Exception as e:
+        state['progress_messages'].append(f"⚠️ Could not save research to knowledge base: {str(e)}")
+
+    return state
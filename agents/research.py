@@ -8,20 +8,27 @@ from dotenv import load_dotenv
 from tavily import TavilyClient
 import wikipedia
 import yfinance as yf
-import feedparser
 from datetime import datetime
 from langchain_google_genai import ChatGoogleGenerativeAI
 from utils.state import ResearchState, UserCompanyResearch
+from utils.dedup import dedupe_items, news_title_key
+from utils.entities import resolve_company
+from utils.metrics import InstrumentedLLM, instrument_call, record_retry, submit_with_context
+from utils.cassettes import CassetteLLM, cassette_call
+from utils.tracing import KIND_SERVER, traced
+from utils.pages import enrich_web_results, page_enrichment_enabled
+from utils.news_feed import google_news_feed_url, news_item, parse_feed
+from utils.financial_history import financial_trends
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Gemini LLM - FIX: Explicitly pass the API key
-llm = ChatGoogleGenerativeAI(
+llm = InstrumentedLLM(CassetteLLM(ChatGoogleGenerativeAI(
     model="gemini-2.5-flash",
     temperature=0.7,
     google_api_key=os.getenv('GEMINI_API_KEY')  # Explicitly pass the key
-)
+)))
 
 # Initialize Tavily client
 tavily_client = TavilyClient(api_key=os.getenv('TAVILY_API_KEY'))
@@ -31,13 +38,27 @@ tavily_client = TavilyClient(api_key=os.getenv('TAVILY_API_KEY'))
 # PHASE 1: USER COMPANY RESEARCH
 # ============================================================
 
-def research_user_company(company_name: str) -> UserCompanyResearch:
+@traced("onboarding", KIND_SERVER, root=True)
+def research_user_company(company_name: str, on_update=None,
+                          deadline: Optional[float] = None) -> UserCompanyResearch:
     """
     Research the user's own company - Phase 1
     This builds trust by showing the agent's capabilities on familiar ground
+
+    The four sources (Wikipedia, Tavily + product extraction, financial
+    metrics, news) run concurrently under a shared deadline (ONBOARDING_DEADLINE,
+    default 20s). Each section is filled in as soon as its source returns and
+    `on_update(section, research_result)` is called from the caller's thread,
+    so a UI can render partial results. Sections still pending at the deadline
+    are left empty.
     """
+    from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
     print(f"\n🔍 Researching user's company: {company_name}")
-    
+
+    if deadline is None:
+        deadline = float(os.getenv('ONBOARDING_DEADLINE', '20'))
+
     research_result = UserCompanyResearch(
         overview="",
         products=[],
@@ -47,43 +68,53 @@ def research_user_company(company_name: str) -> UserCompanyResearch:
         verified_by_user=False,
         user_corrections=None
     )
-    
-    # 1. Get Wikipedia overview
-    try:
-        wiki_summary = get_wikipedia_summary(company_name)
-        if wiki_summary:
-            research_result['overview'] = wiki_summary
-            research_result['sources'].append({
-                "source": "Wikipedia",
-                "url": f"https://en.wikipedia.org/wiki/{company_name.replace(' ', '_')}",
-                "confidence": 0.85
-            })
-    except Exception as e:
-        print(f"⚠️ Wikipedia lookup failed: {e}")
-    
-    # 2. Get web search results for products using Tavily
-    try:
+
+    def get_products():
         web_results = search_web_tavily(f"{company_name} products services", max_results=5)
-        products = extract_products_from_web(web_results, company_name)
-        research_result['products'] = products
-    except Exception as e:
-        print(f"⚠️ Web search failed: {e}")
-    
-    # 3. Get financial metrics (if public company)
-    try:
-        financial_data = get_financial_data_basic(company_name)
-        if financial_data:
-            research_result['key_metrics'] = financial_data
-    except Exception as e:
-        print(f"⚠️ Financial data unavailable: {e}")
-    
-    # 4. Get recent news
-    try:
+        return extract_products_from_web(web_results, company_name)
+
+    def get_news_titles():
         news_items = get_recent_news(company_name, max_items=3)
-        research_result['news'] = [item['title'] for item in news_items]
-    except Exception as e:
-        print(f"⚠️ News fetch failed: {e}")
-    
+        return [item['title'] for item in news_items]
+
+    # section -> (fetcher, failure message)
+    steps = {
+        "overview": (lambda: get_wikipedia_summary(company_name), "Wikipedia lookup failed"),  # 1. Wikipedia overview
+        "products": (get_products, "Web search failed"),  # 2. Tavily + product extraction
+        "key_metrics": (lambda: get_financial_data_basic(company_name), "Financial data unavailable"),  # 3. Financial metrics
+        "news": (get_news_titles, "News fetch failed"),  # 4. Recent news
+    }
+
+    executor = ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="onboarding")
+    futures = {submit_with_context(executor, fetch): section for section, (fetch, _) in steps.items()}
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            section = futures[future]
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f"⚠️ {steps[section][1]}: {e}")
+                continue
+
+            if not value:
+                continue
+
+            research_result[section] = value
+            if section == "overview":
+                research_result['sources'].append({
+                    "source": "Wikipedia",
+                    "url": f"https://en.wikipedia.org/wiki/{company_name.replace(' ', '_')}",
+                    "confidence": 0.85
+                })
+
+            if on_update:
+                on_update(section, research_result)
+    except FuturesTimeout:
+        pending = [futures[f] for f in futures if not f.done()]
+        print(f"⚠️ Onboarding research deadline ({deadline:.0f}s) reached, skipped: {', '.join(pending)}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
     return research_result
 
 
@@ -92,7 +123,10 @@ def research_user_company(company_name: str) -> UserCompanyResearch:
 # ============================================================
 
 def web_search_node(state: ResearchState) -> ResearchState:
-    """Web search agent using Tavily"""
+    """
+    Web search agent using Tavily. With WEB_PAGE_ENRICHMENT, the full text
+    of the top results is read as well (within WEB_PAGE_BUDGET seconds).
+    """
     company = state.get('target_company_name', '')
     
     state['progress_messages'].append(f"🔍 Searching web for {company}...")
@@ -113,8 +147,26 @@ def web_search_node(state: ResearchState) -> ResearchState:
                 "confidence": r.get('score', 0.7)
             })
         
+        # Collapse syndicated copies, keeping the highest-confidence one
+        web_results, merged = dedupe_items(
+            web_results,
+            lambda r: f"{r['title']} {r['snippet']}"
+        )
+        
         state['web_results'] = web_results
-        state['progress_messages'].append(f"✅ Found {len(web_results)} web sources")
+        if merged:
+            state['progress_messages'].append(
+                f"✅ Found {len(web_results)} web sources (merged {merged} near-duplicate(s))"
+            )
+        else:
+            state['progress_messages'].append(f"✅ Found {len(web_results)} web sources")
+
+        if web_results and page_enrichment_enabled():
+            pages = enrich_web_results(web_results)
+            message = f"📄 Read {pages['read']} full page(s) in {pages['seconds']:.1f}s"
+            if pages['skipped']:
+                message += f" ({pages['skipped']} skipped at the time budget)"
+            state['progress_messages'].append(message)
         
     except Exception as e:
         state['progress_messages'].append(f"⚠️ Web search failed: {str(e)}")
@@ -124,6 +176,41 @@ def web_search_node(state: ResearchState) -> ResearchState:
 
 
 def financial_node(state: ResearchState) -> ResearchState:
+    """Financial data agent: a current snapshot plus stored multi-year trends"""
+    state = financial_snapshot_node(state)
+    attach_financial_trends(state)
+    return state
+
+
+def attach_financial_trends(state: ResearchState):
+    """Add the ticker's price and revenue trends from the local financial history store"""
+    financial_data = state.get('financial_data')
+    ticker = (financial_data or {}).get('ticker')
+    if not ticker:
+        # Without a snapshot, only trust a ticker the company name maps to exactly
+        company = resolve_company(state.get('target_company_name', ''))
+        if company['matched_by'] in ('alias', 'ticker'):
+            ticker = company['ticker']
+    try:
+        trends = financial_trends(ticker)
+    except Exception as e:
+        state['progress_messages'].append(f"⚠️ Financial history unavailable: {str(e)[:50]}")
+        return
+    if not trends:
+        return
+
+    if financial_data is None:
+        # The snapshot failed (e.g. rate limited) but the stored history still applies
+        state['financial_data'] = financial_data = {
+            "ticker": ticker,
+            "source": "Financial history",
+            "confidence": 0.85
+        }
+    financial_data['trends'] = trends
+    state['progress_messages'].append(f"📈 Added price and revenue trends (as of {trends['as_of']})")
+
+
+def financial_snapshot_node(state: ResearchState) -> ResearchState:
     """Financial data agent using Alpha Vantage (primary) or yfinance (fallback)"""
     import time
     company = state.get('target_company_name', '')
@@ -131,47 +218,46 @@ def financial_node(state: ResearchState) -> ResearchState:
     state['progress_messages'].append(f"💰 Fetching financial data...")
 
     try:
-        # First, try to get ticker symbol using Gemini
-        ticker_prompt = f"What is the stock ticker symbol for {company}? Reply with ONLY the ticker symbol (e.g., MSFT, TSLA, AAPL), nothing else."
-        ticker_response = llm.invoke(ticker_prompt)
-        ticker_symbol = ticker_response.content.strip().upper()
+        # Known companies resolve to their ticker directly; otherwise ask Gemini
+        ticker_symbol = resolve_company(company)['ticker']
+        if not ticker_symbol:
+            ticker_prompt = f"What is the stock ticker symbol for {company}? Reply with ONLY the ticker symbol (e.g., MSFT, TSLA, AAPL), nothing else."
+            ticker_response = llm.invoke(ticker_prompt)
+            ticker_symbol = ticker_response.content.strip().upper()
+
+        # Hedged mode: race Alpha Vantage against Yahoo Finance
+        if financial_hedging_enabled():
+            financial_data = fetch_financial_data_hedged(ticker_symbol)
+            if not financial_data:
+                raise ValueError(f"No provider returned data for {ticker_symbol}")
+
+            hedge = financial_data['hedge']
+            state['financial_data'] = financial_data
+            if hedge['time_saved'] > 0:
+                state['progress_messages'].append(
+                    f"✅ Financial data retrieved ({hedge['winner']}, hedged - saved ~{hedge['time_saved']:.1f}s)"
+                )
+            else:
+                state['progress_messages'].append(f"✅ Financial data retrieved ({hedge['winner']})")
 
-        # Try Alpha Vantage first (more reliable, 500 requests/day free)
-        alpha_vantage_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+            if 'sources' not in state:
+                state['sources'] = []
+            state['sources'].append(financial_source_ref(company, ticker_symbol, hedge['winner']))
+            return state
 
-        if alpha_vantage_key and alpha_vantage_key != 'your_alpha_vantage_api_key_here':
+        # Try Alpha Vantage first (more reliable, 500 requests/day free)
+        if get_alpha_vantage_key():
             try:
-                from alpha_vantage.fundamentaldata import FundamentalData
-
-                fd = FundamentalData(key=alpha_vantage_key, output_format='json')
-                data, _ = fd.get_company_overview(symbol=ticker_symbol)
-
-                if data and 'Symbol' in data:
-                    financial_data = {
-                        "ticker": ticker_symbol,
-                        "revenue": int(data.get("RevenueTTM", 0)) if data.get("RevenueTTM") else None,
-                        "market_cap": int(data.get("MarketCapitalization", 0)) if data.get("MarketCapitalization") else None,
-                        "pe_ratio": float(data.get("PERatio", 0)) if data.get("PERatio") else None,
-                        "employees": int(data.get("FullTimeEmployees", 0)) if data.get("FullTimeEmployees") else None,
-                        "sector": data.get("Sector"),
-                        "industry": data.get("Industry"),
-                        "website": data.get("OfficialSite"),
-                        "description": data.get("Description"),
-                        "source": "Alpha Vantage",
-                        "confidence": 0.95
-                    }
+                financial_data = fetch_alpha_vantage_overview(ticker_symbol)
 
+                if financial_data:
                     state['financial_data'] = financial_data
                     state['progress_messages'].append("✅ Financial data retrieved (Alpha Vantage)")
 
                     # Add to sources
                     if 'sources' not in state:
                         state['sources'] = []
-                    state['sources'].append({
-                        "title": f"{company} - Alpha Vantage",
-                        "url": f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}",
-                        "confidence": 0.95
-                    })
+                    state['sources'].append(financial_source_ref(company, ticker_symbol, "Alpha Vantage"))
 
                     return state  # Success with Alpha Vantage
 
@@ -179,47 +265,17 @@ def financial_node(state: ResearchState) -> ResearchState:
                 state['progress_messages'].append(f"⚠️ Alpha Vantage failed: {str(av_error)[:50]}, trying Yahoo Finance...")
 
         # Fallback to Yahoo Finance
-        time.sleep(1)
+        time.sleep(FALLBACK_DELAY_SECONDS)
 
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                ticker = yf.Ticker(ticker_symbol)
-                info = ticker.info
+        financial_data = fetch_yahoo_finance_info(ticker_symbol, max_retries=2)
 
-                financial_data = {
-                    "ticker": ticker_symbol,
-                    "revenue": info.get("totalRevenue"),
-                    "market_cap": info.get("marketCap"),
-                    "pe_ratio": info.get("trailingPE"),
-                    "employees": info.get("fullTimeEmployees"),
-                    "sector": info.get("sector"),
-                    "industry": info.get("industry"),
-                    "website": info.get("website"),
-                    "description": info.get("longBusinessSummary"),
-                    "source": "Yahoo Finance",
-                    "confidence": 0.90
-                }
-
-                state['financial_data'] = financial_data
-                state['progress_messages'].append("✅ Financial data retrieved (Yahoo Finance)")
-
-                # Add to sources
-                if 'sources' not in state:
-                    state['sources'] = []
-                state['sources'].append({
-                    "title": f"{company} - Yahoo Finance",
-                    "url": f"https://finance.yahoo.com/quote/{ticker_symbol}",
-                    "confidence": 0.90
-                })
-                break  # Success, exit retry loop
+        state['financial_data'] = financial_data
+        state['progress_messages'].append("✅ Financial data retrieved (Yahoo Finance)")
 
-            except Exception as retry_error:
-                if attempt < max_retries - 1:
-                    time.sleep(2)  # Wait before retry
-                    continue
-                else:
-                    raise retry_error
+        # Add to sources
+        if 'sources' not in state:
+            state['sources'] = []
+        state['sources'].append(financial_source_ref(company, ticker_symbol, "Yahoo Finance"))
 
     except Exception as e:
         error_msg = str(e)
@@ -243,13 +299,12 @@ def wikipedia_node(state: ResearchState) -> ResearchState:
         
         if summary:
             # Get page URL
-            search_results = wikipedia.search(company)
-            page = wikipedia.page(search_results[0])
+            page = get_wikipedia_page(company)
             
             wiki_data = {
                 "summary": summary,
-                "url": page.url,
-                "title": page.title,
+                "url": page['url'],
+                "title": page['title'],
                 "source": "Wikipedia",
                 "confidence": 0.85
             }
@@ -261,8 +316,8 @@ def wikipedia_node(state: ResearchState) -> ResearchState:
             if 'sources' not in state:
                 state['sources'] = []
             state['sources'].append({
-                "title": f"{page.title} - Wikipedia",
-                "url": page.url,
+                "title": f"{page['title']} - Wikipedia",
+                "url": page['url'],
                 "confidence": 0.85
             })
         else:
@@ -283,7 +338,8 @@ def news_node(state: ResearchState) -> ResearchState:
     state['progress_messages'].append(f"📰 Fetching recent news...")
     
     try:
-        news_items = get_recent_news(company, max_items=5)
+        # Over-fetch so the 5 slots survive near-duplicate removal
+        news_items = get_recent_news(company, max_items=10)
         
         news_data = []
         for item in news_items:
@@ -295,8 +351,16 @@ def news_node(state: ResearchState) -> ResearchState:
                 "confidence": 0.75
             })
         
+        news_data, merged = dedupe_items(news_data, lambda n: news_title_key(n['title']))
+        news_data = news_data[:5]
+        
         state['news_data'] = news_data
-        state['progress_messages'].append(f"✅ Found {len(news_data)} recent articles")
+        if merged:
+            state['progress_messages'].append(
+                f"✅ Found {len(news_data)} recent articles (merged {merged} syndicated copies)"
+            )
+        else:
+            state['progress_messages'].append(f"✅ Found {len(news_data)} recent articles")
         
     except Exception as e:
         state['progress_messages'].append(f"⚠️ News fetch failed: {str(e)}")
@@ -309,6 +373,8 @@ def news_node(state: ResearchState) -> ResearchState:
 # HELPER FUNCTIONS
 # ============================================================
 
+@instrument_call("tavily")
+@cassette_call("tavily")
 def search_web_tavily(query: str, max_results: int = 10) -> List[Dict]:
     """Search using Tavily (requires API key but has generous free tier)"""
     try:
@@ -323,11 +389,13 @@ def search_web_tavily(query: str, max_results: int = 10) -> List[Dict]:
         return []
 
 
+@instrument_call("wikipedia")
+@cassette_call("wikipedia")
 def get_wikipedia_summary(company_name: str, sentences: int = 5) -> Optional[str]:
     """Get Wikipedia summary for a company"""
     try:
-        # Clean company name (remove extra spaces, quotes, backslashes)
-        clean_name = company_name.strip().replace('"', '').replace('\\', '')
+        # Canonical name for known companies, cleaned input otherwise
+        clean_name = resolve_company(company_name)['name']
         search_results = wikipedia.search(clean_name)
         if not search_results:
             return None
@@ -346,14 +414,26 @@ def get_wikipedia_summary(company_name: str, sentences: int = 5) -> Optional[str
         return None
 
 
+@instrument_call("wikipedia")
+@cassette_call("wikipedia")
+def get_wikipedia_page(company_name: str) -> Dict[str, str]:
+    """Title and URL of the company's Wikipedia page"""
+    search_results = wikipedia.search(resolve_company(company_name)['name'])
+    page = wikipedia.page(search_results[0])
+    return {"title": page.title, "url": page.url}
+
+
+@instrument_call("yahoo_finance")
+@cassette_call("yahoo_finance")
 def get_financial_data_basic(company_name: str) -> Optional[Dict[str, str]]:
     """Get basic financial data (simplified for demo)"""
     try:
-        # Try common ticker patterns
-        possible_tickers = [
+        # Known ticker first, then common ticker patterns (deduplicated - they often coincide)
+        possible_tickers = list(dict.fromkeys(filter(None, [
+            resolve_company(company_name)['ticker'],
             company_name.upper()[:4],  # First 4 letters
             company_name.split()[0].upper()[:4]  # First word, 4 letters
-        ]
+        ])))
         
         for ticker_symbol in possible_tickers:
             try:
@@ -374,26 +454,13 @@ def get_financial_data_basic(company_name: str) -> Optional[Dict[str, str]]:
         return None
 
 
+@instrument_call("google_news")
+@cassette_call("google_news")
 def get_recent_news(company_name: str, max_items: int = 5) -> List[Dict]:
     """Get recent news using Google News RSS"""
     try:
-        from urllib.parse import quote
-        # Clean and encode company name
-        clean_name = company_name.strip()
-        encoded_name = quote(clean_name)
-        feed_url = f"https://news.google.com/rss/search?q={encoded_name}&hl=en-US&gl=US&ceid=US:en"
-        feed = feedparser.parse(feed_url)
-
-        news_items = []
-        for entry in feed.entries[:max_items]:
-            news_items.append({
-                "title": entry.title,
-                "link": entry.link,
-                "published": entry.get('published', 'N/A'),
-                "source": entry.get('source', {}).get('title', 'Unknown')
-            })
-
-        return news_items
+        feed = parse_feed(google_news_feed_url(company_name))
+        return [news_item(entry) for entry in feed.entries[:max_items]]
     except Exception as e:
         print(f"News fetch error: {e}")
         return []
@@ -422,6 +489,223 @@ Be concise and specific."""
         return []
 
 
+# ============================================================
+# FINANCIAL PROVIDERS (Alpha Vantage / Yahoo Finance)
+# ============================================================
+
+# Pause the sequential path takes before falling back to Yahoo Finance
+FALLBACK_DELAY_SECONDS = 1.0
+
+
+def get_alpha_vantage_key() -> Optional[str]:
+    """Return the Alpha Vantage API key, or None if it is unset/placeholder"""
+    key = os.getenv('ALPHA_VANTAGE_API_KEY')
+    if key and key != 'your_alpha_vantage_api_key_here':
+        return key
+    return None
+
+
+def financial_hedging_enabled() -> bool:
+    """Whether financial lookups should race both providers (FINANCIAL_HEDGING=true)"""
+    return os.getenv('FINANCIAL_HEDGING', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def financial_source_ref(company: str, ticker_symbol: str, provider: str) -> Dict:
+    """Build the source attribution entry for a financial provider"""
+    if provider == "Alpha Vantage":
+        return {
+            "title": f"{company} - Alpha Vantage",
+            "url": f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}",
+            "confidence": 0.95
+        }
+    return {
+        "title": f"{company} - Yahoo Finance",
+        "url": f"https://finance.yahoo.com/quote/{ticker_symbol}",
+        "confidence": 0.90
+    }
+
+
+@instrument_call("alpha_vantage")
+@cassette_call("alpha_vantage")
+def fetch_alpha_vantage_overview(ticker_symbol: str) -> Optional[Dict]:
+    """Get company overview from Alpha Vantage. Returns None if the ticker is unknown."""
+    from alpha_vantage.fundamentaldata import FundamentalData
+
+    fd = FundamentalData(key=get_alpha_vantage_key(), output_format='json')
+    data, _ = fd.get_company_overview(symbol=ticker_symbol)
+
+    if not data or 'Symbol' not in data:
+        return None
+
+    return {
+        "ticker": ticker_symbol,
+        "revenue": int(data.get("RevenueTTM", 0)) if data.get("RevenueTTM") else None,
+        "market_cap": int(data.get("MarketCapitalization", 0)) if data.get("MarketCapitalization") else None,
+        "pe_ratio": float(data.get("PERatio", 0)) if data.get("PERatio") else None,
+        "employees": int(data.get("FullTimeEmployees", 0)) if data.get("FullTimeEmployees") else None,
+        "sector": data.get("Sector"),
+        "industry": data.get("Industry"),
+        "website": data.get("OfficialSite"),
+        "description": data.get("Description"),
+        "source": "Alpha Vantage",
+        "confidence": 0.95
+    }
+
+
+@instrument_call("yahoo_finance")
+@cassette_call("yahoo_finance")
+def fetch_yahoo_finance_info(ticker_symbol: str, max_retries: int = 2,
+                             cancel_event=None) -> Optional[Dict]:
+    """
+    Get company info from Yahoo Finance, retrying on errors.
+    Raises the last error once retries are exhausted. If cancel_event is set
+    while waiting to retry, gives up and returns None.
+    """
+    import time
+
+    for attempt in range(max_retries):
+        try:
+            ticker = yf.Ticker(ticker_symbol)
+            info = ticker.info
+
+            return {
+                "ticker": ticker_symbol,
+                "revenue": info.get("totalRevenue"),
+                "market_cap": info.get("marketCap"),
+                "pe_ratio": info.get("trailingPE"),
+                "employees": info.get("fullTimeEmployees"),
+                "sector": info.get("sector"),
+                "industry": info.get("industry"),
+                "website": info.get("website"),
+                "description": info.get("longBusinessSummary"),
+                "source": "Yahoo Finance",
+                "confidence": 0.90
+            }
+
+        except Exception as retry_error:
+            if attempt < max_retries - 1:
+                # Wait before retry
+                record_retry()
+                if cancel_event is None:
+                    time.sleep(2)
+                elif cancel_event.wait(2):
+                    return None
+                continue
+            raise retry_error
+
+    return None
+
+
+def _is_valid_financial_payload(payload: Optional[Dict]) -> bool:
+    """A lookup found the company (Yahoo returns all-None fields for unknown symbols)"""
+    return bool(payload) and any(payload.get(field) is not None
+                                 for field in ("market_cap", "revenue", "sector"))
+
+
+def fetch_financial_data_hedged(ticker_symbol: str, hedge_delay: Optional[float] = None,
+                                timeout: Optional[float] = None) -> Optional[Dict]:
+    """
+    Race Alpha Vantage (primary) against Yahoo Finance (secondary).
+
+    The secondary lookup starts after `hedge_delay` seconds (FINANCIAL_HEDGE_DELAY,
+    default 0.5s), or immediately for tickers listed in FINANCIAL_SLOW_TICKERS or
+    when no Alpha Vantage key is configured. The first valid response wins and the
+    other lookup is cancelled. The winning payload gets a "hedge" entry recording
+    the winning provider, elapsed time and the estimated time saved versus the
+    sequential fallback path.
+    """
+    import time
+    import threading
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    if hedge_delay is None:
+        hedge_delay = float(os.getenv('FINANCIAL_HEDGE_DELAY', '0.5'))
+    if timeout is None:
+        timeout = float(os.getenv('FINANCIAL_HEDGE_TIMEOUT', '20'))
+
+    slow_tickers = {
+        t.strip().upper()
+        for t in os.getenv('FINANCIAL_SLOW_TICKERS', '').split(',')
+        if t.strip()
+    }
+    has_primary = get_alpha_vantage_key() is not None
+    if not has_primary or ticker_symbol in slow_tickers:
+        hedge_delay = 0.0
+
+    cancel_event = threading.Event()
+    started = time.monotonic()
+    finished_at = {}
+
+    def timed(provider, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            finished_at[provider] = time.monotonic()
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="financial-hedge")
+    futures = {}
+    secondary_started = None
+    winner = None
+    result = None
+    try:
+        if has_primary:
+            futures[submit_with_context(executor, timed, "Alpha Vantage", fetch_alpha_vantage_overview,
+                                        ticker_symbol)] = "Alpha Vantage"
+            done, _ = wait(futures, timeout=hedge_delay)
+            for future in done:
+                if not future.exception() and _is_valid_financial_payload(future.result()):
+                    winner, result = "Alpha Vantage", future.result()
+
+        if winner is None:
+            secondary_started = time.monotonic()
+            futures[submit_with_context(executor, timed, "Yahoo Finance", fetch_yahoo_finance_info,
+                                        ticker_symbol, 2, cancel_event)] = "Yahoo Finance"
+
+            pending = {f for f in futures if not f.done()}
+            deadline = started + timeout
+            while winner is None and pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    break  # Timed out
+                for future in done:
+                    # An empty payload doesn't win; keep waiting on the other lookup
+                    if not future.exception() and _is_valid_financial_payload(future.result()):
+                        winner, result = futures[future], future.result()
+                        break
+    finally:
+        # Cancel the losing lookup (queued futures are dropped, running ones
+        # stop at their next retry point)
+        cancel_event.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    if result is None:
+        return None
+
+    elapsed = time.monotonic() - started
+    time_saved = 0.0
+    if winner == "Yahoo Finance" and has_primary:
+        # Sequential path: wait for Alpha Vantage to fail, sleep, then run Yahoo.
+        # If Alpha Vantage is still in flight its elapsed time is a lower bound.
+        primary_elapsed = finished_at.get("Alpha Vantage", time.monotonic()) - started
+        secondary_elapsed = finished_at["Yahoo Finance"] - secondary_started
+        sequential = primary_elapsed + FALLBACK_DELAY_SECONDS + secondary_elapsed
+        time_saved = max(0.0, sequential - elapsed)
+    elif winner == "Yahoo Finance":
+        time_saved = FALLBACK_DELAY_SECONDS
+
+    result = dict(result)
+    result['hedge'] = {
+        "winner": winner,
+        "elapsed": round(elapsed, 3),
+        "time_saved": round(time_saved, 3),
+        "hedge_delay": hedge_delay
+    }
+    return result
+
+
 # ============================================================
 # TEST FUNCTION
 # ============================================================
@@ -3,18 +3,26 @@ Synthesis and Plan Generation agents
 Phase 2 Implementation
 """
 import os
+from typing import Callable, Dict, List
 from utils.state import ResearchState
+from utils.records import Record
+from utils.retrieval import retrieve_section_evidence
+from utils.sections import input_hash, join_sections, reusable_sections, split_sections, store_sections
+from utils.knowledge_base import make_entity_key
+from utils.financial_history import format_trends
+from utils.metrics import InstrumentedLLM
+from utils.cassettes import CassetteLLM
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Initialize Gemini
-llm = ChatGoogleGenerativeAI(
+llm = InstrumentedLLM(CassetteLLM(ChatGoogleGenerativeAI(
     model="gemini-2.5-flash",
     temperature=0.7,
     google_api_key=os.getenv('GEMINI_API_KEY')
-)
+)))
 
 
 def verification_node(state: ResearchState) -> ResearchState:
@@ -96,9 +104,130 @@ Be strict - only report actual conflicts, not minor differences or updates."""
     return state
 
 
+# Characters of each enriched page included when retrieval is off
+PAGE_EXCERPT_CHARS = 800
+
+# Bump when prompt wording outside the section specs changes, so cached
+# sections are rewritten
+SYNTHESIS_PROMPT_VERSION = 1
+PLAN_PROMPT_VERSION = 1
+
+# Per-run metadata in research sources (hedged lookup timings, fetch times)
+# that doesn't change what a section says, so it's left out of input hashes
+RUN_METADATA_KEYS = {"hedge", "fetched_at"}
+
+
+# Synthesis sections: the writing instructions, the question used to
+# retrieve the most relevant research passages for each one, and the
+# research sources it is written from (a refresh only rewrites the sections
+# whose sources changed)
+SYNTHESIS_SECTIONS = {
+    "Company Overview": {
+        "instructions": "[2-3 sentences about what the company does, its position in the market]",
+        "query": "What does {company} do and what is its position in the market?",
+        "inputs": ("wiki_data", "web_results", "financial_data")
+    },
+    "Business Model": {
+        "instructions": "[How they make money, key products/services]",
+        "query": "How does {company} make money? What are its key products and services?",
+        "inputs": ("wiki_data", "web_results")
+    },
+    "Market Position": {
+        "instructions": "[Market size, competitors, unique positioning]",
+        "query": "Who are {company}'s competitors, how big is its market and what makes it unique?",
+        "inputs": ("wiki_data", "web_results")
+    },
+    "Recent Developments": {
+        "instructions": "[Recent news, initiatives, changes]",
+        "query": "What recent news, announcements, initiatives or changes involve {company}?",
+        "inputs": ("news_data",)
+    },
+    "Key Metrics": {
+        "instructions": "[Important numbers - revenue, employees, market cap, etc.]",
+        "query": "What are {company}'s revenue, employee count, market cap and other key figures?",
+        "inputs": ("financial_data",)
+    },
+    "Target Customer Profile": {
+        "instructions": "[Who they sell to, typical customer characteristics]",
+        "query": "Who are {company}'s customers and what are they like?",
+        "inputs": ("wiki_data", "web_results")
+    }
+}
+
+
+def _format_retrieved_evidence(evidence: dict) -> str:
+    """Format retrieved chunks once, with per-section references to them"""
+    text = f"Research Passages ({len(evidence['chunks'])} most relevant):\n"
+    for i, chunk in enumerate(evidence['chunks'], 1):
+        label = chunk['source'] + (f" - {chunk['title']}" if chunk.get('title') else "")
+        text += f"\n[{i}] ({label}) {chunk['text']}\n"
+
+    text += "\nMost relevant passages per section:\n"
+    for section, positions in evidence['sections'].items():
+        refs = ", ".join(f"[{p + 1}]" for p in positions) or "none"
+        text += f"- {section}: {refs}\n"
+    return text
+
+
+def _source_for_hash(value):
+    """A research source without per-run metadata (records as dicts)"""
+    if isinstance(value, Record):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {k: _source_for_hash(v) for k, v in value.items() if k not in RUN_METADATA_KEYS}
+    if isinstance(value, list):
+        return [_source_for_hash(v) for v in value]
+    return value
+
+
+def _profile_scope(state: ResearchState, document: str) -> str:
+    """Section cache scope of a document about the target company"""
+    key = state.get('profile_key') or make_entity_key(state.get('target_company_name', ''))
+    return f"{document}:{key}" if key else ""
+
+
+def _refresh_sections(state: ResearchState, scope: str, hashes: Dict[str, str],
+                      order: List[str], build_prompt: Callable[[List[str], bool], str]):
+    """
+    Regenerate only the sections whose input hash changed since they were
+    last written (in one LLM call) and splice them between the cached ones.
+    A full generation is returned as the LLM wrote it (only its parsed
+    sections are cached); a partial refresh that misses a requested
+    section falls back to a full generation.
+    build_prompt(sections, partial) returns the prompt for those sections.
+    Returns (markdown, rewritten section names, reused count).
+    """
+    reused = reusable_sections(scope, hashes)
+    todo = [name for name in order if name not in reused]
+    if not todo:
+        return join_sections(reused, order), todo, len(reused)
+
+    if reused:
+        response = llm.invoke(build_prompt(todo, True))
+        generated = split_sections(response.content, todo)
+        if len(generated) == len(todo):
+            store_sections(scope, hashes, generated)
+            return join_sections({**reused, **generated}, order), todo, len(reused)
+
+    response = llm.invoke(build_prompt(order, False))
+    store_sections(scope, hashes, split_sections(response.content, order))
+    return response.content, list(order), 0
+
+
+def _report_refresh(state: ResearchState, rewritten: List[str], reused: int):
+    if reused and rewritten:
+        state['progress_messages'].append(
+            f"♻️ Kept {reused} unchanged section(s), rewrote {len(rewritten)}: {', '.join(rewritten)}"
+        )
+    elif reused:
+        state['progress_messages'].append(f"♻️ Inputs unchanged - reused all {reused} sections")
+
+
 def synthesis_node(state: ResearchState) -> ResearchState:
     """
-    Synthesis agent - combines all research data into a coherent summary
+    Synthesis agent - combines all research data into a coherent summary.
+    Only sections whose research sources changed since the last synthesis
+    of this company are rewritten.
     """
     state['progress_messages'].append("🧠 Synthesizing information...")
     
@@ -109,13 +238,32 @@ def synthesis_node(state: ResearchState) -> ResearchState:
         financial_data = state.get('financial_data', {})
         wiki_data = state.get('wiki_data', {})
         news_data = state.get('news_data', [])
-        
-        # Build synthesis prompt
-        synthesis_prompt = f"""You are a research synthesis agent. Combine all the following research data about {company} into a comprehensive, accurate summary.
 
+        selected = {}  # retrieval stats of the prompt actually sent
+
+        hashes = {
+            section: input_hash(SYNTHESIS_PROMPT_VERSION, company, spec,
+                                {source: _source_for_hash(state.get(source)) for source in spec['inputs']})
+            for section, spec in SYNTHESIS_SECTIONS.items()
+        }
+
+        def build_prompt(sections: List[str], partial: bool) -> str:
+            # Pick evidence by relevance to each section; fall back to position
+            evidence = retrieve_section_evidence(state, {
+                section: SYNTHESIS_SECTIONS[section]['query'].format(company=company)
+                for section in sections
+            })
+
+            # Build synthesis prompt
+            synthesis_prompt = f"""You are a research synthesis agent. Combine all the following research data about {company} into a comprehensive, accurate summary.
+"""
+            if not evidence:
+                synthesis_prompt += f"""
 Wikipedia Overview:
 {wiki_data.get('summary', 'N/A') if wiki_data else 'N/A'}
+"""
 
+            synthesis_prompt += f"""
 Financial Information:
 - Ticker: {financial_data.get('ticker', 'N/A') if financial_data else 'N/A'}
 - Revenue: {financial_data.get('revenue', 'N/A') if financial_data else 'N/A'}
@@ -123,43 +271,54 @@ Financial Information:
 - Employees: {financial_data.get('employees', 'N/A') if financial_data else 'N/A'}
 - Sector: {financial_data.get('sector', 'N/A') if financial_data else 'N/A'}
 - Industry: {financial_data.get('industry', 'N/A') if financial_data else 'N/A'}
-- Description: {financial_data.get('description', 'N/A') if financial_data else 'N/A'}
-
-Web Research (Top 5):
 """
-        for i, result in enumerate(web_results[:5], 1):
-            synthesis_prompt += f"\n{i}. {result.get('title', 'N/A')}\n   {result.get('snippet', 'N/A')}\n"
-        
-        synthesis_prompt += f"\n\nRecent News ({len(news_data)} articles):\n"
-        for i, news in enumerate(news_data[:3], 1):
-            synthesis_prompt += f"{i}. {news.get('title', 'N/A')}\n"
-        
-        synthesis_prompt += """
+            if financial_data and financial_data.get('trends'):
+                synthesis_prompt += f"- Trends: {format_trends(financial_data['trends'])}\n"
+
+            if evidence:
+                # Wikipedia and the company description are part of the retrieved passages
+                synthesis_prompt += "\n" + _format_retrieved_evidence(evidence)
+                selected.update(chunks=len(evidence['chunks']), corpus=evidence['corpus_size'])
+            else:
+                synthesis_prompt += f"- Description: {financial_data.get('description', 'N/A') if financial_data else 'N/A'}\n"
+
+                synthesis_prompt += "\nWeb Research (Top 5):\n"
+                for i, result in enumerate(web_results[:5], 1):
+                    synthesis_prompt += f"\n{i}. {result.get('title', 'N/A')}\n   {result.get('snippet', 'N/A')}\n"
+                    if result.get('page_text'):
+                        synthesis_prompt += f"   Page excerpt: {result['page_text'][:PAGE_EXCERPT_CHARS]}\n"
+                
+                synthesis_prompt += f"\n\nRecent News ({len(news_data)} articles):\n"
+                for i, news in enumerate(news_data[:3], 1):
+                    synthesis_prompt += f"{i}. {news.get('title', 'N/A')}\n"
+
+            if partial:
+                synthesis_prompt += """
+
+The rest of the synthesis is unchanged. Write ONLY these sections:
+"""
+            else:
+                synthesis_prompt += """
 
 Create a comprehensive synthesis with these sections:
+"""
+            for section in sections:
+                synthesis_prompt += f"\n## {section}\n{SYNTHESIS_SECTIONS[section]['instructions']}\n"
 
-## Company Overview
-[2-3 sentences about what the company does, its position in the market]
-
-## Business Model
-[How they make money, key products/services]
-
-## Market Position
-[Market size, competitors, unique positioning]
-
-## Recent Developments
-[Recent news, initiatives, changes]
-
-## Key Metrics
-[Important numbers - revenue, employees, market cap, etc.]
-
-## Target Customer Profile
-[Who they sell to, typical customer characteristics]
-
+            synthesis_prompt += """
 Be factual, concise, and cite information confidence levels when uncertain."""
-
-        response = llm.invoke(synthesis_prompt)
-        state['synthesized_data'] = response.content
+            return synthesis_prompt
+
+        synthesized, rewritten, reused = _refresh_sections(
+            state, _profile_scope(state, "synthesis"), hashes, list(SYNTHESIS_SECTIONS), build_prompt
+        )
+        state['synthesized_data'] = synthesized
+        if selected:
+            # Once per synthesis, even when a partial refresh fell back to a full one
+            state['progress_messages'].append(
+                f"📎 Selected {selected['chunks']} of {selected['corpus']} research passages"
+            )
+        _report_refresh(state, rewritten, reused)
         
         state['progress_messages'].append("✅ Research synthesized successfully")
         
@@ -170,6 +329,99 @@ Be factual, concise, and cite information confidence levels when uncertain."""
     return state
 
 
+# Account plan sections: the structure the LLM fills in ({target} and
+# {user_company} are filled from the run) and the synthesis sections each
+# one is written from
+PERSONALIZED_PLAN_SECTIONS = {
+    "🎯 Executive Summary": {
+        "template": "[2-3 sentences on why {user_company} is a fit for {target}]",
+        "uses": tuple(SYNTHESIS_SECTIONS)
+    },
+    "🔍 Target Company Profile": {
+        "template": """- Company: {target}
+- Industry & Size: [from research]
+- Key Business Focus: [from research]
+- Recent Developments: [from research]""",
+        "uses": ("Company Overview", "Key Metrics", "Recent Developments")
+    },
+    "💡 Opportunity Analysis": {
+        "template": """[WHY is this a good fit? Connect YOUR value prop to THEIR needs]
+- Business Need #1: [specific to {target}] → Your Solution: [how you solve it]
+- Business Need #2: [specific to {target}] → Your Solution: [how you solve it]
+- Business Need #3: [specific to {target}] → Your Solution: [how you solve it]""",
+        "uses": ("Business Model", "Market Position", "Recent Developments", "Target Customer Profile")
+    },
+    "🎁 Value Proposition": {
+        "template": "[Customized pitch using YOUR differentiators for THIS specific company]",
+        "uses": ("Business Model", "Market Position", "Target Customer Profile")
+    },
+    "👥 Key Stakeholders": {
+        "template": """[Who to contact at {target} based on your research]
+- Title 1: [Why they care]
+- Title 2: [Why they care]
+- Title 3: [Why they care]""",
+        "uses": ("Company Overview", "Business Model")
+    },
+    "📞 Recommended Approach": {
+        "template": """[Specific outreach strategy]
+1. [First step]
+2. [Second step]
+3. [Third step]""",
+        "uses": ("Recent Developments", "Market Position")
+    },
+    "⚠️ Potential Objections & Responses": {
+        "template": """[Anticipate objections specific to {target}]
+- Objection 1: [Response]
+- Objection 2: [Response]""",
+        "uses": ("Business Model", "Market Position")
+    },
+    "📊 Success Metrics": {
+        "template": "[How to measure this opportunity]",
+        "uses": ("Key Metrics", "Business Model")
+    },
+    "🚀 Next Steps": {
+        "template": "[Concrete action items with timeline]",
+        "uses": ("Recent Developments",)
+    }
+}
+
+GENERIC_PLAN_SECTIONS = {
+    "Company Overview": {
+        "template": "[Basic info about the company]",
+        "uses": ("Company Overview", "Key Metrics")
+    },
+    "Business Analysis": {
+        "template": "[What they do, their market]",
+        "uses": ("Business Model", "Market Position")
+    },
+    "Potential Opportunities": {
+        "template": "[Generic opportunities anyone could see]",
+        "uses": ("Business Model", "Recent Developments", "Target Customer Profile")
+    },
+    "Approach Strategy": {
+        "template": "[Generic outreach steps]",
+        "uses": ("Recent Developments",)
+    }
+}
+
+def _plan_hashes(plan_sections: dict, synthesized: str, *context) -> Dict[str, str]:
+    """Input hash of each plan section: the run context plus the synthesis sections it uses"""
+    synthesis = split_sections(synthesized, SYNTHESIS_SECTIONS)
+    return {
+        name: input_hash(PLAN_PROMPT_VERSION, spec, context,
+                         [synthesis.get(used) for used in spec['uses']] if synthesis else synthesized)
+        for name, spec in plan_sections.items()
+    }
+
+
+def _plan_structure(plan_sections: dict, sections: List[str], partial: bool, **values) -> str:
+    text = ("The rest of the plan is unchanged. Write ONLY these sections:\n" if partial
+            else "Use this structure:\n")
+    for name in sections:
+        text += f"\n## {name}\n{plan_sections[name]['template'].format(**values)}\n"
+    return text
+
+
 def personalized_plan_generator_node(state: ResearchState) -> ResearchState:
     """
     Plan generator - creates personalized account plan
@@ -183,9 +435,11 @@ def personalized_plan_generator_node(state: ResearchState) -> ResearchState:
         follow_up = state.get('follow_up_answers', {})
         target = state.get('target_company_name', '')
         synthesized = state.get('synthesized_data', '')
-        
-        # Build personalized prompt
-        plan_prompt = f"""You are a strategic sales consultant creating a PERSONALIZED account plan.
+        user_company = user_ctx.get('company_name', 'your company')
+
+        def build_prompt(sections: List[str], partial: bool) -> str:
+            # Build personalized prompt
+            return f"""You are a strategic sales consultant creating a PERSONALIZED account plan.
 
 # YOUR COMPANY CONTEXT (The Salesperson):
 Company: {user_ctx.get('company_name', 'N/A')}
@@ -208,56 +462,23 @@ Differentiators: {follow_up.get('differentiators', 'N/A')}
 
 Create a PERSONALIZED account plan that shows HOW your product/service specifically addresses this target company's needs.
 
-Use this structure:
-
-## 🎯 Executive Summary
-[2-3 sentences on why {user_ctx.get('company_name', 'your company')} is a fit for {target}]
-
-## 🔍 Target Company Profile
-- Company: {target}
-- Industry & Size: [from research]
-- Key Business Focus: [from research]
-- Recent Developments: [from research]
-
-## 💡 Opportunity Analysis
-[WHY is this a good fit? Connect YOUR value prop to THEIR needs]
-- Business Need #1: [specific to {target}] → Your Solution: [how you solve it]
-- Business Need #2: [specific to {target}] → Your Solution: [how you solve it]
-- Business Need #3: [specific to {target}] → Your Solution: [how you solve it]
-
-## 🎁 Value Proposition
-[Customized pitch using YOUR differentiators for THIS specific company]
-
-## 👥 Key Stakeholders
-[Who to contact at {target} based on your research]
-- Title 1: [Why they care]
-- Title 2: [Why they care]
-- Title 3: [Why they care]
-
-## 📞 Recommended Approach
-[Specific outreach strategy]
-1. [First step]
-2. [Second step]
-3. [Third step]
-
-## ⚠️ Potential Objections & Responses
-[Anticipate objections specific to {target}]
-- Objection 1: [Response]
-- Objection 2: [Response]
-
-## 📊 Success Metrics
-[How to measure this opportunity]
-
-## 🚀 Next Steps
-[Concrete action items with timeline]
-
+{_plan_structure(PERSONALIZED_PLAN_SECTIONS, sections, partial, target=target, user_company=user_company)}
 Make it SPECIFIC to {target}, not generic. Use actual details from the research."""
 
-        response = llm.invoke(plan_prompt)
+        # Plans are cached per company and seller context
+        context = (target, user_ctx, follow_up)
+        scope = _profile_scope(state, "account_plan")
+        if scope:
+            scope += ":" + input_hash(user_ctx, follow_up)[:16]
+        content, rewritten, reused = _refresh_sections(
+            state, scope, _plan_hashes(PERSONALIZED_PLAN_SECTIONS, synthesized, *context),
+            list(PERSONALIZED_PLAN_SECTIONS), build_prompt
+        )
+        _report_refresh(state, rewritten, reused)
         
         # Store the plan
         state['account_plan'] = {
-            "content": response.content,
+            "content": content,
             "generated_at": state.get('updated_at', ''),
             "target_company": target,
             "user_company": user_ctx.get('company_name', 'N/A'),
@@ -283,32 +504,26 @@ def generic_plan_generator_node(state: ResearchState) -> ResearchState:
     try:
         target = state.get('target_company_name', '')
         synthesized = state.get('synthesized_data', '')
-        
-        generic_prompt = f"""Create a GENERIC account plan for {target}.
+
+        def build_prompt(sections: List[str], partial: bool) -> str:
+            return f"""Create a GENERIC account plan for {target}.
 
 # RESEARCH SYNTHESIS:
 {synthesized}
 
-Create a standard, generic account plan:
-
-## Company Overview
-[Basic info about the company]
-
-## Business Analysis
-[What they do, their market]
-
-## Potential Opportunities
-[Generic opportunities anyone could see]
-
-## Approach Strategy
-[Generic outreach steps]
-
+Create a standard, generic account plan.
+{_plan_structure(GENERIC_PLAN_SECTIONS, sections, partial, target=target)}
 Keep it professional but GENERIC - this is what a typical rep would create without personalization."""
 
-        response = llm.invoke(generic_prompt)
+        content, rewritten, reused = _refresh_sections(
+            state, _profile_scope(state, "generic_plan"),
+            _plan_hashes(GENERIC_PLAN_SECTIONS, synthesized, target),
+            list(GENERIC_PLAN_SECTIONS), build_prompt
+        )
+        _report_refresh(state, rewritten, reused)
         
         state['generic_plan'] = {
-            "content": response.content,
+            "content": content,
             "generated_at": state.get('updated_at', ''),
             "target_company": target,
             "personalized": False
@@ -320,4 +535,4 @@ Keep it professional but GENERIC - this is what a typical rep would create witho
         state['progress_messages'].append(f"⚠️ Generic plan generation failed: {str(e)}")
         state['generic_plan'] = None
     
-    return state
\ No newline at end of file
+    return state
@@ -0,0 +1,296 @@
+"""
+HTTP API for the research workflow
+Runs target-company research off the event loop and streams progress
+messages and partial results as Server-Sent Events
+
+Run with:
+    uvicorn api:app --workers 2
+"""
+import os
+import json
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from utils.state import ResearchState, create_initial_state, apply_state_delta
+from utils.metrics import registry
+from utils.profiling import profile_run, should_profile
+from utils.tracing import trace_run
+from utils.accounting import account_run, usage_report
+from utils.watchlist import get_watchlist
+from workflow import create_research_workflow
+
+load_dotenv()
+
+# Workflow runs are blocking (LLM and HTTP calls), so each one takes a
+# thread; the event loop only relays their events to clients
+MAX_CONCURRENT_RUNS = int(os.getenv('API_MAX_CONCURRENT_RUNS', '16'))
+# Seconds between SSE keep-alive comments while a run is quiet
+HEARTBEAT_SECONDS = float(os.getenv('API_HEARTBEAT_SECONDS', '15'))
+
+# State keys streamed as partial results when a node changes them
+PARTIAL_RESULT_KEYS = [
+    "web_results",
+    "financial_data",
+    "wiki_data",
+    "news_data",
+    "conflicts",
+    "synthesized_data",
+    "account_plan",
+    "generic_plan",
+]
+
+app = FastAPI(title="Company Research Assistant API")
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RUNS, thread_name_prefix="research-run")
+_workflow = None
+_workflow_lock = threading.Lock()
+
+
+class ResearchRequest(BaseModel):
+    """Body of a research request"""
+    target_company_name: str = Field(..., min_length=1)
+    user_context: Dict[str, Any] = Field(default_factory=dict)
+    follow_up_answers: Dict[str, Any] = Field(default_factory=dict)
+
+
+class WatchRequest(BaseModel):
+    """Body of a watchlist change"""
+    company_name: str = Field(..., min_length=1)
+    user_id: str = "anonymous"
+
+
+def get_workflow():
+    """Compile the research workflow once per process and share it across runs"""
+    global _workflow
+    with _workflow_lock:
+        if _workflow is None:
+            _workflow = create_research_workflow()
+    return _workflow
+
+
+def build_initial_state(request: ResearchRequest) -> ResearchState:
+    """Same initial state the Streamlit app builds for a research run"""
+    state = create_initial_state(phase="research", user_context=request.user_context)
+    state['target_company_name'] = request.target_company_name.strip()
+    state['follow_up_answers'] = request.follow_up_answers
+    return state
+
+
+# ============================================================================
+# WORKFLOW RUNNER
+# ============================================================================
+
+def run_workflow(initial_state: ResearchState, emit, cancelled: threading.Event,
+                 run_id: Optional[str] = None, traceparent: Optional[str] = None):
+    """
+    Run the workflow to completion in the calling (worker) thread.
+
+    emit(event, data) is called for each new progress message, each changed
+    partial result, and finally with the complete state (assembled from the
+    nodes' deltas). Stops early between nodes if `cancelled` is set.
+    Runs matching the operator's PROFILE_RUNS setting are profiled into
+    files named after run_id. When tracing is on (TRACE_EXPORT), the run is a trace -
+    continuing the caller's when a traceparent is given. Provider usage is
+    charged to the run and the user_context's email.
+    """
+    run_id = run_id or uuid.uuid4().hex[:12]
+    profile = should_profile(initial_state['target_company_name'])
+    user_id = (initial_state.get('user_context') or {}).get('email')
+
+    with trace_run(initial_state, parent=traceparent, run_id=run_id) as run_span, \
+            account_run(initial_state, run_id, user_id) as usage:
+        emit("started", {"target_company_name": initial_state['target_company_name'],
+                         "run_id": run_id, "profiled": profile,
+                         "trace_id": run_span.trace_id if run_span is not None else None,
+                         "quota_warnings": usage.warnings if usage is not None else []})
+
+        with profile_run(initial_state, run_id, profile):
+            _stream_workflow(initial_state, emit, cancelled)
+
+
+def _stream_workflow(initial_state: ResearchState, emit, cancelled: threading.Event):
+    workflow = get_workflow()
+    state = dict(initial_state)
+
+    for step_output in workflow.stream(initial_state):
+        if cancelled.is_set():
+            return
+
+        # Each step is {node_name: changes that node made}
+        node, delta = next(iter(step_output.items()))
+        if node == "__end__":
+            break
+        if not isinstance(delta, dict):
+            continue
+        apply_state_delta(state, delta)
+
+        for message in delta.get('progress_messages') or []:
+            emit("progress", {"node": node, "message": message})
+
+        for key in PARTIAL_RESULT_KEYS:
+            if key in delta and delta[key] is not None:
+                emit("partial", {"node": node, "key": key, "value": delta[key]})
+
+    emit("complete", state)
+
+
+async def stream_run_events(initial_state: ResearchState, request: Optional[Request] = None,
+                            traceparent: Optional[str] = None) -> AsyncIterator[tuple]:
+    """
+    Start a workflow run in the thread pool and yield (event, data) tuples as
+    they arrive. Yields (None, None) as a heartbeat when the run is quiet.
+    The run is cancelled if the consumer stops iterating.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def emit(event: str, data: Any):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def run():
+        try:
+            run_workflow(initial_state, emit, cancelled, traceparent=traceparent)
+        except Exception as e:
+            emit("error", {"message": str(e)})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    loop.run_in_executor(_executor, run)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if request is not None and await request.is_disconnected():
+                    break
+                yield None, None
+                continue
+            if item is done:
+                break
+            yield item
+    finally:
+        # Client went away (or the run finished): stop at the next node boundary
+        cancelled.set()
+
+
+def format_sse(event: Optional[str], data: Any) -> str:
+    """Encode one Server-Sent Event (a comment line when event is None)"""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# ============================================================================
+# ROUTES
+# ============================================================================
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Node, provider, cache and token metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+async def _in_thread(fn, *args):
+    """
+    Run a short blocking store call off the event loop. This uses the loop's
+    default executor, so it doesn't queue behind research runs.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+@app.get("/usage")
+async def usage(days: int = 7, user_id: Optional[str] = None):
+    """
+    Provider quota status and usage by provider. Per-user usage and the
+    most expensive runs are only listed for the given user_id; the
+    operator report across users is python -m utils.accounting.
+    """
+    report = await _in_thread(usage_report, days, user_id)
+    if user_id is None:
+        report.pop("by_user", None)
+        report.pop("top_runs", None)
+    return report
+
+
+@app.get("/watchlist")
+async def watchlist(user_id: str):
+    """
+    The user's watched companies and when their news was last polled
+    (all users' watchlists: python monitor.py list)
+    """
+    return {"companies": await _in_thread(get_watchlist().companies, user_id)}
+
+
+@app.post("/watchlist")
+async def watch(body: WatchRequest):
+    """Watch a company's news (polled by monitor.py)"""
+    return {"company_key": await _in_thread(get_watchlist().add, body.company_name, body.user_id)}
+
+
+@app.delete("/watchlist")
+async def unwatch(body: WatchRequest):
+    await _in_thread(get_watchlist().remove, body.company_name, body.user_id)
+    return {"status": "removed"}
+
+
+@app.get("/watchlist/changes")
+async def watchlist_changes(user_id: str, since: int = 0, limit: int = 100):
+    """
+    New news items at the user's watched companies after sequence number
+    since; pass the last item's seq as since to poll for more (the feed
+    across users: python monitor.py changes)
+    """
+    changes = await _in_thread(get_watchlist().changes, since, user_id, limit)
+    return {"changes": changes, "next_since": changes[-1]['seq'] if changes else since}
+
+
+@app.post("/research/stream")
+async def research_stream(body: ResearchRequest, request: Request):
+    """
+    Run research and stream it as Server-Sent Events:
+    started (with the run ID), progress (one per message), partial (one per
+    changed result), then complete (final state) or error
+    """
+    initial_state = build_initial_state(body)
+
+    async def events():
+        async for event, data in stream_run_events(initial_state, request,
+                                                   traceparent=request.headers.get("traceparent")):
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/research")
+async def research(body: ResearchRequest, request: Request):
+    """Run research and return the final state (or the error) as JSON"""
+    initial_state = build_initial_state(body)
+    final_state, error = None, None
+
+    async for event, data in stream_run_events(initial_state,
+                                               traceparent=request.headers.get("traceparent")):
+        if event == "complete":
+            final_state = data
+        elif event == "error":
+            error = data['message']
+
+    return {"status": "error" if error else "complete", "error": error, "state": final_state}
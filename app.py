@@ -5,16 +5,23 @@ COMPLETE IMPLEMENTATION
 """
 import streamlit as st
 import os
+import sys
 import json
+import time
+import uuid
+import hashlib
+import subprocess
 from datetime import datetime
 from dotenv import load_dotenv
 from agents.research import research_user_company
 from utils.state import create_initial_state
-from workflow import create_research_workflow
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+from utils.job_queue import get_job_queue, COMPLETE, FAILED, CANCELLED
+from utils.accounting import account_run
+from utils.watchlist import get_watchlist
+from utils.financial_history import format_trends
+from utils.records import compact_state, expand_state
+from utils.state_codec import encode_state
+from utils.exports import ExportCache, export_key, export_to_json, export_to_pdf
 
 # Load environment variables
 load_dotenv()
@@ -72,43 +79,93 @@ if 'research_complete' not in st.session_state:
     st.session_state.research_complete = False
 if 'workflow_state' not in st.session_state:
     st.session_state.workflow_state = None
+if 'research_job_id' not in st.session_state:
+    st.session_state.research_job_id = None
+if 'research_target' not in st.session_state:
+    st.session_state.research_target = None
+if 'workflow_state_hash' not in st.session_state:
+    st.session_state.workflow_state_hash = None
+if 'research_progress' not in st.session_state:
+    st.session_state.research_progress = []
+if 'research_attempt' not in st.session_state:
+    st.session_state.research_attempt = 0
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
 
-def export_to_json(data, filename="account_plan.json"):
-    """Export data to JSON"""
-    json_str = json.dumps(data, indent=2)
-    return json_str
-
-def export_to_pdf(content, filename="account_plan.pdf"):
-    """Export content to PDF"""
-    from io import BytesIO
-    buffer = BytesIO()
-    
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Split content into lines and create paragraphs
-    lines = content.split('\n')
-    for line in lines:
-        if line.strip():
-            if line.startswith('##'):
-                # Header
-                story.append(Paragraph(line.replace('##', '').strip(), styles['Heading2']))
-            elif line.startswith('#'):
-                # Title
-                story.append(Paragraph(line.replace('#', '').strip(), styles['Heading1']))
-            else:
-                # Normal text
-                story.append(Paragraph(line, styles['Normal']))
-            story.append(Spacer(1, 0.1*inch))
+@st.cache_resource
+def start_local_workers():
+    """
+    Start JOB_WORKERS research worker processes once per server
+    (set JOB_WORKERS=0 when running `python worker.py` separately)
+    """
+    processes = int(os.getenv('JOB_WORKERS', '2'))
+    if processes <= 0:
+        return None
+    return subprocess.Popen(
+        [sys.executable, "worker.py", "--processes", str(processes)],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+
+@st.cache_resource
+def get_export_cache():
+    """Export cache shared by all sessions on this server"""
+    return ExportCache()
+
+def export_download(label, key, build, file_name, mime):
+    """
+    Download button for an export that is only built (on a background
+    thread, cached by content hash) once the user asks for it.
+    Returns True while the export is still being built.
+    """
+    cache = get_export_cache()
+    status = cache.status(key)
+    
+    if status == "ready":
+        st.download_button(label, cache.get(key), file_name=file_name, mime=mime, use_container_width=True)
+        return False
+    if status == "building":
+        st.info(f"⏳ Preparing {file_name}...")
+        return True
+    if status == "failed":
+        st.error(f"❌ Export failed: {cache.error(key)}")
+    
+    if st.button(label.replace("⬇️ Download", "📦 Prepare"), key=f"prepare_{key}", use_container_width=True):
+        cache.request(key, build)
+        st.info(f"⏳ Preparing {file_name}...")
+        return True
+    return False
+
+def show_company_research(research):
+    """Render the Phase 1 research sections about the user's company"""
+    if research.get('overview'):
+        with st.expander("📋 Company Overview", expanded=True):
+            st.markdown(research['overview'])
+    
+    if research.get('products'):
+        with st.expander("🎯 Products/Services", expanded=True):
+            for product in research['products']:
+                st.markdown(f"• {product}")
+    
+    if research.get('key_metrics') and research['key_metrics']:
+        with st.expander("💰 Key Metrics"):
+            metrics = research['key_metrics']
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Revenue", metrics.get('revenue', 'N/A'))
+            with col2:
+                st.metric("Employees", metrics.get('employees', 'N/A'))
+            with col3:
+                st.metric("Founded", metrics.get('founded', 'N/A'))
     
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    if research.get('news'):
+        with st.expander("📰 Recent News"):
+            for news_item in research['news']:
+                st.markdown(f"• {news_item}")
 
 # ============================================================
 # SIDEBAR
@@ -136,6 +193,26 @@ with st.sidebar:
         else:
             st.markdown(f"{icon} {label}")
     
+    # Watchlist: news at watched target accounts (polled by monitor.py)
+    watch_user = (st.session_state.get('user_context') or {}).get('email') or st.session_state.session_id
+    target = st.session_state.get('research_target')
+    try:
+        watchlist = get_watchlist()
+        if target and st.button(f"👀 Watch {target}", use_container_width=True):
+            watchlist.add(target, watch_user)
+            st.success(f"Watching {target} for news")
+        watched = watchlist.companies(watch_user)
+        if watched:
+            st.markdown("---")
+            with st.expander(f"👀 Watchlist ({len(watched)})"):
+                changes = watchlist.recent_changes(watch_user)
+                for change in changes:
+                    st.markdown(f"**{change['company_name']}**: [{change['title']}]({change['link']})")
+                if not changes:
+                    st.caption("No new items yet: " + ", ".join(c['company_name'] for c in watched))
+    except Exception as e:
+        st.caption(f"Watchlist unavailable: {e}")
+
     st.markdown("---")
     st.caption("💡 Powered by:")
     st.caption("• Google Gemini 2.0 Flash")
@@ -250,75 +327,68 @@ elif st.session_state.phase == 'verifying':
     Hi **{user_ctx['name']}**! Let me verify I understand your company correctly.
     """)
     
-    progress_text = st.empty()
-    progress_bar = st.progress(0)
-    
-    with st.spinner("🔍 Researching your company..."):
-        try:
-            progress_text.text("Searching web sources...")
-            progress_bar.progress(25)
-            
-            progress_text.text("Checking Wikipedia...")
-            progress_bar.progress(50)
-            
-            progress_text.text("Gathering news...")
-            progress_bar.progress(75)
-            
-            user_research = research_user_company(user_ctx['company_name'])
-            
-            progress_text.text("Complete!")
-            progress_bar.progress(100)
-            
-            st.session_state.user_company_research = user_research
-            
-            import time
-            time.sleep(0.5)
-            progress_text.empty()
-            progress_bar.empty()
-            
-        except Exception as e:
-            st.error(f"⚠️ Research failed: {str(e)}")
-            st.session_state.user_company_research = {
-                "overview": f"{user_ctx['company_name']} provides {user_ctx['product_service']}",
-                "products": [user_ctx['product_service']],
-                "key_metrics": {},
-                "news": [],
-                "sources": [],
-                "verified_by_user": False,
-                "user_corrections": None
-            }
+    # Research runs once per onboarding; reruns (e.g. typing corrections) reuse it
+    if st.session_state.user_company_research is None:
+        progress_text = st.empty()
+        progress_bar = st.progress(0)
+        live_results = st.empty()
+
+        section_labels = {
+            "overview": "Wikipedia overview",
+            "products": "Products/services",
+            "key_metrics": "Financial metrics",
+            "news": "Recent news"
+        }
+        completed_sections = []
+
+        def show_partial_research(section, partial_research):
+            """Render each section as soon as its source returns"""
+            completed_sections.append(section)
+            progress_text.text(f"✅ {section_labels.get(section, section)} ready...")
+            progress_bar.progress(min(100, 25 * len(completed_sections)))
+            with live_results.container():
+                show_company_research(partial_research)
+
+        with st.spinner("🔍 Researching your company..."):
+            try:
+                progress_text.text("Searching web, Wikipedia, financials and news...")
+
+                with account_run(None, f"onboarding-{uuid.uuid4().hex[:12]}",
+                                 user_ctx.get('email') or st.session_state.session_id) as usage:
+                    for warning in (usage.warnings if usage is not None else []):
+                        st.warning(f"⚠️ {warning}")
+                    user_research = research_user_company(
+                        user_ctx['company_name'],
+                        on_update=show_partial_research
+                    )
+
+                progress_text.text("Complete!")
+                progress_bar.progress(100)
+
+                st.session_state.user_company_research = user_research
+
+                progress_text.empty()
+                progress_bar.empty()
+                live_results.empty()
+
+            except Exception as e:
+                st.error(f"⚠️ Research failed: {str(e)}")
+                st.session_state.user_company_research = {
+                    "overview": f"{user_ctx['company_name']} provides {user_ctx['product_service']}",
+                    "products": [user_ctx['product_service']],
+                    "key_metrics": {},
+                    "news": [],
+                    "sources": [],
+                    "verified_by_user": False,
+                    "user_corrections": None
+                }
     
     st.success("✅ Research Complete!")
     st.markdown("---")
     
     st.markdown(f"### 📊 Here's what I found about **{user_ctx['company_name']}**:")
     
-    research = st.session_state.user_company_research
-    
-    if research.get('overview'):
-        with st.expander("📋 Company Overview", expanded=True):
-            st.markdown(research['overview'])
-    
-    if research.get('products'):
-        with st.expander("🎯 Products/Services", expanded=True):
-            for product in research['products']:
-                st.markdown(f"• {product}")
-    
-    if research.get('key_metrics') and research['key_metrics']:
-        with st.expander("💰 Key Metrics"):
-            metrics = research['key_metrics']
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Revenue", metrics.get('revenue', 'N/A'))
-            with col2:
-                st.metric("Employees", metrics.get('employees', 'N/A'))
-            with col3:
-                st.metric("Founded", metrics.get('founded', 'N/A'))
-    
-    if research.get('news'):
-        with st.expander("📰 Recent News"):
-            for news_item in research['news']:
-                st.markdown(f"• {news_item}")
+    show_company_research(st.session_state.user_company_research)
     
     st.markdown("---")
     st.markdown("### ✅ Verification")
@@ -461,7 +531,7 @@ elif st.session_state.phase == 'research':
                 "🚀 Research",
                 use_container_width=True,
                 type="primary",
-                disabled=not target_company
+                disabled=not target_company or st.session_state.research_job_id is not None
             )
         
         if research_button and target_company:
@@ -473,41 +543,83 @@ elif st.session_state.phase == 'research':
             initial_state['target_company_name'] = target_company
             initial_state['follow_up_answers'] = st.session_state.follow_up_answers
             
-            # Create and run workflow
+            # Queue the run - a worker process runs it, so it keeps going if this
+            # session disconnects (the job ID is only kept in this session, so
+            # a page reload doesn't reattach to it)
+            try:
+                start_local_workers()
+                st.session_state.research_job_id = get_job_queue().submit(
+                    initial_state,
+                    user_id=user_ctx.get('email') or st.session_state.session_id
+                )
+                st.session_state.research_target = target_company
+                st.session_state.research_progress = []
+                st.session_state.research_attempt = 0
+            except Exception as e:
+                st.error(f"❌ Could not start research: {str(e)}")
+        
+        # Follow the queued run until it finishes
+        if st.session_state.research_job_id:
+            job_id = st.session_state.research_job_id
+            queue = get_job_queue()
+            
             st.markdown("---")
-            st.markdown(f"### 🔬 Researching **{target_company}**...")
+            st.markdown(f"### 🔬 Researching **{st.session_state.research_target}**...")
+            
+            if st.button("🛑 Cancel Research"):
+                queue.cancel(job_id)
             
-            progress_container = st.container()
+            status_placeholder = st.empty()
+            progress_placeholder = st.empty()
             
-            with progress_container:
-                progress_placeholder = st.empty()
+            while True:
+                # Only fetch messages we haven't seen yet
+                progress = st.session_state.research_progress
+                job = queue.get(job_id, progress_since=len(progress))
+                if job is None:
+                    status_placeholder.error("❌ Research job not found")
+                    st.session_state.research_job_id = None
+                    break
                 
-                try:
-                    workflow = create_research_workflow()
-                    
-                    # Run workflow and display progress
-                    final_state = None
-                    for step_output in workflow.stream(initial_state):
-                        if 'progress_messages' in step_output:
-                            latest_messages = step_output.get('progress_messages', [])
-                            if latest_messages:
-                                with progress_placeholder.container():
-                                    for msg in latest_messages[-5:]:  # Show last 5 messages
-                                        st.text(msg)
-                        final_state = step_output
-                    
-                    # Store final state
-                    st.session_state.workflow_state = final_state
+                if job['attempts'] != st.session_state.research_attempt:
+                    # Requeued after its worker died: progress starts over
+                    st.session_state.research_attempt = job['attempts']
+                    progress.clear()
+                    continue
+                
+                if job['status'] == 'queued':
+                    status_placeholder.info(f"⏳ Waiting for a research worker ({queue.position(job_id)} jobs ahead)...")
+                elif job['cancel_requested']:
+                    status_placeholder.warning("🛑 Cancelling...")
+                else:
+                    status_placeholder.empty()
+                
+                if job['progress']:
+                    progress.extend(job['progress'])
+                    with progress_placeholder.container():
+                        for msg in progress[-5:]:  # Show last 5 messages
+                            st.text(msg)
+                
+                if job['status'] == COMPLETE:
+                    # Store final state (research payloads as compact records)
+                    st.session_state.workflow_state = compact_state(job['result'])
+                    st.session_state.workflow_state_hash = hashlib.sha1(encode_state(job['result'])).hexdigest()
                     st.session_state.research_complete = True
+                    st.session_state.research_job_id = None
                     
                     progress_placeholder.empty()
                     st.success("🎉 Research Complete!")
                     st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"❌ Research failed: {str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
+                elif job['status'] == FAILED:
+                    status_placeholder.error(f"❌ Research failed: {job['error']}")
+                    st.session_state.research_job_id = None
+                    break
+                elif job['status'] == CANCELLED:
+                    status_placeholder.warning("🛑 Research cancelled")
+                    st.session_state.research_job_id = None
+                    break
+                
+                time.sleep(1)
     
     # Display results if research is complete
     if st.session_state.research_complete and st.session_state.workflow_state:
@@ -567,6 +679,8 @@ elif st.session_state.phase == 'research':
                         st.metric("Market Cap", f"${fin.get('market_cap', 'N/A'):,}" if isinstance(fin.get('market_cap'), int) else fin.get('market_cap', 'N/A'))
                     with col3:
                         st.metric("Employees", f"{fin.get('employees', 'N/A'):,}" if isinstance(fin.get('employees'), int) else fin.get('employees', 'N/A'))
+                    if fin.get('trends'):
+                        st.caption(f"📈 {format_trends(fin['trends'])}")
             
             # Wikipedia
             if state.get('wiki_data'):
@@ -580,6 +694,17 @@ elif st.session_state.phase == 'research':
                         st.markdown(f"**{news.get('title', 'N/A')}**")
                         st.markdown(f"[Read more]({news.get('link', '#')})")
                         st.markdown("---")
+            
+            # Run timings
+            if state.get('timing_summary'):
+                summary = state['timing_summary']
+                with st.expander(f"⏱️ Run Timings ({summary['total_seconds']:.1f}s, slowest: {summary['slowest_node']})"):
+                    for entry in state.get('timings', []):
+                        calls = ", ".join(f"{c['provider']} {c['seconds']:.2f}s" + (f" ({c['retries']} retries)" if c['retries'] else "")
+                                          for c in entry['calls'])
+                        st.text(f"{entry['node']:<24}{entry['seconds']:>7.2f}s  {calls}")
+                    tokens = summary['tokens']
+                    st.caption(f"LLM tokens: {tokens['prompt']:,} prompt / {tokens['completion']:,} completion")
         
         with tab3:
             st.markdown("### Conflict Detection")
@@ -600,57 +725,65 @@ elif st.session_state.phase == 'research':
             st.markdown("### Export Options")
             
             col1, col2 = st.columns(2)
+            exports_pending = False
             
             with col1:
                 st.markdown("#### 📄 Export Personalized Plan")
                 
                 if state.get('account_plan'):
+                    plan = state['account_plan']
+                    
                     # JSON Export
-                    json_data = export_to_json(state['account_plan'])
-                    st.download_button(
+                    exports_pending |= export_download(
                         "⬇️ Download as JSON",
-                        json_data,
+                        export_key("plan-json", f"{plan.get('generated_at', '')}\n{plan['content']}"),
+                        lambda: export_to_json(plan).encode('utf-8'),
                         file_name=f"account_plan_{state['target_company_name']}.json",
-                        mime="application/json",
-                        use_container_width=True
+                        mime="application/json"
                     )
                     
                     # PDF Export
-                    pdf_buffer = export_to_pdf(state['account_plan']['content'])
-                    st.download_button(
+                    exports_pending |= export_download(
                         "⬇️ Download as PDF",
-                        pdf_buffer,
+                        export_key("plan-pdf", plan['content']),
+                        lambda: export_to_pdf(plan['content']).getvalue(),
                         file_name=f"account_plan_{state['target_company_name']}.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
+                        mime="application/pdf"
                     )
             
             with col2:
                 st.markdown("#### 📊 Export Full Research")
                 
-                full_data = {
-                    "target_company": state.get('target_company_name'),
-                    "generated_at": datetime.now().isoformat(),
-                    "user_company": user_ctx['company_name'],
-                    "research_data": {
-                        "web_results": state.get('web_results', []),
-                        "financial_data": state.get('financial_data', {}),
-                        "wiki_data": state.get('wiki_data', {}),
-                        "news_data": state.get('news_data', [])
-                    },
-                    "synthesized_data": state.get('synthesized_data', ''),
-                    "account_plan": state.get('account_plan', {}),
-                    "conflicts": state.get('conflicts', [])
-                }
+                def build_full_report():
+                    export_state = expand_state(state)
+                    full_data = {
+                        "target_company": state.get('target_company_name'),
+                        "generated_at": datetime.now().isoformat(),
+                        "user_company": user_ctx['company_name'],
+                        "research_data": {
+                            "web_results": export_state.get('web_results', []),
+                            "financial_data": export_state.get('financial_data', {}),
+                            "wiki_data": export_state.get('wiki_data', {}),
+                            "news_data": export_state.get('news_data', [])
+                        },
+                        "synthesized_data": state.get('synthesized_data', ''),
+                        "account_plan": state.get('account_plan', {}),
+                        "conflicts": export_state.get('conflicts', [])
+                    }
+                    return export_to_json(full_data).encode('utf-8')
                 
-                json_data = export_to_json(full_data)
-                st.download_button(
+                exports_pending |= export_download(
                     "⬇️ Download Full Report (JSON)",
-                    json_data,
+                    export_key("full-json", f"{user_ctx['company_name']}\n{st.session_state.workflow_state_hash}"),
+                    build_full_report,
                     file_name=f"full_research_{state['target_company_name']}.json",
-                    mime="application/json",
-                    use_container_width=True
+                    mime="application/json"
                 )
+            
+            # Show finished exports without the user having to click again
+            if exports_pending:
+                time.sleep(0.5)
+                st.rerun()
         
         # Research another company
         st.markdown("---")
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the research assistant
+Run from the repository root, e.g. python -m benchmarks.bench_embeddings
+"""
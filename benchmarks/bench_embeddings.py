@@ -0,0 +1,107 @@
+"""
+Embedding store benchmark
+Measures top-k cosine query latency of EmbeddingStore at 10k, 100k and 1M
+vectors, plus cache hit/miss throughput of get_or_embed.
+
+Usage:
+    python -m benchmarks.bench_embeddings [--dim 384] [--sizes 10000,100000,1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore, content_hash
+
+
+def percentile(values, pct):
+    return float(np.percentile(np.asarray(values), pct))
+
+
+def fill_store(store: EmbeddingStore, n: int, chunk: int = 50000):
+    """Insert n random vectors in chunks (keeps peak memory flat at 1M)"""
+    rng = np.random.default_rng(0)
+    for start in range(0, n, chunk):
+        count = min(chunk, n - start)
+        vectors = rng.standard_normal((count, store.dim), dtype=np.float32)
+        keys = [f"bench-{i}" for i in range(start, start + count)]
+        store.put_many(keys, vectors)
+
+
+def bench_search(n: int, dim: int, queries: int, k: int, on_disk: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EmbeddingStore(dim=dim, capacity=n, path=tmp if on_disk else None)
+
+        start = time.perf_counter()
+        fill_store(store, n)
+        store.flush()
+        fill_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(1)
+        query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+        store.search(query_vectors[:1], k=k)  # Warm up (page in the memmap)
+
+        latencies = []
+        for q in query_vectors:
+            t = time.perf_counter()
+            store.search(q, k=k)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+        t = time.perf_counter()
+        store.search(query_vectors, k=k)
+        batch_ms = (time.perf_counter() - t) * 1000
+
+    return {
+        "n": n,
+        "fill_s": fill_seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "batch_ms_per_query": batch_ms / queries
+    }
+
+
+def bench_cache(dim: int, texts: int = 5000):
+    """get_or_embed with a fake embedder: cold (all misses) vs warm (all hits)"""
+    rng = np.random.default_rng(2)
+    corpus = [f"snippet number {i} about some company" for i in range(texts)]
+
+    def fake_embed(batch):
+        return rng.standard_normal((len(batch), dim), dtype=np.float32)
+
+    store = EmbeddingStore(dim=dim, capacity=texts)
+    t = time.perf_counter()
+    store.get_or_embed(corpus, fake_embed)
+    cold = time.perf_counter() - t
+    t = time.perf_counter()
+    store.get_or_embed(corpus, fake_embed)
+    warm = time.perf_counter() - t
+    assert content_hash(corpus[0]) in store
+    return cold, warm, store.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--in-memory", action="store_true", help="skip the memory-mapped file")
+    args = parser.parse_args()
+
+    print(f"EmbeddingStore query latency (dim={args.dim}, k={args.k}, "
+          f"{'in-memory' if args.in_memory else 'memory-mapped'})")
+    print(f"{'vectors':>10} {'fill s':>8} {'p50 ms':>8} {'p95 ms':>8} {'batched ms/q':>13}")
+    for n in [int(x) for x in args.sizes.split(",") if x]:
+        r = bench_search(n, args.dim, args.queries, args.k, on_disk=not args.in_memory)
+        print(f"{r['n']:>10,} {r['fill_s']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['batch_ms_per_query']:>13.3f}")
+
+    cold, warm, stats = bench_cache(args.dim)
+    print(f"\nget_or_embed 5,000 texts: cold {cold * 1000:.1f} ms, warm {warm * 1000:.1f} ms "
+          f"(hits={stats['hits']}, misses={stats['misses']})")
+
+
+if __name__ == "__main__":
+    main()
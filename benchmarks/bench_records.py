@@ -0,0 +1,105 @@
+"""
+Research record memory benchmark
+Compares the memory held by stored research runs as plain dicts (as they
+come back from a job) and as compact records (compact_state).
+
+Usage:
+    python -m benchmarks.bench_records [--runs 1000]
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from utils.records import compact_state
+
+PROVIDERS = ["Yahoo Finance", "Alpha Vantage"]
+PUBLISHERS = ["Reuters", "Bloomberg", "CNBC", "TechCrunch", "The Verge", "Forbes"]
+
+
+def make_run(i: int, rng: random.Random) -> str:
+    """One research run's payloads, JSON-encoded like a stored job result"""
+    company = f"Company {i}"
+    state = {
+        "target_company_name": company,
+        "web_results": [
+            {
+                "title": f"{company} announces results {j}",
+                "snippet": " ".join(rng.choice(["growth", "revenue", "cloud", "AI", "market", "quarter"])
+                                    for _ in range(40)),
+                "url": f"https://example.com/{i}/{j}",
+                "source": "Tavily",
+                "confidence": 0.8
+            }
+            for j in range(10)
+        ],
+        "news_data": [
+            {
+                "title": f"{company} news {j} - {rng.choice(PUBLISHERS)}",
+                "link": f"https://news.example.com/{i}/{j}",
+                "published": "Mon, 06 Jan 2025 10:00:00 GMT",
+                "source": rng.choice(PUBLISHERS),
+                "confidence": 0.75
+            }
+            for j in range(5)
+        ],
+        "sources": [
+            {"title": f"{company} - Yahoo Finance", "url": f"https://finance.yahoo.com/quote/C{i}", "confidence": 0.9},
+            {"title": f"{company} - Wikipedia", "url": f"https://en.wikipedia.org/wiki/C{i}", "confidence": 0.85},
+        ],
+        "conflicts": [
+            {"description": f"Revenue figures differ for {company}", "sources": "Web vs Financial", "confidence": "MEDIUM"}
+        ],
+        "financial_data": {
+            "ticker": f"C{i}",
+            "revenue": rng.randint(10**6, 10**11),
+            "market_cap": rng.randint(10**6, 10**12),
+            "pe_ratio": round(rng.uniform(5, 60), 2),
+            "employees": rng.randint(10, 200000),
+            "sector": "Technology",
+            "industry": "Software",
+            "website": f"https://c{i}.example.com",
+            "description": f"{company} builds software.",
+            "source": rng.choice(PROVIDERS),
+            "confidence": 0.9
+        }
+    }
+    return json.dumps(state)
+
+
+def measure(encoded_runs, compact: bool):
+    """Bytes allocated to hold all runs (decoded, and compacted if requested)"""
+    gc.collect()
+    tracemalloc.start()
+    runs = []
+    for encoded in encoded_runs:
+        state = json.loads(encoded)
+        runs.append(compact_state(state) if compact else state)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Research record memory benchmark")
+    parser.add_argument("--runs", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    encoded_runs = [make_run(i, rng) for i in range(args.runs)]
+
+    dict_bytes, runs = measure(encoded_runs, compact=False)
+    del runs
+    record_bytes, runs = measure(encoded_runs, compact=True)
+    del runs
+
+    print(f"{args.runs} stored runs")
+    print(f"  dicts:   {dict_bytes / 1024 / 1024:8.2f} MiB  ({dict_bytes / args.runs / 1024:.1f} KiB/run)")
+    print(f"  records: {record_bytes / 1024 / 1024:8.2f} MiB  ({record_bytes / args.runs / 1024:.1f} KiB/run)")
+    print(f"  saved:   {(1 - record_bytes / dict_bytes) * 100:7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cassette record/replay of full research runs
+Record one live research run for a real company into a cassette, then
+replay it offline as often as needed - with the recorded provider latency
+or with none - to profile the workflow against real payloads.
+
+Usage:
+    python -m benchmarks.bench_replay record --company "Microsoft" --cassette cassettes/microsoft.json
+    python -m benchmarks.bench_replay replay --cassette cassettes/microsoft.json [--runs 5] [--timing none]
+    python -m benchmarks.bench_replay replay --cassette cassettes/microsoft.json --runs 1 --profile
+"""
+import argparse
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_workflow import percentile
+
+
+def run_research(company: str, user_context: Dict[str, Any], profile_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One full research run (knowledge base disabled so every source is
+    fetched), profiled into files named profile_id if given and traced
+    when TRACE_EXPORT is set
+    """
+    from workflow import create_research_workflow
+    from utils.state import create_initial_state
+    from utils.profiling import profile_run
+    from utils.tracing import trace_run
+
+    state = create_initial_state(phase="research", user_context=user_context)
+    state["target_company_name"] = company
+    state["follow_up_answers"] = {}
+    workflow = create_research_workflow()
+    with trace_run(state), profile_run(state, profile_id, enabled=profile_id is not None):
+        return workflow.invoke(state)
+
+
+# Settings that change which providers a run calls; recorded with the
+# cassette and restored on replay so the same calls are made
+ROUTING_SETTINGS = ("FINANCIAL_HEDGING", "SYNTHESIS_RETRIEVAL", "SYNTHESIS_TOP_K")
+
+
+def record(company: str, path: str, user_company: str):
+    from utils.cassettes import use_cassette, RECORD
+    from agents.research import get_alpha_vantage_key
+
+    user_context = {"company_name": user_company, "role": "Account Executive"}
+    settings = {name: os.environ[name] for name in ROUTING_SETTINGS if name in os.environ}
+    settings["alpha_vantage"] = bool(get_alpha_vantage_key())
+    start = time.perf_counter()
+    with use_cassette(path, RECORD) as cassette:
+        cassette.metadata = {"company": company, "user_context": user_context, "settings": settings}
+        final = run_research(company, user_context)
+    print(f"✅ Recorded {len(cassette)} responses for {company} in {time.perf_counter() - start:.1f}s -> {path}")
+    if not (final.get("account_plan") or {}).get("content"):
+        print("⚠️ The run finished without an account plan; the cassette may be incomplete")
+
+
+def replay(path: str, runs: int, timing: str, strict: bool, profile: bool = False):
+    from utils.cassettes import use_cassette, REPLAY
+    import agents.research  # noqa: F401 - loads .env before the recorded settings are applied
+
+    node_seconds: Dict[str, List[float]] = {}
+    end_to_end = []
+    with use_cassette(path, REPLAY, timing=timing, strict=strict) as cassette:
+        company = cassette.metadata["company"]
+        settings = dict(cassette.metadata.get("settings", {}))
+        if settings.pop("alpha_vantage", False):
+            os.environ["ALPHA_VANTAGE_API_KEY"] = "replay"
+        else:
+            os.environ.pop("ALPHA_VANTAGE_API_KEY", None)
+        os.environ.update(settings)
+
+        for run in range(runs):
+            cassette.rewind()
+            start = time.perf_counter()
+            final = run_research(company, cassette.metadata["user_context"],
+                                 profile_id=f"replay-{run + 1}" if profile else None)
+            end_to_end.append(time.perf_counter() - start)
+            for entry in final.get("timings", []):
+                node_seconds.setdefault(entry["node"], []).append(entry["seconds"])
+
+    print(f"{runs} replays of {company} (timing: {timing})\n")
+    print(f"{'node':<22}{'p50':>9}{'p95':>9}")
+    for node, seconds in node_seconds.items():
+        print(f"{node:<22}{percentile(seconds, 50):>8.3f}s{percentile(seconds, 95):>8.3f}s")
+    print(f"{'end to end':<22}{percentile(end_to_end, 50):>8.3f}s{percentile(end_to_end, 95):>8.3f}s")
+    if cassette.misses:
+        print(f"\n⚠️ {cassette.misses} call(s) had no exact match and were served the next "
+              f"recorded response from the same provider")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay a research run")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--cassette", required=True, help="cassette file")
+    parser.add_argument("--company", help="company to research (record)")
+    parser.add_argument("--user-company", default="Acme Corp", help="seller's company (record)")
+    parser.add_argument("--runs", type=int, default=5, help="replays (replay)")
+    parser.add_argument("--timing", choices=["original", "none"], default="original",
+                        help="replay with the recorded latency or with none")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile each replay (files in PROFILE_DIR named replay-N)")
+    parser.add_argument("--strict", action="store_true",
+                        help="fail on calls that don't match a recording exactly")
+    args = parser.parse_args()
+
+    # Reused knowledge-base research or cached sections would skip the calls we want on tape
+    os.environ["KNOWLEDGE_BASE_PATH"] = ""
+    os.environ["SECTION_CACHE_PATH"] = ""
+    os.environ["FINANCIAL_HISTORY_DIR"] = ""
+
+    if args.mode == "record":
+        if not args.company:
+            parser.error("record needs --company")
+        record(args.company, args.cassette, args.user_company)
+    else:
+        # Replays never reach the providers; the clients only need a key to initialise
+        for key in ("GEMINI_API_KEY", "TAVILY_API_KEY"):
+            if not os.getenv(key):
+                os.environ[key] = "replay"
+        replay(args.cassette, args.runs, args.timing, args.strict, args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+State codec benchmark
+Encode/decode throughput and size of a full research state with the
+current JSON path (json.dumps(indent=2), as in export_to_json) versus
+utils.state_codec with and without compression.
+
+Usage:
+    python -m benchmarks.bench_state_codec [--states 200]
+"""
+import argparse
+import json
+import random
+import time
+
+from utils.state import create_initial_state
+from utils.state_codec import encode_state, decode_state, _msgpack, _zstd
+from benchmarks.bench_records import make_run
+
+WORDS = ["revenue", "growth", "cloud", "customers", "platform", "enterprise", "AI",
+         "pipeline", "margin", "partnership", "expansion", "security", "market"]
+
+
+def make_state(i: int, rng: random.Random) -> dict:
+    """A finished research run with multi-KB synthesized text and plans"""
+    state = create_initial_state(phase="research", user_context={"company_name": "Acme", "role": "AE"})
+    state.update(json.loads(make_run(i, rng)))
+
+    def text(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    state["synthesized_data"] = "\n\n".join(f"## Section {s}\n{text(250)}" for s in range(6))
+    state["account_plan"] = {"content": "\n\n".join(f"## Part {s}\n{text(300)}" for s in range(8)),
+                             "target_company": state["target_company_name"], "personalized": True}
+    state["generic_plan"] = {"content": "\n\n".join(f"## Part {s}\n{text(200)}" for s in range(8)),
+                             "target_company": state["target_company_name"], "personalized": False}
+    state["progress_messages"] = [f"✅ Step {s} done" for s in range(20)]
+    return state
+
+
+def bench(name, states, encode, decode):
+    start = time.perf_counter()
+    encoded = [encode(s) for s in states]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for e in encoded:
+        decode(e)
+    decode_s = time.perf_counter() - start
+
+    size = sum(len(e) for e in encoded) / len(encoded)
+    return name, size, len(states) / encode_s, len(states) / decode_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="State codec benchmark")
+    parser.add_argument("--states", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    states = [make_state(i, rng) for i in range(args.states)]
+
+    cases = [
+        ("json indent=2 (current)", lambda s: json.dumps(s, indent=2).encode("utf-8"),
+         lambda b: json.loads(b.decode("utf-8"))),
+        ("codec, uncompressed", lambda s: encode_state(s, compression=None), decode_state),
+        ("codec, zlib", lambda s: encode_state(s, compression="zlib"), decode_state),
+    ]
+    if _zstd() is not None:
+        cases.append(("codec, zstd", lambda s: encode_state(s, compression="zstd"), decode_state))
+
+    print(f"{args.states} states, encoding: {'msgpack' if _msgpack() else 'compact JSON (msgpack not installed)'}")
+    print(f"{'path':<26}{'avg size':>12}{'encode/s':>12}{'decode/s':>12}")
+    for name, size, enc, dec in (bench(name, states, e, d) for name, e, d in cases):
+        print(f"{name:<26}{size / 1024:>9.1f} KiB{enc:>12.0f}{dec:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Offline end-to-end workflow benchmark
+Runs create_research_workflow() against local stand-in providers
+(benchmarks.fakes) and reports p50/p95 per node and end to end, runs per
+second and peak memory. Results are compared with a stored baseline and
+regressions are flagged (exit status 1).
+
+Usage:
+    python -m benchmarks.bench_workflow [--runs 20] [--concurrency 4]
+    python -m benchmarks.bench_workflow --update-baseline
+    python -m benchmarks.bench_workflow --llm-latency 1.5 --latency tavily=2
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "workflow.json")
+
+# A metric regresses when it is this much worse than the baseline...
+DEFAULT_TOLERANCE = 0.2
+# ...and, for latencies, at least this many seconds slower (ignores jitter on fast nodes)
+MIN_LATENCY_DELTA = 0.05
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _configure_environment(workdir: str, retrieval: bool):
+    """Point every store at workdir and give the clients dummy keys"""
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.environ["TAVILY_API_KEY"] = "benchmark"
+    os.environ["ALPHA_VANTAGE_API_KEY"] = "benchmark"
+    os.environ["KNOWLEDGE_BASE_PATH"] = os.path.join(workdir, "knowledge_base.sqlite")
+    os.environ["SECTION_CACHE_PATH"] = os.path.join(workdir, "sections.sqlite")
+    # Price history downloads would bypass the fake provider server
+    os.environ["FINANCIAL_HISTORY_DIR"] = ""
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embeddings")
+    os.environ["SYNTHESIS_RETRIEVAL"] = "true" if retrieval else "false"
+    os.environ["NO_PROXY"] = "127.0.0.1,localhost"
+
+    import yfinance as yf
+    yf.set_tz_cache_location(os.path.join(workdir, "yfinance"))
+
+
+def _install_llm(llm):
+    """Swap the fake model into every agent module that holds a Gemini client"""
+    import agents.research
+    import agents.synthesis
+    from utils.metrics import InstrumentedLLM
+
+    agents.research.llm = agents.synthesis.llm = InstrumentedLLM(llm)
+
+
+def run_benchmark(runs: int, concurrency: int, companies: int = 0) -> Dict[str, Any]:
+    """
+    Run the workflow runs times (concurrency at a time) and summarise it.
+    companies > 0 cycles through that many names so later runs hit the
+    knowledge base; 0 researches a new company every run.
+    """
+    from workflow import create_research_workflow
+    from utils.state import create_initial_state
+
+    workflow = create_research_workflow()
+
+    def company_name(i: int) -> str:
+        return f"Benchmark Company {i % companies if companies else i}"
+
+    def run_once(i: int) -> Dict[str, Any]:
+        state = create_initial_state(phase="research", user_context={"company_name": "Acme", "role": "AE"})
+        state["target_company_name"] = company_name(i)
+        state["follow_up_answers"] = {}
+        start = time.perf_counter()
+        final = workflow.invoke(state)
+        return {"seconds": time.perf_counter() - start, "timings": final.get("timings", []),
+                "complete": bool((final.get("account_plan") or {}).get("content"))}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run_once, range(runs)))
+    wall = time.perf_counter() - start
+
+    # Peak Python heap of one more run, measured separately so tracing
+    # doesn't slow the timed runs
+    tracemalloc.start()
+    run_once(runs)
+    _, peak_heap = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    node_seconds: Dict[str, List[float]] = {}
+    for result in results:
+        for entry in result["timings"]:
+            node_seconds.setdefault(entry["node"], []).append(entry["seconds"])
+    end_to_end = [r["seconds"] for r in results]
+
+    return {
+        "end_to_end": {"p50": percentile(end_to_end, 50), "p95": percentile(end_to_end, 95),
+                       "mean": statistics.mean(end_to_end)},
+        "nodes": {node: {"p50": percentile(s, 50), "p95": percentile(s, 95)}
+                  for node, s in node_seconds.items()},
+        "runs_per_second": runs / wall,
+        "peak_heap_mib": peak_heap / 2**20,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "incomplete_runs": sum(not r["complete"] for r in results),
+    }
+
+
+def find_regressions(result: Dict[str, Any], baseline: Dict[str, Any],
+                     tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Human-readable list of metrics that got worse than the baseline"""
+    regressions = []
+
+    def latency(name, current, previous):
+        if current > previous * (1 + tolerance) and current - previous >= MIN_LATENCY_DELTA:
+            regressions.append(f"{name}: {current:.3f}s vs {previous:.3f}s baseline")
+
+    for pct in ("p50", "p95"):
+        latency(f"end-to-end {pct}", result["end_to_end"][pct], baseline["end_to_end"][pct])
+        for node, stats in result["nodes"].items():
+            if node in baseline["nodes"]:
+                latency(f"{node} {pct}", stats[pct], baseline["nodes"][node][pct])
+
+    if result["runs_per_second"] < baseline["runs_per_second"] / (1 + tolerance):
+        regressions.append(f"throughput: {result['runs_per_second']:.2f} runs/s "
+                           f"vs {baseline['runs_per_second']:.2f} baseline")
+    if result["peak_heap_mib"] > baseline["peak_heap_mib"] * (1 + tolerance):
+        regressions.append(f"peak heap: {result['peak_heap_mib']:.1f} MiB "
+                           f"vs {baseline['peak_heap_mib']:.1f} baseline")
+    if result["incomplete_runs"] > baseline.get("incomplete_runs", 0):
+        regressions.append(f"{result['incomplete_runs']} run(s) finished without an account plan")
+    return regressions
+
+
+def print_report(result: Dict[str, Any], requests: Dict[str, int]):
+    print(f"{'node':<22}{'p50':>9}{'p95':>9}")
+    for node, stats in result["nodes"].items():
+        print(f"{node:<22}{stats['p50']:>8.3f}s{stats['p95']:>8.3f}s")
+    e2e = result["end_to_end"]
+    print(f"{'end to end':<22}{e2e['p50']:>8.3f}s{e2e['p95']:>8.3f}s")
+    print(f"\nthroughput: {result['runs_per_second']:.2f} runs/s")
+    print(f"peak memory: {result['peak_heap_mib']:.1f} MiB Python heap per run, "
+          f"{result['peak_rss_mib']:.0f} MiB process RSS")
+    print("provider requests: " + ", ".join(f"{p}={n}" for p, n in sorted(requests.items())))
+    if result["incomplete_runs"]:
+        print(f"⚠️ {result['incomplete_runs']} run(s) finished without an account plan")
+
+
+def _parse_latency(values: List[str]) -> Dict[str, float]:
+    latency = {}
+    for value in values or []:
+        provider, _, seconds = value.partition("=")
+        latency[provider] = float(seconds)
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end workflow benchmark")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--companies", type=int, default=0,
+                        help="cycle through this many companies (0: a new company every run)")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="fake LLM seconds per call")
+    parser.add_argument("--llm-tokens", type=int, default=400, help="fake LLM completion tokens per call")
+    parser.add_argument("--llm-tps", type=float, default=2000, help="fake LLM output tokens per second")
+    parser.add_argument("--latency", nargs="*", metavar="PROVIDER=SECONDS",
+                        help="per-request provider latency, e.g. tavily=1.2 wikipedia=0.3")
+    parser.add_argument("--retrieval", action="store_true",
+                        help="use retrieval for synthesis (needs the embedding model locally)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_environment(workdir, args.retrieval)
+        from benchmarks.fakes import FakeLLM, FakeProviderServer, redirect_providers
+
+        _install_llm(FakeLLM(args.llm_latency, args.llm_tokens, args.llm_tps))
+        server = FakeProviderServer(_parse_latency(args.latency)).start()
+        try:
+            with redirect_providers(server):
+                result = run_benchmark(args.runs, args.concurrency, args.companies)
+        finally:
+            server.stop()
+
+    config = {k: getattr(args, k) for k in ("runs", "concurrency", "companies", "llm_latency",
+                                           "llm_tokens", "llm_tps", "retrieval")}
+    config["provider_latency"] = server.latency
+    print(f"{args.runs} runs, concurrency {args.concurrency}\n")
+    print_report(result, server.requests)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "result": result}, f, indent=2)
+        print(f"\n✅ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline} (run with --update-baseline to create one)")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print("\n⚠️ Baseline was recorded with different settings; comparison may not be meaningful")
+
+    regressions = find_regressions(result, baseline["result"], args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\n✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
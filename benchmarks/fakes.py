@@ -0,0 +1,294 @@
+"""
+Local stand-in providers for offline runs
+A fake Gemini model with configurable latency and output length, and one
+local HTTP server that answers the Tavily, Wikipedia, Yahoo Finance, Alpha
+Vantage and Google News requests the real client libraries make. While
+redirect_providers() is active, outbound requests to those hosts (through
+requests or urllib) are rewritten to the local server, so the provider
+clients and their response parsing run unchanged.
+"""
+import json
+import random
+import threading
+import time
+import types
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+from xml.sax.saxutils import escape
+
+import requests.adapters
+
+# Real provider hosts and the fake server route that answers them
+PROVIDER_HOSTS = {
+    "api.tavily.com": "tavily",
+    "en.wikipedia.org": "wikipedia",
+    "news.google.com": "google_news",
+    "www.alphavantage.co": "alpha_vantage",
+    "fc.yahoo.com": "yahoo_finance",
+    "query1.finance.yahoo.com": "yahoo_finance",
+    "query2.finance.yahoo.com": "yahoo_finance",
+}
+
+# Default per-request latency (seconds), roughly what the live APIs take
+DEFAULT_LATENCY = {
+    "tavily": 0.8,
+    "wikipedia": 0.15,
+    "google_news": 0.3,
+    "alpha_vantage": 0.5,
+    "yahoo_finance": 0.3,
+}
+
+WORDS = ["revenue", "growth", "cloud", "customers", "platform", "enterprise", "AI",
+         "pipeline", "margin", "partnership", "expansion", "security", "market"]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+# ============================================================================
+# FAKE LLM
+# ============================================================================
+
+class FakeLLM:
+    """
+    Stand-in for ChatGoogleGenerativeAI: invoke() sleeps for
+    latency + completion_tokens / tokens_per_second and returns markdown of
+    about completion_tokens tokens, with usage metadata like Gemini's.
+    """
+
+    def __init__(self, latency: float = 0.4, completion_tokens: int = 400,
+                 tokens_per_second: float = 2000, seed: int = 0):
+        self.latency = latency
+        self.completion_tokens = completion_tokens
+        self.tokens_per_second = tokens_per_second
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _reply(self, prompt: str) -> str:
+        if "ticker symbol" in prompt:
+            return "FAKE"
+        if "CONFLICTS:" in prompt:
+            return "CONFLICTS: NO\n- No significant conflicts detected"
+
+        with self._lock:
+            words = self.completion_tokens * 3 // 4
+            sections = [f"## Section {i}\n{_text(self._rng, words // 6)}" for i in range(6)]
+        return "\n\n".join(sections)
+
+    def invoke(self, prompt, *args, **kwargs):
+        prompt = str(prompt)
+        content = self._reply(prompt)
+        completion_tokens = len(content) // 4
+        time.sleep(self.latency + completion_tokens / self.tokens_per_second)
+        return types.SimpleNamespace(
+            content=content,
+            response_metadata={"usage_metadata": {
+                "prompt_token_count": len(prompt) // 4,
+                "candidates_token_count": completion_tokens,
+            }},
+        )
+
+
+# ============================================================================
+# FAKE PROVIDER SERVER
+# ============================================================================
+
+class _ProviderHandler(BaseHTTPRequestHandler):
+    server: "FakeProviderServer"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        parts = urlsplit(self.path)
+        provider, _, path = parts.path.lstrip("/").partition("/")
+        params = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        route = getattr(self.server, f"_{provider}", None)
+        if route is None:
+            self._send(404, "text/plain", b"unknown provider")
+            return
+
+        self.server.count(provider)
+        time.sleep(self.server.latency.get(provider, 0))
+        status, content_type, payload, headers = route("/" + path, params, body)
+        self._send(status, content_type, payload, headers)
+
+    def _send(self, status, content_type, payload: bytes, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _json(data, status=200, headers=None):
+    return status, "application/json", json.dumps(data).encode("utf-8"), headers
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering every provider route with generated data.
+    latency maps provider -> seconds added to each request.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), _ProviderHandler)
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.requests: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeProviderServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True, name="fake-providers")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, provider: str):
+        with self._lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+
+    def text(self, words: int) -> str:
+        with self._lock:
+            return _text(self._rng, words)
+
+    # Routes: (path, query params, body) -> (status, content type, payload, headers)
+
+    def _tavily(self, path, params, body):
+        request = json.loads(body or b"{}")
+        query = request.get("query", "")
+        results = [
+            {
+                "title": f"{query} - result {i}",
+                "url": f"https://example.com/{i}",
+                "content": self.text(60),
+                "score": round(0.95 - i * 0.03, 2),
+                "raw_content": None,
+            }
+            for i in range(int(request.get("max_results", 5)))
+        ]
+        return _json({"query": query, "results": results, "response_time": 0.0})
+
+    def _wikipedia(self, path, params, body):
+        if params.get("list") == "search":
+            return _json({"query": {"searchinfo": {}, "search": [{"title": params.get("srsearch", "")}]}})
+
+        title = params.get("titles", "Page")
+        page = {"pageid": 1, "title": title,
+                "fullurl": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"}
+        if params.get("prop") == "extracts":
+            sentences = int(params.get("exsentences") or 5)
+            page["extract"] = " ".join(f"{self.text(18).capitalize()}." for _ in range(sentences))
+        return _json({"query": {"pages": {"1": page}}})
+
+    def _google_news(self, path, params, body):
+        query = escape(params.get("q", ""))
+        items = "".join(
+            f"<item><title>{query} {escape(self.text(8))} - Publisher {i}</title>"
+            f"<link>https://news.example.com/{i}</link>"
+            f"<pubDate>Mon, 0{i % 9 + 1} Jan 2024 12:00:00 GMT</pubDate>"
+            f"<source url=\"https://publisher{i}.example.com\">Publisher {i}</source></item>"
+            for i in range(10)
+        )
+        rss = f"<?xml version=\"1.0\"?><rss version=\"2.0\"><channel><title>{query}</title>{items}</channel></rss>"
+        return 200, "application/rss+xml", rss.encode("utf-8"), None
+
+    def _alpha_vantage(self, path, params, body):
+        symbol = params.get("symbol", "FAKE")
+        return _json({
+            "Symbol": symbol,
+            "Name": f"{symbol} Inc",
+            "Description": self.text(80),
+            "Sector": "TECHNOLOGY",
+            "Industry": "SERVICES-PREPACKAGED SOFTWARE",
+            "OfficialSite": "https://example.com",
+            "RevenueTTM": "52000000000",
+            "MarketCapitalization": "310000000000",
+            "PERatio": "31.5",
+            "FullTimeEmployees": "48000",
+        })
+
+    def _yahoo_finance(self, path, params, body):
+        if path == "/" or not path.strip("/"):
+            # fc.yahoo.com: only hands out the session cookie
+            return 404, "text/plain", b"", {"Set-Cookie": "A3=benchmark; Path=/"}
+        if path.endswith("/getcrumb"):
+            return 200, "text/plain", b"benchmark-crumb", None
+        if "/timeseries/" in path:
+            return _json({"timeseries": {"result": [{}], "error": None}})
+
+        symbol = path.rstrip("/").rsplit("/", 1)[-1]
+        return _json({"quoteSummary": {"error": None, "result": [{
+            "financialData": {"totalRevenue": 52000000000, "currentPrice": 123.4},
+            "quoteType": {"symbol": symbol, "longName": f"{symbol} Inc"},
+            "defaultKeyStatistics": {"sharesOutstanding": 2500000000},
+            "assetProfile": {"sector": "Technology", "industry": "Software",
+                             "website": "https://example.com", "fullTimeEmployees": 48000,
+                             "longBusinessSummary": self.text(80)},
+            "summaryDetail": {"marketCap": 310000000000, "trailingPE": 31.5,
+                              "regularMarketPrice": 123.4},
+        }]}})
+
+
+# ============================================================================
+# REDIRECTION
+# ============================================================================
+
+def _rewrite(url: str, base_url: str) -> str:
+    parts = urlsplit(url)
+    provider = PROVIDER_HOSTS.get(parts.hostname or "")
+    if provider is None:
+        return url
+    base = urlsplit(base_url)
+    return urlunsplit((base.scheme, base.netloc, f"/{provider}{parts.path}", parts.query, ""))
+
+
+@contextmanager
+def redirect_providers(server: FakeProviderServer):
+    """Send requests/urllib traffic for the provider hosts to server"""
+    original_send = requests.adapters.HTTPAdapter.send
+    original_open = urllib.request.OpenerDirector.open
+
+    def send(adapter, request, *args, **kwargs):
+        request.url = _rewrite(request.url, server.base_url)
+        return original_send(adapter, request, *args, **kwargs)
+
+    def open_url(opener, fullurl, *args, **kwargs):
+        if isinstance(fullurl, str):
+            fullurl = _rewrite(fullurl, server.base_url)
+        else:
+            fullurl.full_url = _rewrite(fullurl.full_url, server.base_url)
+        return original_open(opener, fullurl, *args, **kwargs)
+
+    requests.adapters.HTTPAdapter.send = send
+    urllib.request.OpenerDirector.open = open_url
+    try:
+        yield server
+    finally:
+        requests.adapters.HTTPAdapter.send = original_send
+        urllib.request.OpenerDirector.open = original_open
@@ -0,0 +1,212 @@
+"""
+Concurrent-session load generator
+Simulates reps going through onboarding (research_user_company) and Phase 2
+(create_research_workflow().stream) with think times in between, against
+the local stand-in providers. Concurrency is stepped up level by level;
+each level reports throughput, latency percentiles, thread count and
+memory, and the first level where throughput stops scaling or latency
+degrades is reported as the saturation point.
+
+Usage:
+    python -m benchmarks.load_test [--levels 1 2 4 8 16] [--sessions 2] [--think-time 2]
+    python -m benchmarks.load_test --scale 0.25          # everything 4x faster
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_workflow import percentile, _configure_environment, _install_llm
+from benchmarks.fakes import DEFAULT_LATENCY
+
+# A level is saturated when stepping up users gains less than this much throughput...
+MIN_SCALING_GAIN = 0.1
+# ...or Phase 2 p95 latency exceeds this multiple of the single-level baseline
+MAX_LATENCY_GROWTH = 2.0
+
+
+def _rss_mib() -> float:
+    """Current resident memory (peak RSS where /proc isn't available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ResourceSampler:
+    """Samples thread count and RSS in the background while a level runs"""
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss_mib = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss_mib = max(self.peak_rss_mib, _rss_mib())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="load-sampler")
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _company(prefix: str, key: str) -> str:
+    return f"{prefix} {key}"
+
+
+def simulate_user(user: int, level: int, sessions: int, workflow, think_time: float,
+                  samples: Dict[str, List[float]], lock: threading.Lock):
+    """One rep: onboarding, think, Phase 2 research, think - sessions times"""
+    from agents.research import research_user_company
+    from utils.state import create_initial_state
+
+    rng = random.Random(f"{level}-{user}")
+
+    def think():
+        if think_time > 0:
+            time.sleep(rng.expovariate(1 / think_time))
+
+    for session in range(sessions):
+        key = f"{level}-{user}-{session}"
+
+        start = time.perf_counter()
+        research_user_company(_company("Seller", key))
+        onboarding = time.perf_counter() - start
+        think()
+
+        state = create_initial_state(phase="research", user_context={"company_name": "Acme", "role": "AE"})
+        state["target_company_name"] = _company("Target", key)
+        state["follow_up_answers"] = {}
+        start, first_update = time.perf_counter(), None
+        for _ in workflow.stream(state):
+            if first_update is None:
+                first_update = time.perf_counter() - start
+        phase2 = time.perf_counter() - start
+
+        with lock:
+            samples["onboarding"].append(onboarding)
+            samples["first_update"].append(first_update or phase2)
+            samples["phase2"].append(phase2)
+        think()
+
+
+def run_level(users: int, sessions: int, workflow, think_time: float) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {"onboarding": [], "first_update": [], "phase2": []}
+    lock = threading.Lock()
+    threads_before, rss_before = threading.active_count(), _rss_mib()
+
+    start = time.perf_counter()
+    with ResourceSampler() as sampler, ThreadPoolExecutor(max_workers=users, thread_name_prefix="rep") as pool:
+        futures = [pool.submit(simulate_user, user, users, sessions, workflow, think_time, samples, lock)
+                   for user in range(users)]
+        errors = sum(1 for f in futures if f.exception() is not None)
+    wall = time.perf_counter() - start
+
+    # Give threads that are shutting down a moment before counting leftovers
+    settle_until = time.monotonic() + 2
+    while threading.active_count() > threads_before and time.monotonic() < settle_until:
+        time.sleep(0.1)
+
+    completed = len(samples["phase2"])
+    return {
+        "users": users,
+        "sessions": completed,
+        "errors": errors,
+        "sessions_per_minute": completed / wall * 60,
+        "latency": {name: {"p50": percentile(values, 50), "p95": percentile(values, 95),
+                           "p99": percentile(values, 99)}
+                    for name, values in samples.items()},
+        "peak_threads": sampler.peak_threads,
+        "threads_left": threading.active_count() - threads_before,  # leaked threads
+        "peak_rss_mib": sampler.peak_rss_mib,
+        "rss_growth_mib": _rss_mib() - rss_before,
+    }
+
+
+def find_saturation(levels: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """First level where throughput stopped scaling or Phase 2 latency degraded"""
+    if not levels:
+        return None
+    base_p95 = levels[0]["latency"]["phase2"]["p95"]
+    for previous, level in zip(levels, levels[1:]):
+        if level["sessions_per_minute"] < previous["sessions_per_minute"] * (1 + MIN_SCALING_GAIN):
+            return {**level, "reason": "throughput stopped scaling"}
+        if level["latency"]["phase2"]["p95"] > base_p95 * MAX_LATENCY_GROWTH:
+            return {**level, "reason": f"Phase 2 p95 over {MAX_LATENCY_GROWTH:g}x the {levels[0]['users']}-user level"}
+    return None
+
+
+def print_level(level: Dict[str, Any]):
+    lat = level["latency"]
+    print(f"{level['users']:>5}{level['sessions_per_minute']:>11.1f}"
+          f"{lat['onboarding']['p50']:>8.2f}s{lat['onboarding']['p95']:>7.2f}s"
+          f"{lat['first_update']['p95']:>9.2f}s"
+          f"{lat['phase2']['p50']:>8.2f}s{lat['phase2']['p95']:>7.2f}s{lat['phase2']['p99']:>7.2f}s"
+          f"{level['peak_threads']:>8}{level['threads_left']:>+6}"
+          f"{level['peak_rss_mib']:>8.0f}{level['rss_growth_mib']:>+7.1f}"
+          + (f"  ⚠️ {level['errors']} failed user(s)" if level["errors"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load generator")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="concurrent users per level")
+    parser.add_argument("--sessions", type=int, default=2, help="sessions per user per level")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between steps")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply think times and stand-in latencies (e.g. 0.25 for a quick run)")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="fake LLM seconds per call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_environment(workdir, retrieval=False)
+        from benchmarks.fakes import FakeLLM, FakeProviderServer, redirect_providers
+        from workflow import create_research_workflow
+
+        _install_llm(FakeLLM(latency=args.llm_latency * args.scale,
+                             tokens_per_second=2000 / args.scale))
+        latency = {provider: seconds * args.scale for provider, seconds in DEFAULT_LATENCY.items()}
+        server = FakeProviderServer(latency).start()
+        workflow = create_research_workflow()
+
+        print(f"{args.sessions} session(s) per user, think time ~{args.think_time * args.scale:.2f}s\n")
+        print(f"{'users':>5}{'sess/min':>11}{'onboarding p50/p95':>19}{'1st upd p95':>12}"
+              f"{'phase 2 p50/p95/p99':>22}{'threads':>8}{'left':>6}{'RSS MiB':>8}{'growth':>7}")
+        levels = []
+        try:
+            with redirect_providers(server):
+                for users in args.levels:
+                    # Agents print progress; keep the table readable
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        level = run_level(users, args.sessions, workflow, args.think_time * args.scale)
+                    print_level(level)
+                    levels.append(level)
+        finally:
+            server.stop()
+
+    saturation = find_saturation(levels)
+    if saturation:
+        print(f"\n⚠️ Saturates at {saturation['users']} concurrent users ({saturation['reason']})")
+    else:
+        print(f"\n✅ No saturation up to {levels[-1]['users']} concurrent users")
+
+
+if __name__ == "__main__":
+    main()
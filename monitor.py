@@ -0,0 +1,102 @@
+"""
+Watchlist news monitor
+Polls the Google News feeds of every watched company on a schedule and
+appends new items to the change feed (see utils/watchlist.py)
+
+Run with:
+    python monitor.py add "Microsoft" --user rep@example.com
+    python monitor.py run                  # poll forever
+    python monitor.py run --once           # poll what's due, then exit
+    python monitor.py changes --user rep@example.com [--since 0]
+"""
+import os
+import time
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+
+from utils.watchlist import get_watchlist
+from utils.metrics import start_metrics_server
+
+load_dotenv()
+
+# Longest the poller sleeps between checks for due feeds
+IDLE_SLEEP = 30.0
+PRUNE_EVERY = 3600.0
+
+
+def run(once: bool = False, batch_size: int = 50, concurrency: int = 4):
+    """Poll due feeds until stopped (or once)"""
+    watchlist = get_watchlist()
+    metrics_port = int(os.getenv('METRICS_PORT', '0') or 0)
+    if metrics_port and not once:
+        start_metrics_server(metrics_port)
+
+    print(f"📡 Monitoring {len({c['company_key'] for c in watchlist.companies()})} companies "
+          f"(every ~{watchlist.poll_interval / 60:.0f} min)")
+    last_prune = 0.0
+    while True:
+        start = time.perf_counter()
+        stats = watchlist.poll_due(batch_size, concurrency)
+        if stats["polled"]:
+            print(f"🗞️ Polled {stats['polled']} feed(s) in {time.perf_counter() - start:.1f}s: "
+                  f"{stats['unchanged']} unchanged, {stats['failed']} failed, {stats['new_items']} new item(s)")
+        if once:
+            return stats
+
+        if time.time() - last_prune > PRUNE_EVERY:
+            watchlist.prune()
+            last_prune = time.time()
+
+        next_poll_at = watchlist.next_poll_at()
+        wait = next_poll_at - time.time() if next_poll_at is not None else IDLE_SLEEP
+        time.sleep(min(max(wait, 0.5), IDLE_SLEEP))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watchlist news monitor")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("add", "watch a company"), ("remove", "stop watching a company")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("company")
+        command.add_argument("--user", default="anonymous")
+
+    list_cmd = sub.add_parser("list", help="watched companies")
+    list_cmd.add_argument("--user")
+
+    changes_cmd = sub.add_parser("changes", help="new items from the change feed")
+    changes_cmd.add_argument("--user")
+    changes_cmd.add_argument("--since", type=int, default=0, help="last sequence number already seen")
+    changes_cmd.add_argument("--limit", type=int, default=50)
+
+    run_cmd = sub.add_parser("run", help="poll feeds as they come due")
+    run_cmd.add_argument("--once", action="store_true", help="poll what's due now, then exit")
+    run_cmd.add_argument("--batch-size", type=int, default=50)
+    run_cmd.add_argument("--concurrency", type=int, default=int(os.getenv('WATCH_POLL_CONCURRENCY', '4')))
+    args = parser.parse_args()
+
+    watchlist = get_watchlist()
+    if args.command == "add":
+        watchlist.add(args.company, args.user)
+        print(f"👀 Watching {args.company} for {args.user}")
+    elif args.command == "remove":
+        watchlist.remove(args.company, args.user)
+        print(f"🗑️ Stopped watching {args.company} for {args.user}")
+    elif args.command == "list":
+        for company in watchlist.companies(args.user):
+            polled = (datetime.fromtimestamp(company['last_polled_at']).strftime("%Y-%m-%d %H:%M")
+                      if company['last_polled_at'] else "never")
+            print(f"{company['company_name']:<30} {company['user_id']:<30} last polled {polled}")
+    elif args.command == "changes":
+        for change in watchlist.changes(args.since, args.user, args.limit):
+            print(f"[{change['seq']}] {change['company_name']}: {change['title']} ({change['published']})")
+    else:
+        try:
+            run(args.once, args.batch_size, args.concurrency)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -207,6 +207,36 @@ def test_full_workflow():
         return False
 
 
+def test_entity_resolution():
+    """Test that only exact names, aliases and tickers resolve to a known company"""
+    print("\n" + "="*60)
+    print("TEST 6: Testing Entity Resolution")
+    print("="*60)
+
+    try:
+        from utils.entities import resolve_company
+
+        # Descriptive words are part of the name, legal forms aren't
+        keys = {name: resolve_company(name)['canonical_id']
+                for name in ("Apex Technologies", "Apex Group", "Apex Holdings")}
+        assert len(set(keys.values())) == 3, f"different companies merged: {keys}"
+        assert resolve_company("Apex Inc.")['canonical_id'] == resolve_company("Apex")['canonical_id']
+        print("✅ Legal suffixes ignored, descriptive words kept")
+
+        # Plain words are not tickers; "$team" and "TEAM" are
+        for word in ("team", "now", "Snow", "Shop", "f"):
+            company = resolve_company(word)
+            assert company['matched_by'] == "none" and company['ticker'] is None, f"{word!r} -> {company}"
+        for ticker in ("$team", "TEAM", "F"):
+            assert resolve_company(ticker)['matched_by'] == "ticker", f"{ticker!r} not matched as a ticker"
+        print("✅ Tickers only match when $-prefixed or all caps")
+
+        return True
+    except Exception as e:
+        print(f"❌ Entity resolution failed: {str(e)}")
+        return False
+
+
 def run_all_tests():
     """Run all Phase 2 tests"""
     print("\n" + "="*60)
@@ -218,7 +248,8 @@ def run_all_tests():
         ("Workflow Creation", test_workflow_creation),
         ("Synthesis Agents", test_synthesis_agents),
         ("Plan Generation", test_plan_generation),
-        ("Full Workflow (Optional)", test_full_workflow)
+        ("Full Workflow (Optional)", test_full_workflow),
+        ("Entity Resolution", test_entity_resolution)
     ]
     
     results = {}
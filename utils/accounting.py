@@ -0,0 +1,398 @@
+"""
+Provider usage accounting
+Counts upstream calls and LLM tokens by provider for each run, user and day
+in a local SQLite ledger, and warns when a provider quota (Alpha Vantage
+calls per day, Tavily credits per month, optionally Gemini tokens per day)
+is nearly used up.
+
+Usage is only charged inside account_run() - the API, the workers and the
+app's onboarding open one per run - so benchmarks and cassette replays
+don't count against real quotas. Report with:
+    python -m utils.accounting [--days 7] [--user rep@example.com]
+"""
+import os
+import time
+import sqlite3
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+def get_quotas() -> Dict[str, tuple]:
+    """
+    Quota of each provider: (period, unit, limit). Periods follow the
+    providers' resets (UTC days / calendar months); a limit of 0 disables
+    the check. Read when used, so values from .env apply.
+    """
+    return {
+        "alpha_vantage": ("day", "calls", int(os.getenv('ALPHA_VANTAGE_DAILY_CALLS', '500'))),
+        "tavily": ("month", "credits", int(os.getenv('TAVILY_MONTHLY_CREDITS', '1000'))),
+        "gemini": ("day", "tokens", int(os.getenv('GEMINI_DAILY_TOKENS', '0'))),
+    }
+
+
+# Tavily bills 1 credit per basic search (2 for advanced)
+CREDITS_PER_CALL = {"tavily": 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (day, user_id, run_id, provider)
+);
+CREATE INDEX IF NOT EXISTS usage_provider ON usage (provider, day);
+CREATE INDEX IF NOT EXISTS usage_user ON usage (user_id, day);
+"""
+
+_COUNTERS = ("calls", "errors", "prompt_tokens", "completion_tokens")
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _period_start(period: str, day: Optional[str] = None) -> str:
+    """First day (YYYY-MM-DD) of the quota period containing day"""
+    day = day or _today()
+    return day[:8] + "01" if period == "month" else day
+
+
+def _units(provider: str, unit: str, row: Dict[str, int]) -> int:
+    if unit == "tokens":
+        return row["prompt_tokens"] + row["completion_tokens"]
+    if unit == "credits":
+        return row["calls"] * CREDITS_PER_CALL.get(provider, 1)
+    return row["calls"]
+
+
+class UsageLedger:
+    """SQLite ledger of provider usage per day, user, run and provider"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection per call (safe across threads), committed on success"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, day: str, user_id: str, run_id: str, usage: Dict[str, Dict[str, int]]):
+        """Add one run's usage ({provider: counters}) to the ledger"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT INTO usage (day, user_id, run_id, provider, calls, errors,
+                                      prompt_tokens, completion_tokens, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (day, user_id, run_id, provider) DO UPDATE SET
+                       calls = calls + excluded.calls,
+                       errors = errors + excluded.errors,
+                       prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                       completion_tokens = completion_tokens + excluded.completion_tokens,
+                       updated_at = excluded.updated_at""",
+                [(day, user_id, run_id, provider, *(counts[c] for c in _COUNTERS), now)
+                 for provider, counts in usage.items()]
+            )
+
+    def totals(self, since_day: str, group_by: str = "provider",
+               user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summed counters since since_day, grouped by provider, user_id, run_id or day"""
+        if group_by not in ("provider", "user_id", "run_id", "day"):
+            raise ValueError(f"Can't group usage by {group_by}")
+        columns = "provider" if group_by == "provider" else f"{group_by}, provider"
+        sql = f"""SELECT {columns}, COUNT(DISTINCT run_id) AS runs,
+                         SUM(calls) AS calls, SUM(errors) AS errors,
+                         SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens
+                  FROM usage WHERE day >= ?"""
+        params: List[Any] = [since_day]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        sql += f" GROUP BY {columns} ORDER BY {columns}"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def quota_status(self) -> List[Dict[str, Any]]:
+        """Use of each quota in its current period"""
+        status = []
+        for provider, (period, unit, limit) in get_quotas().items():
+            if limit <= 0:
+                continue
+            with self._connect() as conn:
+                row = conn.execute(
+                    """SELECT COALESCE(SUM(calls), 0) AS calls, COALESCE(SUM(errors), 0) AS errors,
+                              COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+                              COALESCE(SUM(completion_tokens), 0) AS completion_tokens
+                       FROM usage WHERE provider = ? AND day >= ?""",
+                    (provider, _period_start(period))
+                ).fetchone()
+            used = _units(provider, unit, dict(row))
+            status.append({"provider": provider, "period": period, "unit": unit,
+                           "used": used, "limit": limit, "fraction": used / limit})
+        return status
+
+
+def get_usage_ledger() -> Optional[UsageLedger]:
+    """
+    Shared ledger at USAGE_LEDGER_PATH (default data/usage.sqlite).
+    Set USAGE_LEDGER_PATH to an empty value to disable accounting.
+    """
+    global _ledger
+    path = os.getenv('USAGE_LEDGER_PATH', os.path.join('data', 'usage.sqlite'))
+    if not path:
+        return None
+
+    with _ledger_lock:
+        if _ledger is None or _ledger.path != path:
+            try:
+                _ledger = UsageLedger(path)
+            except Exception as e:
+                print(f"Usage ledger unavailable: {e}")
+                return None
+    return _ledger
+
+
+def quota_warnings(status: List[Dict[str, Any]]) -> List[str]:
+    """Human-readable warnings for quotas at or past QUOTA_WARN_AT (default 80%)"""
+    warn_at = float(os.getenv('QUOTA_WARN_AT', '0.8'))
+    warnings = []
+    for quota in status:
+        if quota["fraction"] < warn_at:
+            continue
+        period = "today" if quota["period"] == "day" else "this month"
+        verb = "exhausted" if quota["fraction"] >= 1 else f"{quota['fraction']:.0%} used"
+        warnings.append(f"{quota['provider']} quota {verb}: {quota['used']:,} of "
+                        f"{quota['limit']:,} {quota['unit']} {period}")
+    return warnings
+
+
+# ============================================================================
+# PER-RUN CHARGING
+# ============================================================================
+
+class RunUsage:
+    """
+    Usage of one run, kept in memory and flushed to the ledger after each
+    node and when the run ends, so concurrent runs' quota checks see it and
+    a crash loses at most the node in progress
+    """
+
+    def __init__(self, run_id: str, user_id: str):
+        self.run_id = run_id
+        self.user_id = user_id
+        self.day = _today()
+        self.warnings: List[str] = []  # quotas nearly used up when the run started
+        self.by_provider: Dict[str, Dict[str, int]] = {}
+        self._flushed: Dict[str, Dict[str, int]] = {}  # part of by_provider already in the ledger
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _counts(self, provider: str) -> Dict[str, int]:
+        counts = self.by_provider.get(provider)
+        if counts is None:
+            counts = self.by_provider[provider] = dict.fromkeys(_COUNTERS, 0)
+        return counts
+
+    def add_call(self, provider: str, ok: bool, retries: int = 0):
+        with self._lock:
+            counts = self._counts(provider)
+            counts["calls"] += 1 + retries
+            if not ok:
+                counts["errors"] += 1
+
+    def add_tokens(self, provider: str, prompt: int, completion: int):
+        with self._lock:
+            counts = self._counts(provider)
+            counts["prompt_tokens"] += prompt
+            counts["completion_tokens"] += completion
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {provider: dict(counts) for provider, counts in self.by_provider.items()}
+
+    def flush(self, ledger: "UsageLedger"):
+        """Add usage charged since the last flush to the ledger"""
+        with self._flush_lock:
+            unflushed = {}
+            for provider, counts in self.snapshot().items():
+                flushed = self._flushed.get(provider) or dict.fromkeys(_COUNTERS, 0)
+                delta = {c: counts[c] - flushed[c] for c in _COUNTERS}
+                if any(delta.values()):
+                    unflushed[provider] = delta
+            if not unflushed:
+                return
+            try:
+                ledger.add(self.day, self.user_id, self.run_id, unflushed)
+            except sqlite3.Error as e:
+                # Kept unflushed; the next flush retries it
+                print(f"⚠️ Could not record usage for run {self.run_id}: {e}")
+                return
+            for provider, delta in unflushed.items():
+                flushed = self._flushed.setdefault(provider, dict.fromkeys(_COUNTERS, 0))
+                for c in _COUNTERS:
+                    flushed[c] += delta[c]
+
+
+# Usage of the run charged in the current thread/context
+_current_usage: contextvars.ContextVar[Optional[RunUsage]] = contextvars.ContextVar("current_usage", default=None)
+
+# run_id -> usage of a run in progress (nodes look theirs up by the state's usage_run_id)
+_active: Dict[str, RunUsage] = {}
+_active_lock = threading.Lock()
+
+
+def charge_call(provider: str, ok: bool = True, retries: int = 0):
+    """Count an upstream call (and its retries) against the current run (no-op outside a run)"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add_call(provider, ok, retries)
+
+
+def charge_tokens(provider: str, prompt: int, completion: int):
+    """Count LLM tokens against the current run (no-op outside a run)"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add_tokens(provider, prompt, completion)
+
+
+@contextmanager
+def use_run_usage(run_id: Optional[str]):
+    """
+    Charge calls made in the block to an active run (used by workflow
+    nodes), flushing them to the ledger when the block ends
+    """
+    usage = _active.get(run_id) if run_id is not None else None
+    if usage is None:
+        yield
+        return
+    token = _current_usage.set(usage)
+    try:
+        yield
+    finally:
+        _current_usage.reset(token)
+        ledger = get_usage_ledger()
+        if ledger is not None:
+            usage.flush(ledger)
+
+
+@contextmanager
+def account_run(state: Optional[Dict], run_id: str, user_id: Optional[str] = None):
+    """
+    Charge the upstream calls and tokens of the run inside the block to
+    run_id and user_id, writing them to the ledger as nodes finish and
+    when the block ends. state is
+    the workflow's initial state (None for runs outside the workflow, e.g.
+    onboarding). Quotas nearly used up are printed and listed in the
+    yielded RunUsage's warnings.
+    """
+    ledger = get_usage_ledger()
+    if ledger is None:
+        yield None
+        return
+
+    usage = RunUsage(run_id, user_id or "anonymous")
+    try:
+        usage.warnings = quota_warnings(ledger.quota_status())
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not check provider quotas: {e}")
+    for warning in usage.warnings:
+        print(f"⚠️ {warning}")
+
+    if state is not None:
+        state['usage_run_id'] = run_id
+    with _active_lock:
+        _active[run_id] = usage
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        with _active_lock:
+            _active.pop(run_id, None)
+        usage.flush(ledger)
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def usage_report(days: int = 7, user_id: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+    """Quota status, usage per user and provider, and the most expensive runs"""
+    ledger = get_usage_ledger()
+    if ledger is None:
+        return {"enabled": False}
+
+    since = datetime.fromtimestamp(time.time() - (days - 1) * 86400, timezone.utc).strftime("%Y-%m-%d")
+    runs: Dict[str, Dict[str, Any]] = {}
+    for row in ledger.totals(since, group_by="run_id", user_id=user_id):
+        run = runs.setdefault(row["run_id"], {"run_id": row["run_id"], "calls": 0, "tokens": 0})
+        run["calls"] += row["calls"]
+        run["tokens"] += row["prompt_tokens"] + row["completion_tokens"]
+
+    return {
+        "enabled": True,
+        "since": since,
+        "quotas": ledger.quota_status(),
+        "by_user": ledger.totals(since, group_by="user_id", user_id=user_id),
+        "by_provider": ledger.totals(since, group_by="provider", user_id=user_id),
+        "top_runs": sorted(runs.values(), key=lambda r: (r["tokens"], r["calls"]), reverse=True)[:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider usage per user and quota status")
+    parser.add_argument("--days", type=int, default=7, help="days to report (including today)")
+    parser.add_argument("--user", help="only this user")
+    args = parser.parse_args()
+
+    report = usage_report(args.days, args.user)
+    if not report["enabled"]:
+        print("Usage accounting is disabled (USAGE_LEDGER_PATH is empty)")
+        return
+
+    print("Quotas")
+    for quota in report["quotas"]:
+        print(f"  {quota['provider']:<15}{quota['used']:>12,} / {quota['limit']:,} {quota['unit']} "
+              f"per {quota['period']} ({quota['fraction']:.0%})")
+    for warning in quota_warnings(report["quotas"]):
+        print(f"  ⚠️ {warning}")
+
+    print(f"\nUsage since {report['since']} by user")
+    print(f"  {'user':<30}{'provider':<15}{'runs':>6}{'calls':>8}{'errors':>8}{'tokens':>12}")
+    for row in report["by_user"]:
+        tokens = row["prompt_tokens"] + row["completion_tokens"]
+        print(f"  {row['user_id'][:29]:<30}{row['provider']:<15}{row['runs']:>6}{row['calls']:>8}"
+              f"{row['errors']:>8}{tokens:>12,}")
+
+    print("\nMost expensive runs")
+    for run in report["top_runs"]:
+        print(f"  {run['run_id']:<40}{run['calls']:>6} calls{run['tokens']:>12,} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Bulk account plan export
+Renders many stored plans to PDF in a process pool and writes them as one
+merged PDF with a table of contents, or as a ZIP of PDFs plus full-research
+JSON. Plans are streamed through temp files, so memory stays flat as the
+batch grows.
+
+Usage:
+    python -m utils.bulk_export --user alice@example.com --format zip --output pack.zip
+    python -m utils.bulk_export --jobs <job_id> <job_id> --format pdf --output pack.pdf
+"""
+import os
+import re
+import argparse
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.exports import export_to_json, plan_story
+from utils.records import expand_state
+
+# Plans rendered concurrently per worker process; bounds memory held by
+# submitted-but-unfinished plans
+IN_FLIGHT_PER_WORKER = 2
+
+
+def _safe_filename(name: str) -> str:
+    return re.sub(r"[^\w\-]+", "_", name or "company").strip("_") or "company"
+
+
+def _plan_title(state: Dict[str, Any]) -> str:
+    return state.get('target_company_name') or (state.get('account_plan') or {}).get('target_company') or "Untitled"
+
+
+def render_plan_pdf(args: Tuple[int, str, str, str]) -> Tuple[int, str, int]:
+    """
+    Process-pool task: render one plan to path, returning (index, path,
+    page count). The plan's title is added as a heading.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet
+    from xml.sax.saxutils import escape
+
+    index, title, content, path = args
+    styles = getSampleStyleSheet()
+    doc = SimpleDocTemplate(path, pagesize=letter, title=title)
+    doc.build([Paragraph(escape(title), styles['Title'])] + plan_story(content, styles))
+    return index, path, doc.page
+
+
+def _render_all(states: Iterable[Dict[str, Any]], workdir: str,
+                workers: Optional[int]) -> Iterator[Tuple[Dict[str, Any], str, int]]:
+    """
+    Render each state's account plan in a process pool, yielding
+    (state, pdf_path, pages) in input order. At most
+    workers * IN_FLIGHT_PER_WORKER plans are held in memory at once.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * IN_FLIGHT_PER_WORKER
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def drain_one():
+            state, future = pending.popleft()
+            _, path, pages = future.result()
+            return state, path, pages
+
+        for index, state in enumerate(states):
+            plan = state.get('account_plan') or {}
+            if not plan.get('content'):
+                continue
+            path = os.path.join(workdir, f"plan_{index:05d}.pdf")
+            future = pool.submit(render_plan_pdf, (index, _plan_title(state), plan['content'], path))
+            pending.append((state, future))
+            if len(pending) >= window:
+                yield drain_one()
+
+        while pending:
+            yield drain_one()
+
+
+def _full_research(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Same shape as the app's full research export"""
+    state = expand_state(state)
+    return {
+        "target_company": state.get('target_company_name'),
+        "user_company": (state.get('user_context') or {}).get('company_name'),
+        "research_data": {
+            "web_results": state.get('web_results', []),
+            "financial_data": state.get('financial_data', {}),
+            "wiki_data": state.get('wiki_data', {}),
+            "news_data": state.get('news_data', [])
+        },
+        "synthesized_data": state.get('synthesized_data', ''),
+        "account_plan": state.get('account_plan', {}),
+        "conflicts": state.get('conflicts', [])
+    }
+
+
+def export_zip(states: Iterable[Dict[str, Any]], output_path: str, workers: Optional[int] = None) -> int:
+    """Write one PDF and one full-research JSON per plan into a ZIP. Returns the plan count."""
+    count = 0
+    used_names = set()
+    with tempfile.TemporaryDirectory() as workdir, \
+            zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for state, path, _ in _render_all(states, workdir, workers):
+            name = _safe_filename(_plan_title(state))
+            if name in used_names:
+                name = f"{name}_{count + 1}"
+            used_names.add(name)
+
+            archive.write(path, f"plans/{name}.pdf")
+            archive.writestr(f"research/{name}.json", export_to_json(_full_research(state)))
+            os.remove(path)
+            count += 1
+    return count
+
+
+def _write_toc(entries, path: str):
+    """Table of contents: one row per plan with its starting page"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    from xml.sax.saxutils import escape
+
+    styles = getSampleStyleSheet()
+    rows = [[Paragraph(escape(title), styles['Normal']), str(page)] for title, page in entries]
+    table = Table(rows, colWidths=[400, 60])
+    table.setStyle(TableStyle([("ALIGN", (1, 0), (1, -1), "RIGHT")]))
+    doc = SimpleDocTemplate(path, pagesize=letter, title="Account Plans")
+    doc.build([Paragraph("Account Plans", styles['Title']), table])
+    return doc.page
+
+
+# ============================================================================
+# STREAMING CONCATENATION
+# ============================================================================
+
+def _remap_refs(obj, ref):
+    """Replace every indirect reference inside obj (in place) with ref(reference)"""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(obj, IndirectObject):
+        return ref(obj)
+    if isinstance(obj, DictionaryObject):
+        for key, value in list(dict.items(obj)):
+            dict.__setitem__(obj, key, _remap_refs(value, ref))
+    elif isinstance(obj, ArrayObject):
+        for i, value in enumerate(list.__iter__(obj)):
+            list.__setitem__(obj, i, _remap_refs(value, ref))
+    return obj
+
+
+def _concatenate_pdfs(parts: List[Tuple[str, Optional[str]]], output_path: str):
+    """
+    Write the pages of each (path, bookmark title) part into one PDF, with
+    a bookmark at the first page of each titled part. Objects are copied
+    one source file at a time and written straight to output_path, so only
+    one part is held in memory however many plans there are.
+    """
+    from pypdf import PdfReader
+    from pypdf.generic import (ArrayObject, DictionaryObject, IndirectObject, NameObject,
+                               NumberObject, create_string_object)
+
+    offsets: List[int] = [0]  # offsets[n] = byte offset of object n (0 is the free-list head)
+
+    def reserve() -> int:
+        offsets.append(0)
+        return len(offsets) - 1
+
+    def write(out, number: int, obj):
+        offsets[number] = out.tell()
+        out.write(f"{number} 0 obj\n".encode())
+        obj.write_to_stream(out)
+        out.write(b"\nendobj\n")
+
+    def indirect(number: int) -> IndirectObject:
+        return IndirectObject(number, 0, None)
+
+    catalog, page_tree, outline_root = reserve(), reserve(), reserve()
+    page_numbers: List[int] = []
+    bookmarks: List[Tuple[int, str, int]] = []  # (object number, title, first page object)
+
+    with open(output_path, "wb") as out:
+        out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        for path, title in parts:
+            reader = PdfReader(path)
+            mapping: Dict[Tuple[int, int], int] = {}
+            pending = deque()
+
+            def ref(source: IndirectObject) -> IndirectObject:
+                key = (source.idnum, source.generation)
+                if key not in mapping:
+                    mapping[key] = reserve()
+                    pending.append(source)
+                return indirect(mapping[key])
+
+            # Pages are re-parented under the new page tree, so inherited
+            # attributes are copied onto each page first
+            pages = {}
+            for page in reader.pages:
+                for name in ("/Resources", "/MediaBox", "/CropBox", "/Rotate"):
+                    parent = page.get("/Parent")
+                    while name not in page and parent is not None:
+                        parent = parent.get_object()
+                        if name in parent:
+                            page[NameObject(name)] = dict.__getitem__(parent, name)
+                        parent = parent.get("/Parent")
+                page[NameObject("/Parent")] = indirect(page_tree)
+                pages[ref(page.indirect_reference).idnum] = page
+            if title and pages:
+                bookmarks.append((reserve(), title, next(iter(pages))))
+            page_numbers.extend(pages)
+
+            while pending:
+                source = pending.popleft()
+                number = mapping[(source.idnum, source.generation)]
+                if number in pages:
+                    # Write the prepared copy; its /Parent already points at the output
+                    page = pages.pop(number)
+                    parent = page.pop(NameObject("/Parent"))
+                    obj = _remap_refs(page, ref)
+                    obj[NameObject("/Parent")] = parent
+                else:
+                    obj = _remap_refs(source.get_object(), ref)
+                write(out, number, obj)
+
+        for i, (number, title, first_page) in enumerate(bookmarks):
+            item = DictionaryObject({
+                NameObject("/Title"): create_string_object(title),
+                NameObject("/Parent"): indirect(outline_root),
+                NameObject("/Dest"): ArrayObject([indirect(first_page), NameObject("/Fit")]),
+            })
+            if i > 0:
+                item[NameObject("/Prev")] = indirect(bookmarks[i - 1][0])
+            if i + 1 < len(bookmarks):
+                item[NameObject("/Next")] = indirect(bookmarks[i + 1][0])
+            write(out, number, item)
+
+        outlines = DictionaryObject({NameObject("/Type"): NameObject("/Outlines"),
+                                     NameObject("/Count"): NumberObject(len(bookmarks))})
+        if bookmarks:
+            outlines[NameObject("/First")] = indirect(bookmarks[0][0])
+            outlines[NameObject("/Last")] = indirect(bookmarks[-1][0])
+        write(out, outline_root, outlines)
+        write(out, page_tree, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(indirect(n) for n in page_numbers),
+            NameObject("/Count"): NumberObject(len(page_numbers)),
+        }))
+        write(out, catalog, DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): indirect(page_tree),
+            NameObject("/Outlines"): indirect(outline_root),
+            NameObject("/PageMode"): NameObject("/UseOutlines"),
+        }))
+
+        xref = out.tell()
+        out.write(f"xref\n0 {len(offsets)}\n0000000000 65535 f \n".encode())
+        for offset in offsets[1:]:
+            out.write(f"{offset:010d} 00000 n \n".encode())
+        out.write(f"trailer\n<< /Size {len(offsets)} /Root {catalog} 0 R >>\n"
+                  f"startxref\n{xref}\n%%EOF\n".encode())
+
+
+def export_merged_pdf(states: Iterable[Dict[str, Any]], output_path: str, workers: Optional[int] = None) -> int:
+    """
+    Write all plans into one PDF: a table of contents, then each plan, with
+    a bookmark per plan. Returns the plan count.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        # Render every plan first: the TOC needs each plan's page count
+        rendered = []
+        for state, path, pages in _render_all(states, workdir, workers):
+            rendered.append((_plan_title(state), path, pages))
+        if not rendered:
+            return 0
+
+        # The TOC's own length shifts every start page; re-render until stable
+        toc_path = os.path.join(workdir, "toc.pdf")
+        toc_pages = 1
+        while True:
+            entries, page = [], toc_pages + 1
+            for title, _, pages in rendered:
+                entries.append((title, page))
+                page += pages
+            actual = _write_toc(entries, toc_path)
+            if actual == toc_pages:
+                break
+            toc_pages = actual
+
+        parts = [(toc_path, None)] + [(path, title) for title, path, _ in rendered]
+        _concatenate_pdfs(parts, output_path)
+    return len(rendered)
+
+
+def main():
+    from utils.job_queue import get_job_queue
+
+    parser = argparse.ArgumentParser(description="Export stored account plans in bulk")
+    parser.add_argument("--jobs", nargs="*", help="job IDs to export (default: all completed jobs)")
+    parser.add_argument("--user", help="only export this user's completed jobs")
+    parser.add_argument("--format", choices=["pdf", "zip"], default="zip")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--workers", type=int, default=None, help="PDF render processes (default: CPU count)")
+    args = parser.parse_args()
+
+    queue = get_job_queue()
+    job_ids = args.jobs or [job['job_id'] for job in queue.list_jobs(user_id=args.user, limit=100000)]
+    states = queue.iter_results(job_ids)
+
+    export = export_merged_pdf if args.format == "pdf" else export_zip
+    count = export(states, args.output, workers=args.workers)
+    print(f"✅ Exported {count} account plans to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
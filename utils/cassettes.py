@@ -0,0 +1,278 @@
+"""
+Record-and-replay cassettes for provider traffic
+In record mode every response from the outbound helpers (Tavily, Wikipedia,
+news, financial lookups) and every LLM call is captured with its latency
+into a versioned JSON cassette. In replay mode the cassette is served back
+deterministically - with the original timing or with no delay - so full
+research runs for real companies can be profiled offline, repeatedly.
+
+Configure with CASSETTE_MODE (record / replay), CASSETTE_PATH and
+CASSETTE_TIMING (original / none), or use_cassette() in scripts.
+"""
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+# Bump when the cassette layout changes
+CASSETTE_VERSION = 1
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a call"""
+
+
+class ReplayedMessage:
+    """LLM response served from a cassette (same attributes the agents read)"""
+
+    def __init__(self, content: str, response_metadata: Optional[Dict] = None):
+        self.content = content
+        self.response_metadata = response_metadata or {}
+
+
+def request_key(provider: str, request: Any) -> str:
+    """Stable key for a call: provider + hash of its JSON-encoded arguments"""
+    encoded = json.dumps(request, sort_keys=True, default=str)
+    return f"{provider}:{hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]}"
+
+
+class Cassette:
+    """
+    Recorded interactions for one cassette file.
+    Replay matches calls by provider and arguments; repeated identical
+    calls are served in recorded order. With strict=False a call whose
+    arguments changed (e.g. an LLM prompt after a prompt edit) gets the next
+    unused response from the same provider and helper instead of raising
+    CassetteMiss.
+    """
+
+    def __init__(self, path: str, mode: str, timing: str = "original", strict: bool = False):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.strict = strict
+        self.misses = 0
+        self.metadata: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._interactions: List[Dict[str, Any]] = []
+        self._used: set = set()
+        self._by_key: Dict[str, List[int]] = {}
+
+        if mode == REPLAY:
+            self._load()
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        version = data.get("version", 0)
+        if version > CASSETTE_VERSION:
+            raise ValueError(f"Cassette {self.path} is v{version}; this code reads up to v{CASSETTE_VERSION}")
+        self.metadata = data.get("metadata", {})
+        self._interactions = data.get("interactions", [])
+        for index, interaction in enumerate(self._interactions):
+            self._by_key.setdefault(interaction["key"], []).append(index)
+
+    def __len__(self):
+        return len(self._interactions)
+
+    def rewind(self):
+        """Serve the cassette from the start again (for repeated replays)"""
+        with self._lock:
+            self._used.clear()
+            self.misses = 0
+
+    def save(self):
+        """Write recorded interactions (record mode only)"""
+        if self.mode != RECORD:
+            return
+        with self._lock:
+            data = {
+                "version": CASSETTE_VERSION,
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                "metadata": self.metadata,
+                "interactions": list(self._interactions),
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, default=str)
+        os.replace(tmp_path, self.path)
+
+    def record(self, provider: str, request: Any, response: Any, seconds: float,
+               error: Optional[BaseException] = None):
+        interaction = {
+            "provider": provider,
+            "key": request_key(provider, request),
+            "request": request,
+            "response": response,
+            "seconds": round(seconds, 4),
+        }
+        if error is not None:
+            interaction["error"] = {"type": type(error).__name__, "message": str(error)}
+        with self._lock:
+            self._interactions.append(interaction)
+
+    def _next(self, provider: str, request: Any) -> Dict[str, Any]:
+        key = request_key(provider, request)
+        with self._lock:
+            for index in self._by_key.get(key, []):
+                if index not in self._used:
+                    self._used.add(index)
+                    return self._interactions[index]
+
+            if not self.strict:
+                fn = _request_fn(request)
+                for index, interaction in enumerate(self._interactions):
+                    if (interaction["provider"] == provider and index not in self._used
+                            and _request_fn(interaction["request"]) == fn):
+                        self._used.add(index)
+                        self.misses += 1
+                        return interaction
+
+            # Everything for this call was used already: repeat the last match
+            matches = self._by_key.get(key)
+            if matches:
+                return self._interactions[matches[-1]]
+        raise CassetteMiss(f"No recorded {provider} response for {json.dumps(request, default=str)[:200]}")
+
+    def replay(self, provider: str, request: Any) -> Any:
+        """The recorded response, after the recorded delay if timing is "original" """
+        interaction = self._next(provider, request)
+        if self.timing == "original":
+            time.sleep(interaction["seconds"])
+        if "error" in interaction:
+            raise RuntimeError(interaction["error"]["message"])
+        return interaction["response"]
+
+
+# ============================================================================
+# ACTIVE CASSETTE
+# ============================================================================
+
+_active: Optional[Cassette] = None
+_active_lock = threading.Lock()
+_env_loaded = False
+
+
+def get_active_cassette() -> Optional[Cassette]:
+    """The cassette in use, if any (first call applies CASSETTE_MODE/CASSETTE_PATH)"""
+    global _active, _env_loaded
+    if _env_loaded:
+        return _active
+
+    with _active_lock:
+        if not _env_loaded:
+            mode = os.getenv('CASSETTE_MODE', '').strip().lower()
+            if mode in (RECORD, REPLAY) and _active is None:
+                path = os.getenv('CASSETTE_PATH', os.path.join('data', 'cassettes', 'session.json'))
+                _active = Cassette(path, mode, timing=os.getenv('CASSETTE_TIMING', 'original'))
+                if mode == RECORD:
+                    atexit.register(_active.save)
+            _env_loaded = True
+    return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str, timing: str = "original", strict: bool = False):
+    """Record or replay provider traffic inside the block (saved on exit when recording)"""
+    global _active, _env_loaded
+    cassette = Cassette(path, mode, timing=timing, strict=strict)
+    with _active_lock:
+        previous, _active = _active, cassette
+        _env_loaded = True
+    try:
+        yield cassette
+    finally:
+        with _active_lock:
+            _active = previous
+        cassette.save()
+
+
+def _call(provider: str, request: Any, fn, *args, **kwargs):
+    cassette = get_active_cassette()
+    if cassette is None:
+        return fn(*args, **kwargs)
+    if cassette.mode == REPLAY:
+        return cassette.replay(provider, request)
+
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        cassette.record(provider, request, None, time.perf_counter() - start, error=e)
+        raise
+    cassette.record(provider, request, result, time.perf_counter() - start)
+    return result
+
+
+def _request_fn(request: Any) -> Optional[str]:
+    """Helper name a recorded request was made through (None for LLM prompts)"""
+    return request.get("fn") if isinstance(request, dict) else None
+
+
+def _serializable(value: Any) -> bool:
+    try:
+        json.dumps(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _call_request(fn, args, kwargs) -> Dict[str, Any]:
+    """
+    Recorded form of a helper call. Arguments that aren't JSON data (such as
+    a cancel_event) don't change the response and would make the key differ
+    on every run, so they are left out; trailing ones are dropped so that
+    f(x) and f(x, cancel_event=...) share a key.
+    """
+    args = [arg if _serializable(arg) else None for arg in args]
+    while args and args[-1] is None:
+        args.pop()
+    kwargs = {name: value for name, value in kwargs.items() if _serializable(value)}
+    return {"fn": fn.__name__, "args": args, "kwargs": kwargs}
+
+
+def cassette_call(provider: str):
+    """Decorator for outbound helpers returning JSON-like data: record or replay their responses"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            request = _call_request(fn, args, kwargs)
+            return _call(provider, request, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class CassetteLLM:
+    """Wraps a chat model so invoke() is recorded or replayed like the provider helpers"""
+
+    def __init__(self, llm, provider: str = "gemini"):
+        self._llm = llm
+        self._provider = provider
+
+    def _invoke(self, prompt, *args, **kwargs):
+        response = self._llm.invoke(prompt, *args, **kwargs)
+        return {
+            "content": response.content,
+            "response_metadata": getattr(response, "response_metadata", None) or {},
+        }
+
+    def invoke(self, prompt, *args, **kwargs):
+        if get_active_cassette() is None:
+            return self._llm.invoke(prompt, *args, **kwargs)
+        result = _call(self._provider, {"prompt": str(prompt)}, self._invoke, prompt, *args, **kwargs)
+        return ReplayedMessage(result["content"], result["response_metadata"])
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
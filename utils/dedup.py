@@ -0,0 +1,109 @@
+"""
+Near-duplicate elimination for research sources
+SimHash fingerprints over titles and snippets, bucketed by band (LSH) so
+syndicated copies of the same article can be collapsed before prompting
+"""
+import re
+import hashlib
+from typing import Callable, Dict, List, Tuple
+
+SIMHASH_BITS = 64
+# With 4 bands of 16 bits, any two fingerprints within 3 bits of each other
+# share at least one band exactly (pigeonhole), so banding loses no matches
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+DEFAULT_MAX_DISTANCE = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> List[str]:
+    """Lowercased word tokens plus word bigrams"""
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash fingerprint of text"""
+    weights = [0] * SIMHASH_BITS
+    for feature in _features(text):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(fingerprint: int):
+    mask = (1 << BAND_BITS) - 1
+    return [(band, fingerprint >> (band * BAND_BITS) & mask) for band in range(BANDS)]
+
+
+def dedupe_items(items: List[Dict], text_fn: Callable[[Dict], str],
+                 score_fn: Callable[[Dict], float] = lambda item: item.get('confidence', 0) or 0,
+                 max_distance: int = DEFAULT_MAX_DISTANCE) -> Tuple[List[Dict], int]:
+    """
+    Collapse near-duplicate items.
+
+    Items are clustered by SimHash of text_fn(item) (Hamming distance
+    <= max_distance, max 3 so banding stays exact). Each cluster keeps its
+    highest-scoring copy, annotated with "duplicates_merged". Kept items stay
+    in their original order. Returns (kept_items, merged_count).
+    """
+    max_distance = min(max_distance, BANDS - 1)
+
+    # Visit best copies first so they become the cluster representatives
+    order = sorted(range(len(items)), key=lambda i: -score_fn(items[i]))
+
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    fingerprints: Dict[int, int] = {}
+    merged_into: Dict[int, int] = {}  # representative index -> copies merged
+
+    for i in order:
+        text = text_fn(items[i])
+        if not _TOKEN_RE.search((text or "").lower()):
+            merged_into[i] = 0  # Nothing to compare on, always keep
+            continue
+
+        fingerprint = simhash(text)
+        bands = _bands(fingerprint)
+
+        representative = None
+        for band in bands:
+            for candidate in buckets.get(band, []):
+                if hamming_distance(fingerprint, fingerprints[candidate]) <= max_distance:
+                    representative = candidate
+                    break
+            if representative is not None:
+                break
+
+        if representative is not None:
+            merged_into[representative] += 1
+            continue
+
+        fingerprints[i] = fingerprint
+        merged_into[i] = 0
+        for band in bands:
+            buckets.setdefault(band, []).append(i)
+
+    kept = []
+    for i in sorted(merged_into):
+        item = items[i]
+        if merged_into[i]:
+            item = dict(item, duplicates_merged=merged_into[i])
+        kept.append(item)
+    return kept, len(items) - len(kept)
+
+
+def news_title_key(title: str) -> str:
+    """Google News titles end in ' - Publisher'; drop it so syndicated copies match"""
+    head, sep, _ = (title or "").rpartition(" - ")
+    return head if sep and head else (title or "")
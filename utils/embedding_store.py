@@ -0,0 +1,316 @@
+"""
+Persistent embedding cache
+Vectors keyed by content hash live in one contiguous float32 array that is
+memory-mapped from disk. Each row is stamped with a digest of its key in a
+parallel file, and rows are handed out from a shared counter under a file
+lock, so several processes (job workers, API workers) can share one cache:
+a row another process has reused for a different key reads as a miss
+instead of returning the wrong vector. The JSON side index only records
+each process's key -> row map and LRU order for a warm start, and is
+checked against the stamps when loaded.
+"""
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+INDEX_VERSION = 2
+VECTORS_FILE = "vectors.f32"
+STAMPS_FILE = "keys.sha1"
+USED_FILE = "used.i64"
+LOCK_FILE = "store.lock"
+INDEX_FILE = "index.json"
+STAMP_BYTES = 20
+
+
+def content_hash(text: str, model_name: str = "") -> str:
+    """Stable key for a piece of text embedded with a given model"""
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _stamp(key: str) -> bytes:
+    """Digest of a key, written next to its vector"""
+    return hashlib.sha1(key.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    Embedding cache with LRU eviction and vectorized cosine search.
+
+    Vectors are stored L2-normalized in a (capacity, dim) float32 array, so
+    cosine similarity is a single matrix-vector product. When `path` is None
+    the array lives in memory only. When the store is full, the least
+    recently used entry (in this process's view) has its row reused.
+    """
+
+    def __init__(self, dim: int, capacity: int = 100000, path: Optional[str] = None,
+                 model_name: str = ""):
+        import numpy as np
+
+        self.dim = dim
+        self.capacity = capacity
+        self.path = path
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+        # Threads of this process; the file lock covers other processes
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._rows: "OrderedDict[str, int]" = OrderedDict()  # hash -> row, oldest first
+        self._row_keys: List[Optional[str]] = [None] * capacity  # row -> hash
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._victim = -1  # last row reused when this process has no entries to evict
+
+        if path is None:
+            self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self._stamps = np.zeros((capacity, STAMP_BYTES), dtype=np.uint8)
+            self._shared_used = np.zeros(1, dtype=np.int64)  # rows handed out so far
+            return
+
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, LOCK_FILE), "a+")
+        with self._locked():
+            files = [os.path.join(path, name) for name in (VECTORS_FILE, STAMPS_FILE, USED_FILE)]
+            index = self._read_index()
+            mode = "r+" if index is not None and all(os.path.exists(f) for f in files) else "w+"
+            self._vectors = np.memmap(files[0], dtype=np.float32, mode=mode, shape=(capacity, dim))
+            self._stamps = np.memmap(files[1], dtype=np.uint8, mode=mode, shape=(capacity, STAMP_BYTES))
+            self._shared_used = np.memmap(files[2], dtype=np.int64, mode=mode, shape=(1,))
+            if mode == "w+":
+                # Write a matching index right away so processes starting
+                # later open these files instead of truncating them
+                self._dirty = True
+                self.flush()
+
+        if mode == "r+":
+            # Keep only entries whose row still holds their key
+            for key, row in index["rows"]:
+                if self._stamps[int(row)].tobytes() == _stamp(key):
+                    self._rows[key] = int(row)
+                    self._row_keys[int(row)] = key
+
+        atexit.register(self.flush)
+
+    @property
+    def _used(self) -> int:
+        return int(self._shared_used[0])
+
+    @contextmanager
+    def _locked(self):
+        """This process's lock plus, for on-disk stores, the cross-process file lock"""
+        with self._lock:
+            if self._lock_file is None or fcntl is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key: str):
+        return key in self._rows
+
+    # ---------------- persistence ----------------
+
+    def _read_index(self) -> Optional[Dict]:
+        """Load the side index if it matches this store's shape and model"""
+        try:
+            with open(os.path.join(self.path, INDEX_FILE)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (index.get("version") != INDEX_VERSION or index.get("dim") != self.dim
+                or index.get("capacity") != self.capacity or index.get("model") != self.model_name):
+            print("Embedding cache index does not match current settings, starting fresh")
+            return None
+        return index
+
+    def flush(self):
+        """Write vectors and the side index (LRU order included) to disk"""
+        if self.path is None:
+            return
+        with self._locked():
+            if not self._dirty:
+                return
+            self._vectors.flush()
+            self._stamps.flush()
+            self._shared_used.flush()
+            index = {
+                "version": INDEX_VERSION,
+                "dim": self.dim,
+                "capacity": self.capacity,
+                "model": self.model_name,
+                "rows": list(self._rows.items())
+            }
+            tmp_path = os.path.join(self.path, INDEX_FILE + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, os.path.join(self.path, INDEX_FILE))
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def _maybe_flush(self, interval: float = 5.0):
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    # ---------------- reads / writes ----------------
+
+    def _allocate_row(self) -> int:
+        """Next free row (shared counter), evicting the least recently used entry when full"""
+        used = self._used
+        if used < self.capacity:
+            self._shared_used[0] = used + 1
+            return used
+        if not self._rows:
+            # Filled by other processes: reuse rows in turn
+            self._victim = (self._victim + 1) % self.capacity
+            return self._victim
+        key, row = self._rows.popitem(last=False)
+        self._row_keys[row] = None
+        return row
+
+    def _holds(self, row: int, key: str) -> bool:
+        return self._stamps[row].tobytes() == _stamp(key)
+
+    def put_many(self, keys: List[str], vectors):
+        """Store vectors (normalized on the way in) under the given keys"""
+        import numpy as np
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        with self._locked():
+            for key, vector in zip(keys, vectors):
+                row = self._rows.get(key)
+                if row is None or not self._holds(row, key):
+                    row = self._allocate_row()
+                # Clear the stamp first so readers never pair the new vector with the old key
+                self._stamps[row] = 0
+                self._vectors[row] = vector
+                self._stamps[row] = np.frombuffer(_stamp(key), dtype=np.uint8)
+                self._rows[key] = row
+                self._rows.move_to_end(key)
+                self._row_keys[row] = key
+            self._dirty = True
+
+    def get_many(self, keys: List[str]) -> Tuple[Dict[str, int], List[str]]:
+        """Return ({key: row} for cached keys, [missing keys]) and refresh LRU order"""
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    missing.append(key)
+                else:
+                    self._rows.move_to_end(key)
+                    found[key] = row
+        return found, missing
+
+    def get_or_embed(self, texts: List[str], embed_fn: Callable[[List[str]], "object"],
+                     batch_size: int = 64):
+        """
+        Return an (n, dim) array of embeddings for texts, embedding only the
+        ones not already cached. embed_fn takes a list of texts and returns
+        an array of vectors; it is called once per batch of misses.
+        """
+        import numpy as np
+
+        keys = [content_hash(t, self.model_name) for t in texts]
+        found, missing = self.get_many(keys)
+        result = np.empty((len(keys), self.dim), dtype=np.float32)
+
+        # Copy cached vectors out before inserts can evict their rows. Another
+        # process may have reused a row: check its stamp before and after
+        # copying, and treat a changed row as a miss
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = found.get(key)
+                if row is None:
+                    continue
+                if self._holds(row, key):
+                    result[i] = self._vectors[row]
+                    if self._holds(row, key):
+                        continue
+                missing.append(key)
+                del found[key]
+                if self._rows.get(key) == row:
+                    del self._rows[key]
+                    self._row_keys[row] = None
+
+        # Embed each distinct missing text once
+        missing = set(missing)
+        to_embed = {}
+        for key, text in zip(keys, texts):
+            if key in missing and key not in to_embed:
+                to_embed[key] = text
+        self.hits += len(keys) - sum(1 for key in keys if key in missing)
+        self.misses += len(to_embed)
+
+        missing_keys = list(to_embed)
+        fresh = {}
+        for start in range(0, len(missing_keys), batch_size):
+            batch_keys = missing_keys[start:start + batch_size]
+            vectors = np.asarray(embed_fn([to_embed[k] for k in batch_keys]), dtype=np.float32)
+            self.put_many(batch_keys, vectors)
+            norms = np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            fresh.update(zip(batch_keys, vectors / norms))
+
+        for i, key in enumerate(keys):
+            if key in fresh:
+                result[i] = fresh[key]
+
+        if to_embed:
+            self._maybe_flush()
+        return result
+
+    # ---------------- search ----------------
+
+    def search(self, query_vectors, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Top-k cosine matches over the whole store for each query vector"""
+        import numpy as np
+
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dim)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            used = self._used
+            if used == 0:
+                return [[] for _ in range(len(queries))]
+            scores = queries @ self._vectors[:used].T
+            row_keys = list(self._row_keys)
+
+        k = min(k, used)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for q, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[q, candidates])]
+            # Skip rows this process doesn't know or that another process has reused
+            results.append([(row_keys[int(r)], float(scores[q, r])) for r in ordered
+                            if row_keys[int(r)] is not None and self._holds(int(r), row_keys[int(r)])])
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._rows),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,219 @@
+"""
+Company entity resolution
+Normalizes company names and maps aliases, legal-suffix variants and
+tickers to one canonical company ID used by every source and cache
+"""
+import re
+import bisect
+import difflib
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, TypedDict
+
+
+class ResolvedCompany(TypedDict):
+    """Result of resolving a user-entered company name"""
+    canonical_id: str  # Stable key for caches and the knowledge base
+    name: str  # Display/search name (e.g. for Wikipedia and news queries)
+    ticker: Optional[str]
+    matched_by: str  # "alias", "ticker" or "none"
+    # Close prefix/fuzzy match, offered as "did you mean" but never used as
+    # the company's identity ("Vista" is not Visa)
+    suggestion: Optional[str]
+
+
+# Trailing legal forms, which don't distinguish one company from another.
+# Descriptive words ("Group", "Holdings", "Technologies") do: "Apex Group"
+# and "Apex Technologies" can be different companies.
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company",
+    "ltd", "limited", "llc", "llp", "lp", "plc", "sa", "ag", "nv", "bv", "se",
+    "gmbh",
+}
+
+# Seed aliases: (canonical id, display name, ticker, extra aliases)
+KNOWN_COMPANIES = [
+    ("microsoft", "Microsoft", "MSFT", []),
+    ("apple", "Apple Inc.", "AAPL", ["apple computer"]),
+    ("alphabet", "Alphabet Inc.", "GOOGL", ["google", "goog"]),
+    ("amazon", "Amazon", "AMZN", ["amazon com", "aws", "amazon web services"]),
+    ("meta", "Meta Platforms", "META", ["facebook", "fb"]),
+    ("tesla", "Tesla, Inc.", "TSLA", ["tesla motors"]),
+    ("nvidia", "Nvidia", "NVDA", []),
+    ("salesforce", "Salesforce", "CRM", ["salesforce com"]),
+    ("oracle", "Oracle Corporation", "ORCL", []),
+    ("ibm", "IBM", "IBM", ["international business machines"]),
+    ("intel", "Intel", "INTC", []),
+    ("amd", "AMD", "AMD", ["advanced micro devices"]),
+    ("cisco", "Cisco", "CSCO", ["cisco systems"]),
+    ("adobe", "Adobe Inc.", "ADBE", ["adobe systems"]),
+    ("netflix", "Netflix", "NFLX", []),
+    ("sap", "SAP", "SAP", ["sap se"]),
+    ("servicenow", "ServiceNow", "NOW", ["service now"]),
+    ("workday", "Workday, Inc.", "WDAY", []),
+    ("snowflake", "Snowflake Inc.", "SNOW", []),
+    ("shopify", "Shopify", "SHOP", []),
+    ("uber", "Uber", "UBER", ["uber technologies"]),
+    ("airbnb", "Airbnb", "ABNB", []),
+    ("zoom", "Zoom Video Communications", "ZM", ["zoom video", "zoom communications"]),
+    ("hubspot", "HubSpot", "HUBS", []),
+    ("atlassian", "Atlassian", "TEAM", []),
+    ("dell", "Dell Technologies", "DELL", ["dell"]),
+    ("hp", "HP Inc.", "HPQ", ["hewlett packard", "hp inc"]),
+    ("hpe", "Hewlett Packard Enterprise", "HPE", []),
+    ("walmart", "Walmart", "WMT", ["wal mart"]),
+    ("target", "Target Corporation", "TGT", []),
+    ("jpmorgan", "JPMorgan Chase", "JPM", ["jp morgan", "jpmorgan chase", "chase"]),
+    ("goldman sachs", "Goldman Sachs", "GS", ["goldman"]),
+    ("bank of america", "Bank of America", "BAC", ["bofa"]),
+    ("coca cola", "The Coca-Cola Company", "KO", ["coke", "cocacola"]),
+    ("pepsico", "PepsiCo", "PEP", ["pepsi"]),
+    ("procter & gamble", "Procter & Gamble", "PG", ["p&g", "procter and gamble"]),
+    ("johnson & johnson", "Johnson & Johnson", "JNJ", ["j&j", "johnson and johnson"]),
+    ("pfizer", "Pfizer", "PFE", []),
+    ("boeing", "Boeing", "BA", []),
+    ("general electric", "General Electric", "GE", []),
+    ("ford", "Ford Motor Company", "F", ["ford motor"]),
+    ("general motors", "General Motors", "GM", []),
+    ("toyota", "Toyota", "TM", ["toyota motor"]),
+    ("sony", "Sony", "SONY", []),
+    ("visa", "Visa Inc.", "V", []),
+    ("mastercard", "Mastercard", "MA", []),
+    ("paypal", "PayPal", "PYPL", []),
+    ("stripe", "Stripe, Inc.", None, []),
+    ("openai", "OpenAI", None, ["open ai"]),
+]
+
+# Shortest input considered for prefix/fuzzy matching (short tickers like
+# "F" or "GE" only ever match exactly)
+MIN_APPROXIMATE_LENGTH = 4
+
+# A prefix must cover this share of the alias to count ("Microso" matches
+# Microsoft, "Micro" doesn't)
+MIN_PREFIX_COVERAGE = 0.6
+
+
+@lru_cache(maxsize=4096)
+def normalize_company_name(name: str) -> str:
+    """
+    Lowercase, strip quotes/punctuation and trailing legal suffixes.
+    "Microsoft Corp." and " microsoft " both become "microsoft".
+    """
+    text = (name or "").lower().replace("\\", " ")
+    text = re.sub(r"[^\w\s&]", " ", text)
+    words = text.split()
+    if words and words[0] == "the" and len(words) > 1:
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+class EntityIndex:
+    """Alias index with exact, prefix (sorted aliases + bisect) and fuzzy lookups"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._companies: Dict[str, Dict] = {}  # canonical id -> {name, ticker}
+        self._aliases: Dict[str, str] = {}  # normalized alias -> canonical id
+        self._tickers: Dict[str, str] = {}  # upper-case ticker -> canonical id
+        self._sorted_aliases: List[str] = []
+
+    def register(self, canonical_id: str, name: str, ticker: Optional[str] = None,
+                 aliases: Optional[List[str]] = None):
+        """Add (or extend) a company and its aliases"""
+        with self._lock:
+            company = self._companies.setdefault(canonical_id, {"name": name, "ticker": ticker})
+            if ticker and not company["ticker"]:
+                company["ticker"] = ticker
+
+            keys = {normalize_company_name(canonical_id), normalize_company_name(name)}
+            keys.update(normalize_company_name(a) for a in aliases or [])
+            for key in keys:
+                if key and key not in self._aliases:
+                    self._aliases[key] = canonical_id
+                    bisect.insort(self._sorted_aliases, key)
+            if ticker:
+                self._tickers.setdefault(ticker.upper(), canonical_id)
+
+    def _result(self, canonical_id: str, matched_by: str) -> ResolvedCompany:
+        company = self._companies[canonical_id]
+        return ResolvedCompany(
+            canonical_id=canonical_id,
+            name=company["name"],
+            ticker=company["ticker"],
+            matched_by=matched_by,
+            suggestion=None
+        )
+
+    def suggest(self, key: str) -> Optional[str]:
+        """Display name of the one company key is probably a typo or prefix of"""
+        if len(key) < MIN_APPROXIMATE_LENGTH:
+            return None
+        prefixed = self.prefix_matches(key, MIN_PREFIX_COVERAGE)
+        if len(prefixed) == 1:
+            return self._companies[prefixed[0]]["name"]
+
+        candidates = [a for a in self._sorted_aliases if len(a) >= MIN_APPROXIMATE_LENGTH]
+        close = difflib.get_close_matches(key, candidates, n=1, cutoff=0.85)
+        if close:
+            return self._companies[self._aliases[close[0]]]["name"]
+        return None
+
+    def prefix_matches(self, prefix: str, min_coverage: float = 0.0) -> List[str]:
+        """Canonical ids with an alias that starts with prefix (and is mostly covered by it)"""
+        i = bisect.bisect_left(self._sorted_aliases, prefix)
+        ids = []
+        while i < len(self._sorted_aliases) and self._sorted_aliases[i].startswith(prefix):
+            alias = self._sorted_aliases[i]
+            canonical_id = self._aliases[alias]
+            if len(prefix) >= min_coverage * len(alias) and canonical_id not in ids:
+                ids.append(canonical_id)
+            i += 1
+        return ids
+
+    def resolve(self, company_name: str) -> ResolvedCompany:
+        """
+        Resolve a user-entered name to a canonical company. Only exact alias
+        and ticker matches share a company's ID and ticker; anything else is
+        its own entity, with a close match as a suggestion.
+        """
+        raw = (company_name or "").strip().strip('"\'').strip()
+        key = normalize_company_name(raw)
+
+        if key in self._aliases:
+            return self._result(self._aliases[key], "alias")
+
+        # Only "$team" or "TEAM" is a ticker; "team", "now" or "Shop" are words
+        ticker = raw[1:].upper() if raw.startswith("$") else raw
+        if ticker in self._tickers and re.fullmatch(r"[A-Z.]{1,6}", ticker):
+            return self._result(self._tickers[ticker], "ticker")
+
+        return ResolvedCompany(
+            canonical_id=key,
+            name=re.sub(r"\s+", " ", raw.replace("\\", " ")).strip(),
+            ticker=None,
+            matched_by="none",
+            suggestion=self.suggest(key)
+        )
+
+
+def _build_default_index() -> EntityIndex:
+    index = EntityIndex()
+    for canonical_id, name, ticker, aliases in KNOWN_COMPANIES:
+        index.register(canonical_id, name, ticker, aliases)
+    return index
+
+
+entity_index = _build_default_index()
+
+
+def resolve_company(company_name: str) -> ResolvedCompany:
+    """Resolve a company name against the shared alias index"""
+    return entity_index.resolve(company_name)
+
+
+def register_company(canonical_id: str, name: str, ticker: Optional[str] = None,
+                     aliases: Optional[List[str]] = None):
+    """Teach the shared index a new company/alias (e.g. a ticker learned at runtime)"""
+    entity_index.register(canonical_id, name, ticker, aliases)
@@ -0,0 +1,129 @@
+"""
+Account plan exports
+PDF/JSON builders plus a content-hash cache that builds exports on a
+background thread only when a download is requested
+"""
+import re
+import json
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
+
+def export_to_json(data, filename="account_plan.json"):
+    """Export data to JSON"""
+    json_str = json.dumps(data, indent=2)
+    return json_str
+
+
+def plan_story(content, styles=None):
+    """
+    ReportLab flowables for a markdown plan: #/##/### headings, "-"/"*"
+    bullets and **bold**; text is escaped so "&" or "<" can't break parsing
+    """
+    styles = styles or getSampleStyleSheet()
+    story = []
+
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        level = len(line) - len(line.lstrip('#'))
+        text = line.lstrip('#').strip() if level else line
+        bullet = not level and text[:2] in ("- ", "* ")
+        if bullet:
+            text = text[2:]
+
+        text = _BOLD_RE.sub(r"<b>\1</b>", escape(text))
+        if level == 1:
+            story.append(Paragraph(text, styles['Heading1']))
+        elif level == 2:
+            story.append(Paragraph(text, styles['Heading2']))
+        elif level >= 3:
+            story.append(Paragraph(text, styles['Heading3']))
+        elif bullet:
+            story.append(Paragraph(text, styles['Normal'], bulletText="•"))
+        else:
+            story.append(Paragraph(text, styles['Normal']))
+        story.append(Spacer(1, 0.1*inch))
+
+    return story
+
+
+def export_to_pdf(content, filename="account_plan.pdf"):
+    """Export content to PDF"""
+    buffer = BytesIO()
+
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc.build(plan_story(content))
+    buffer.seek(0)
+    return buffer
+
+
+def export_key(kind: str, content: str) -> str:
+    """Cache key for an export of the given kind built from content"""
+    return f"{kind}:{hashlib.sha1(content.encode('utf-8')).hexdigest()}"
+
+
+class ExportCache:
+    """
+    Built exports keyed by content hash (LRU-bounded). Builds run on a
+    background thread; identical requests share one build.
+    """
+
+    def __init__(self, max_entries: int = 32, workers: int = 1):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._builds: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def request(self, key: str, build: Callable[[], bytes]) -> Future:
+        """Start building an export (no-op if it is already built or building)"""
+        with self._lock:
+            future = self._builds.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._executor.submit(build)
+                self._builds[key] = future
+            self._builds.move_to_end(key)
+            while len(self._builds) > self.max_entries:
+                self._builds.popitem(last=False)
+            return future
+
+    def status(self, key: str) -> str:
+        """"missing", "building", "ready" or "failed" """
+        with self._lock:
+            future = self._builds.get(key)
+        if future is None:
+            return "missing"
+        if not future.done():
+            return "building"
+        return "failed" if future.exception() is not None else "ready"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The built export, or None if it isn't ready"""
+        with self._lock:
+            future = self._builds.get(key)
+            if future is not None:
+                self._builds.move_to_end(key)
+        if future is None or not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def error(self, key: str) -> Optional[BaseException]:
+        with self._lock:
+            future = self._builds.get(key)
+        if future is None or not future.done():
+            return None
+        return future.exception()
@@ -0,0 +1,552 @@
+"""
+Financial history store
+Bulk-downloads daily prices and annual fundamentals for resolved tickers
+with yfinance and keeps them in local columnar files (Parquet when pyarrow
+or fastparquet is installed, pickled DataFrames otherwise). Trend metrics -
+returns, volatility, drawdown, revenue growth and margins - and each
+ticker's percentile among its sector peers are computed for every stored
+ticker at once with vectorized pandas/NumPy operations, so a research run
+reads a stored ticker's trends without any network call. Tickers a run
+misses are downloaded in the background for later runs.
+
+Refresh the store on a schedule (e.g. nightly):
+    python -m utils.financial_history refresh            # known + researched + watched tickers
+    python -m utils.financial_history refresh MSFT CRM
+    python -m utils.financial_history show MSFT
+"""
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import instrument_call, submit_with_context
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+# Income statement rows kept per fiscal year
+FUNDAMENTAL_ROWS = {
+    "revenue": "Total Revenue",
+    "operating_income": "Operating Income",
+    "net_income": "Net Income",
+}
+
+# Metrics ranked against peers (share of peers at or below the ticker)
+PERCENTILE_METRICS = ("return_1y", "volatility_1y", "revenue_growth", "revenue_cagr_3y", "net_margin")
+
+# Sectors with fewer stored tickers than this are ranked against all of them
+MIN_PEERS = 5
+
+TRADING_DAYS = 252
+
+# Stored tickers whose last close is this much older than the newest stored
+# close (delisted, renamed) are skipped instead of widening every download
+STALE_AFTER_DAYS = 30
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _setting(name: str, default: str) -> str:
+    return os.getenv(name, default)
+
+
+def _parquet_engine() -> Optional[str]:
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return engine
+        except ImportError:
+            continue
+    return None
+
+
+# ============================================================================
+# DOWNLOADS
+# ============================================================================
+
+def _long_frame(wide: pd.DataFrame, value_name: str) -> pd.DataFrame:
+    """date x ticker frame -> rows of (date, ticker, value)"""
+    wide = wide.rename_axis(index="date", columns=None)
+    return wide.reset_index().melt(id_vars="date", var_name="ticker", value_name=value_name)
+
+
+@instrument_call("yahoo_finance", size_fn=lambda frame: len(frame) * 24)
+def download_prices(tickers: List[str], period: Optional[str] = None,
+                    start: Optional[str] = None) -> pd.DataFrame:
+    """
+    Daily adjusted close and volume for many tickers in one bulk request.
+    Returns rows of (ticker, date, close, volume).
+    """
+    import yfinance as yf
+
+    raw = yf.download(tickers, period=None if start else period, start=start, interval="1d",
+                      auto_adjust=True, group_by="column", threads=True, progress=False)
+    if raw is None or raw.empty:
+        return pd.DataFrame(columns=["ticker", "date", "close", "volume"])
+
+    if isinstance(raw.columns, pd.MultiIndex):
+        close, volume = raw["Close"], raw["Volume"]
+    else:
+        # A single ticker comes back without the ticker level
+        close = raw[["Close"]].set_axis(tickers[:1], axis=1)
+        volume = raw[["Volume"]].set_axis(tickers[:1], axis=1)
+
+    frame = _long_frame(close, "close").merge(_long_frame(volume, "volume"), on=["date", "ticker"], how="left")
+    frame["date"] = pd.to_datetime(frame["date"])
+    if frame["date"].dt.tz is not None:
+        frame["date"] = frame["date"].dt.tz_localize(None)
+    frame["date"] = frame["date"].dt.normalize()
+    return frame.dropna(subset=["close"])[["ticker", "date", "close", "volume"]]
+
+
+@instrument_call("yahoo_finance", size_fn=lambda result: len(result[1]) * 32)
+def download_fundamentals(ticker: str):
+    """
+    Annual income statement rows and the sector profile of one ticker.
+    Returns (profile dict, rows of (ticker, period_end, revenue, ...)).
+    """
+    import yfinance as yf
+
+    yf_ticker = yf.Ticker(ticker)
+    statement = yf_ticker.income_stmt
+    if statement is None or statement.empty:
+        rows = pd.DataFrame(columns=["ticker", "period_end", *FUNDAMENTAL_ROWS])
+    else:
+        rows = pd.DataFrame({
+            column: statement.loc[row] if row in statement.index else np.nan
+            for column, row in FUNDAMENTAL_ROWS.items()
+        }).rename_axis("period_end").reset_index()
+        rows["period_end"] = pd.to_datetime(rows["period_end"])
+        rows.insert(0, "ticker", ticker)
+
+    info = yf_ticker.info or {}
+    profile = {
+        "ticker": ticker,
+        "sector": info.get("sector"),
+        "industry": info.get("industry"),
+        "market_cap": info.get("marketCap"),
+        "fetched_at": time.time(),
+    }
+    return profile, rows
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def compute_metrics(prices: pd.DataFrame, fundamentals: pd.DataFrame,
+                    profiles: pd.DataFrame) -> pd.DataFrame:
+    """
+    Trend metrics for every stored ticker at once, indexed by ticker, with a
+    <metric>_pct peer percentile column for each of PERCENTILE_METRICS
+    """
+    if prices.empty:
+        return pd.DataFrame()
+
+    close = (prices.drop_duplicates(["ticker", "date"], keep="last")
+             .pivot(index="date", columns="ticker", values="close").sort_index())
+    filled = close.ffill()
+    as_of = close.index[-1]
+    last = filled.iloc[-1]
+
+    def trailing_return(days: int) -> pd.Series:
+        position = close.index.searchsorted(as_of - pd.Timedelta(days=days), side="right") - 1
+        if position < 0:
+            return pd.Series(np.nan, index=close.columns)
+        return last / filled.iloc[position] - 1
+
+    log_returns = np.log(close).diff().tail(TRADING_DAYS)
+    last_year = filled.loc[as_of - pd.Timedelta(days=365):]
+
+    metrics = pd.DataFrame({
+        "return_1m": trailing_return(30),
+        "return_3m": trailing_return(91),
+        "return_1y": trailing_return(365),
+        "return_3y": trailing_return(3 * 365),
+        "volatility_1y": log_returns.std() * np.sqrt(TRADING_DAYS),
+        "max_drawdown_1y": (last_year / last_year.cummax() - 1).min(),
+        "last_close": last,
+        "last_date": close.apply(pd.Series.last_valid_index),
+    })
+
+    if not fundamentals.empty:
+        annual = (fundamentals.dropna(subset=["revenue"])
+                  .drop_duplicates(["ticker", "period_end"], keep="last")
+                  .sort_values(["ticker", "period_end"]))
+        by_ticker = annual.groupby("ticker")["revenue"]
+        annual["revenue_growth"] = annual["revenue"] / by_ticker.shift(1) - 1
+        annual["revenue_cagr_3y"] = (annual["revenue"] / by_ticker.shift(3)) ** (1 / 3) - 1
+        annual["operating_margin"] = annual["operating_income"] / annual["revenue"]
+        annual["net_margin"] = annual["net_income"] / annual["revenue"]
+        latest = annual.groupby("ticker").tail(1).set_index("ticker")
+        metrics = metrics.join(latest[["period_end", "revenue", "revenue_growth", "revenue_cagr_3y",
+                                       "operating_margin", "net_margin"]])
+    else:
+        for column in ("period_end", "revenue", "revenue_growth", "revenue_cagr_3y",
+                       "operating_margin", "net_margin"):
+            metrics[column] = np.nan
+
+    if not profiles.empty:
+        metrics = metrics.join(profiles.drop_duplicates("ticker", keep="last")
+                               .set_index("ticker")[["sector", "industry", "market_cap"]])
+    else:
+        metrics["sector"] = metrics["industry"] = None
+        metrics["market_cap"] = np.nan
+
+    # Rank within the sector when it has enough stored peers, else against everyone
+    sector = metrics["sector"].fillna("")
+    sector_size = sector.map(sector.value_counts())
+    use_sector = (sector != "") & (sector_size >= MIN_PEERS)
+    metrics["peer_group"] = np.where(use_sector, sector, "all stored tickers")
+    metrics["peers"] = np.where(use_sector, sector_size, len(metrics))
+    for column in PERCENTILE_METRICS:
+        values = metrics[column].astype(float)
+        in_sector = values.groupby(sector).rank(pct=True, method="max")
+        overall = values.rank(pct=True, method="max")
+        metrics[f"{column}_pct"] = np.where(use_sector, in_sector, overall)
+
+    metrics["as_of"] = as_of
+    return metrics.rename_axis("ticker")
+
+
+def format_trends(trends: Optional[Dict[str, Any]]) -> str:
+    """One-line summary of a ticker's trends for prompts"""
+    if not trends:
+        return "N/A"
+
+    def pct(value, signed=True):
+        return f"{value * 100:+.1f}%" if signed else f"{value * 100:.1f}%"
+
+    def rank(metric):
+        value = trends.get(f"{metric}_pct")
+        if value is None:
+            return ""
+        n = round(value * 100)
+        suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+        return f" ({n}{suffix} percentile of {trends['peer_group']})"
+
+    parts = []
+    for metric, label in (("return_1y", "1y price return"), ("return_3y", "3y price return"),
+                          ("return_3m", "3m price return")):
+        if trends.get(metric) is not None:
+            parts.append(f"{label} {pct(trends[metric])}{rank(metric)}")
+    if trends.get("volatility_1y") is not None:
+        parts.append(f"1y volatility {pct(trends['volatility_1y'], False)}{rank('volatility_1y')}")
+    if trends.get("max_drawdown_1y") is not None:
+        parts.append(f"1y max drawdown {pct(trends['max_drawdown_1y'])}")
+    if trends.get("revenue_growth") is not None:
+        year = f" in FY{trends['period_end'][:4]}" if trends.get("period_end") else ""
+        parts.append(f"revenue growth {pct(trends['revenue_growth'])} YoY{year}{rank('revenue_growth')}")
+    if trends.get("revenue_cagr_3y") is not None:
+        parts.append(f"3y revenue CAGR {pct(trends['revenue_cagr_3y'])}")
+    if trends.get("net_margin") is not None:
+        parts.append(f"net margin {pct(trends['net_margin'], False)}{rank('net_margin')}")
+    if not parts:
+        return "N/A"
+    return "; ".join(parts) + f" (as of {trends['as_of']})"
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class FinancialHistoryStore:
+    """Price, fundamentals, profile and metrics tables as columnar files under root"""
+
+    TABLES = ("prices", "fundamentals", "profiles", "metrics")
+
+    def __init__(self, root: str):
+        self.root = root
+        self.engine = _parquet_engine()
+        os.makedirs(root, exist_ok=True)
+        # Serializes read-merge-write cycles: the lock within this process,
+        # the lock file across processes (app, API, workers, nightly refresh)
+        self._write_lock = threading.Lock()
+        self._lock_path = os.path.join(root, "store.lock")
+        self._metrics: Optional[pd.DataFrame] = None
+        self._metrics_mtime = None
+
+    def _path(self, table: str) -> str:
+        return os.path.join(self.root, f"{table}.parquet" if self.engine else f"{table}.pkl")
+
+    def read(self, table: str) -> pd.DataFrame:
+        path = self._path(table)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        if self.engine:
+            return pd.read_parquet(path, engine=self.engine)
+        return pd.read_pickle(path)
+
+    @contextmanager
+    def _locked(self):
+        with self._write_lock, open(self._lock_path, "a+") as lock_file:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, table: str, frame: pd.DataFrame):
+        """Atomic replace, so readers never see a half-written file"""
+        path = self._path(table)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if self.engine:
+            frame.to_parquet(tmp_path, engine=self.engine)
+        else:
+            frame.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    def tickers(self) -> List[str]:
+        profiles = self.read("profiles")
+        return sorted(profiles["ticker"]) if not profiles.empty else []
+
+    def refresh(self, tickers: List[str], years: Optional[int] = None,
+                fundamentals_max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Bring tickers up to date: new tickers get `years` of prices, stored
+        ones only the days since their last close (one bulk request per
+        group of tickers with the same last close); fundamentals are
+        refetched when older than fundamentals_max_age seconds. Metrics are
+        recomputed afterwards. Stored tickers that stopped getting prices
+        (STALE_AFTER_DAYS behind the rest) are skipped and listed as stale.
+        """
+        if years is None:
+            years = int(_setting('FINANCIAL_HISTORY_YEARS', '5'))
+        if fundamentals_max_age is None:
+            fundamentals_max_age = float(_setting('FINANCIAL_HISTORY_FUNDAMENTALS_MAX_AGE', str(7 * 86400)))
+        tickers = sorted({t.strip().upper() for t in tickers if t and t.strip()})
+        stats = {"tickers": len(tickers), "price_rows": 0, "fundamentals": 0, "failed": [], "stale": []}
+        if not tickers:
+            return stats
+
+        prices, profiles = self.read("prices"), self.read("profiles")
+        last_dates = prices.groupby("ticker")["date"].max() if not prices.empty else pd.Series(dtype="datetime64[ns]")
+        new = [t for t in tickers if t not in last_dates.index]
+        stored = [t for t in tickers if t in last_dates.index]
+        if stored:
+            newest = last_dates.max()
+            stats["stale"] = [t for t in stored if newest - last_dates[t] > pd.Timedelta(days=STALE_AFTER_DAYS)]
+            stored = [t for t in stored if t not in stats["stale"]]
+
+        downloads = []
+        if new:
+            downloads.append(download_prices(new, period=f"{years}y"))
+        for last_date, group in last_dates[stored].groupby(last_dates[stored]):
+            since = last_date - pd.Timedelta(days=5)
+            downloads.append(download_prices(list(group.index), start=since.strftime("%Y-%m-%d")))
+        fetched_prices = pd.concat(downloads, ignore_index=True) if downloads else pd.DataFrame()
+        stats["price_rows"] = len(fetched_prices)
+
+        # Fundamentals only for tickers that have prices (skips unknown symbols)
+        priced = set(stored) | (set(fetched_prices["ticker"]) if not fetched_prices.empty else set())
+        fetched_at = profiles.set_index("ticker")["fetched_at"] if not profiles.empty else pd.Series(dtype=float)
+        due = [t for t in tickers if t in priced and time.time() - fetched_at.get(t, 0) > fundamentals_max_age]
+
+        def fetch(ticker):
+            try:
+                return download_fundamentals(ticker)
+            except Exception as e:
+                print(f"⚠️ Fundamentals unavailable for {ticker}: {str(e)[:80]}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="fundamentals") as pool:
+            # Keep the caller's trace span and run accounting in the pool threads
+            futures = [submit_with_context(pool, fetch, ticker) for ticker in due]
+            fetched = [result for result in (f.result() for f in futures) if result is not None]
+        stats["fundamentals"] = len(fetched)
+        stats["failed"] = [t for t in new if t not in priced]
+
+        with self._locked():
+            # Re-read under the lock so concurrent refreshes don't drop each other's rows
+            prices = self.read("prices")
+            fundamentals, profiles = self.read("fundamentals"), self.read("profiles")
+            if not fetched_prices.empty:
+                cutoff = fetched_prices["date"].max() - pd.DateOffset(years=years)
+                prices = (pd.concat([prices, fetched_prices], ignore_index=True)
+                          .drop_duplicates(["ticker", "date"], keep="last"))
+                prices = prices[prices["date"] >= cutoff].sort_values(["ticker", "date"], ignore_index=True)
+            if fetched:
+                fundamentals = (pd.concat([fundamentals, *[rows for _, rows in fetched if not rows.empty]],
+                                          ignore_index=True)
+                                .drop_duplicates(["ticker", "period_end"], keep="last"))
+                profiles = (pd.concat([profiles, pd.DataFrame([profile for profile, _ in fetched])],
+                                      ignore_index=True)
+                            .drop_duplicates("ticker", keep="last"))
+            # Tickers with prices but no fundamentals yet still count as stored
+            priced = set(prices["ticker"]) if not prices.empty else set()
+            missing = sorted(priced - set(profiles.get("ticker", [])))
+            if missing:
+                profiles = pd.concat([profiles, pd.DataFrame({"ticker": missing, "fetched_at": 0.0})],
+                                     ignore_index=True)
+
+            metrics = compute_metrics(prices, fundamentals, profiles)
+            self._write("prices", prices)
+            self._write("fundamentals", fundamentals)
+            self._write("profiles", profiles)
+            self._write("metrics", metrics)
+        return stats
+
+    def metrics(self) -> pd.DataFrame:
+        """Stored metrics table, reloaded when another process refreshes it"""
+        path = self._path("metrics")
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if self._metrics is None or mtime != self._metrics_mtime:
+            self._metrics = self.read("metrics") if mtime else pd.DataFrame()
+            self._metrics_mtime = mtime
+        return self._metrics
+
+    def trends(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """A stored ticker's metrics as plain JSON values (None when not stored)"""
+        metrics = self.metrics()
+        ticker = (ticker or "").upper()
+        if metrics.empty or ticker not in metrics.index:
+            return None
+        trends = {}
+        for key, value in metrics.loc[ticker].items():
+            if isinstance(value, pd.Timestamp):
+                value = value.strftime("%Y-%m-%d")
+            elif isinstance(value, (float, np.floating)):
+                value = None if np.isnan(value) else round(float(value), 4)
+            elif isinstance(value, np.integer):
+                value = int(value)
+            elif value is not None and pd.isna(value):
+                value = None
+            trends[key] = value
+        trends["ticker"] = ticker
+        return trends
+
+
+def get_financial_history() -> Optional[FinancialHistoryStore]:
+    """
+    Shared store under FINANCIAL_HISTORY_DIR (default data/financial_history).
+    Set FINANCIAL_HISTORY_DIR to an empty value to disable it.
+    """
+    global _store
+    root = _setting('FINANCIAL_HISTORY_DIR', os.path.join('data', 'financial_history'))
+    if not root:
+        return None
+
+    with _store_lock:
+        if _store is None or _store.root != root:
+            try:
+                _store = FinancialHistoryStore(root)
+            except Exception as e:
+                print(f"Financial history unavailable: {e}")
+                return None
+    return _store
+
+
+# Tickers that returned no history in this process (not retried per run)
+_unavailable = set()
+# Tickers being downloaded in the background
+_fetching = set()
+_fetching_lock = threading.Lock()
+
+
+def _fetch_in_background(store: FinancialHistoryStore, ticker: str):
+    """Download a new ticker's history outside the research run (once per process at a time)"""
+    with _fetching_lock:
+        if ticker in _fetching:
+            return
+        _fetching.add(ticker)
+
+    def fetch():
+        try:
+            stats = store.refresh([ticker])
+            if ticker in stats["failed"]:
+                _unavailable.add(ticker)
+        except Exception as e:
+            print(f"⚠️ Financial history download for {ticker} failed: {str(e)[:80]}")
+        finally:
+            with _fetching_lock:
+                _fetching.discard(ticker)
+
+    threading.Thread(target=fetch, daemon=True, name=f"history-{ticker}").start()
+
+
+def financial_trends(ticker: Optional[str], fetch_on_miss: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """
+    Stored trends for ticker. Tickers not in the store yet return None and,
+    when FINANCIAL_HISTORY_FETCH_ON_MISS is on (default), are downloaded in
+    a background thread so later runs have them.
+    """
+    store = get_financial_history()
+    if store is None or not ticker:
+        return None
+    ticker = ticker.upper()
+    trends = store.trends(ticker)
+    if trends is not None or ticker in _unavailable:
+        return trends
+
+    if fetch_on_miss is None:
+        fetch_on_miss = _setting('FINANCIAL_HISTORY_FETCH_ON_MISS', 'true').lower() in ('1', 'true', 'yes')
+    if fetch_on_miss:
+        _fetch_in_background(store, ticker)
+    return None
+
+
+def default_tickers() -> List[str]:
+    """Tickers worth keeping: known companies, researched profiles and watched companies"""
+    from utils.entities import KNOWN_COMPANIES, resolve_company
+    from utils.knowledge_base import get_knowledge_base
+    from utils.watchlist import get_watchlist
+
+    tickers = {ticker for _, _, ticker, _ in KNOWN_COMPANIES if ticker}
+    kb = get_knowledge_base()
+    if kb is not None:
+        tickers.update(kb.tickers())
+    try:
+        for company in get_watchlist().companies():
+            tickers.add(resolve_company(company['company_name'])['ticker'])
+    except Exception as e:
+        print(f"⚠️ Watchlist unavailable: {e}")
+    store = get_financial_history()
+    if store is not None:
+        tickers.update(store.tickers())
+    return sorted(t for t in tickers if t)
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Local financial history store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh_cmd = sub.add_parser("refresh", help="download new prices and fundamentals")
+    refresh_cmd.add_argument("tickers", nargs="*", help="default: known, researched and watched tickers")
+    refresh_cmd.add_argument("--years", type=int)
+    show_cmd = sub.add_parser("show", help="stored trends of a ticker")
+    show_cmd.add_argument("ticker")
+    args = parser.parse_args()
+
+    store = get_financial_history()
+    if store is None:
+        parser.error("FINANCIAL_HISTORY_DIR is empty")
+
+    if args.command == "refresh":
+        tickers = args.tickers or default_tickers()
+        start = time.perf_counter()
+        stats = store.refresh(tickers, args.years)
+        print(f"📈 Refreshed {stats['tickers']} ticker(s) in {time.perf_counter() - start:.1f}s: "
+              f"{stats['price_rows']} price rows, {stats['fundamentals']} fundamentals"
+              + (f", no data for {', '.join(stats['failed'])}" if stats['failed'] else "")
+              + (f", skipped stale {', '.join(stats['stale'])}" if stats['stale'] else ""))
+    else:
+        trends = store.trends(args.ticker)
+        print(format_trends(trends) if trends else f"{args.ticker.upper()} is not stored")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Research job queue
+SQLite-backed queue of workflow runs, shared by the app (which submits and
+polls jobs) and worker processes (which claim and run them)
+"""
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.state_codec import encode_state, decode_state
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (COMPLETE, FAILED, CANCELLED)
+
+# Priorities (higher runs first)
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 5
+PRIORITY_HIGH = 10
+
+# A running job whose worker hasn't reported in this long is requeued
+# (workers send a heartbeat every third of this while a job runs)
+STALE_AFTER_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '300'))
+# A job claimed this many times without finishing (its worker keeps dying)
+# fails instead of being requeued again
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    result BLOB,
+    error TEXT,
+    worker_id TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, status);
+CREATE TABLE IF NOT EXISTS job_messages (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+# Highest priority first; within a priority, users with the fewest running
+# jobs and then the least recently served user go first; then oldest job
+_NEXT_JOB_SQL = """
+SELECT j.job_id FROM jobs j
+WHERE j.status = 'queued'
+ORDER BY
+    j.priority DESC,
+    (SELECT COUNT(*) FROM jobs r WHERE r.user_id = j.user_id AND r.status = 'running') ASC,
+    COALESCE((SELECT MAX(s.started_at) FROM jobs s WHERE s.user_id = j.user_id), 0) ASC,
+    j.created_at ASC
+LIMIT 1
+"""
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+class ClaimLost(RuntimeError):
+    """The job was requeued (or finished) by someone else while this worker ran it"""
+
+
+class JobQueue:
+    """Priority job queue with per-user fairness and cancellation"""
+
+    def __init__(self, path: str, stale_after: float = STALE_AFTER_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived autocommit connection (callers open write transactions explicitly)"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ---------------- producer side ----------------
+
+    def submit(self, payload: Dict[str, Any], user_id: str = "anonymous",
+               priority: int = PRIORITY_NORMAL) -> str:
+        """Queue a workflow run (payload is its initial state) and return the job ID"""
+        job_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            conn.execute(
+                """INSERT INTO jobs (job_id, user_id, priority, status, payload, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (job_id, user_id, priority, QUEUED, encode_state(payload), time.time())
+            )
+        return job_id
+
+    def get(self, job_id: str, progress_since: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Current status, progress messages from index progress_since onwards,
+        and (when finished) result of a job. Progress restarts from index 0
+        when attempts changes (the job was requeued after its worker died).
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                """SELECT job_id, user_id, priority, status, result, error,
+                          cancel_requested, attempts, created_at, started_at, finished_at
+                   FROM jobs WHERE job_id = ?""",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = conn.execute(
+                "SELECT message FROM job_messages WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                (job_id, progress_since)
+            ).fetchall()
+
+        job = dict(row)
+        job['progress'] = [m['message'] for m in messages]
+        job['result'] = decode_state(job['result'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def position(self, job_id: str) -> int:
+        """Number of queued jobs ahead of this one at its priority or higher (0 if not queued)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, priority, created_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None or row['status'] != QUEUED:
+                return 0
+            return conn.execute(
+                """SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND job_id != ?
+                   AND (priority > ? OR (priority = ? AND created_at < ?))""",
+                (job_id, row['priority'], row['priority'], row['created_at'])
+            ).fetchone()[0]
+
+    def list_jobs(self, user_id: Optional[str] = None, status: Optional[str] = COMPLETE,
+                  limit: int = 1000) -> List[Dict[str, Any]]:
+        """Most recent jobs (without payloads or results), optionally for one user/status"""
+        query = "SELECT job_id, user_id, status, created_at, finished_at FROM jobs WHERE 1 = 1"
+        params: List[Any] = []
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+    def iter_results(self, job_ids: List[str]) -> Iterator[Dict[str, Any]]:
+        """Decoded final states of finished jobs, loaded one at a time"""
+        for job_id in job_ids:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT result FROM jobs WHERE job_id = ? AND result IS NOT NULL", (job_id,)
+                ).fetchone()
+            if row is not None:
+                yield decode_state(row['result'])
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job. Queued jobs are cancelled immediately; running jobs are
+        flagged and stop at their worker's next checkpoint.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status = ?",
+                (CANCELLED, now, job_id, QUEUED)
+            ).rowcount
+            if not updated:
+                updated = conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = ?",
+                    (job_id, RUNNING)
+                ).rowcount
+        return bool(updated)
+
+    # ---------------- worker side ----------------
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the next job for a worker (None if the queue is empty)"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Jobs whose worker died are put back in line, unless they
+            # have already taken down max_attempts workers
+            conn.execute(
+                """UPDATE jobs SET status = 'failed', worker_id = NULL, finished_at = ?,
+                       error = 'Worker stopped responding ' || attempts || ' time(s)'
+                   WHERE status = 'running' AND heartbeat_at < ? AND cancel_requested = 0
+                       AND attempts >= ?""",
+                (now, now - self.stale_after, self.max_attempts)
+            )
+            # The next attempt reports its progress from the start, so drop
+            # the dead attempt's messages rather than showing every step twice
+            conn.execute(
+                """DELETE FROM job_messages WHERE job_id IN (
+                       SELECT job_id FROM jobs
+                       WHERE status = 'running' AND heartbeat_at < ? AND cancel_requested = 0)""",
+                (now - self.stale_after,)
+            )
+            conn.execute(
+                """UPDATE jobs SET status = 'queued', worker_id = NULL
+                   WHERE status = 'running' AND heartbeat_at < ? AND cancel_requested = 0""",
+                (now - self.stale_after,)
+            )
+            conn.execute(
+                """UPDATE jobs SET status = 'cancelled', finished_at = ?
+                   WHERE status = 'running' AND heartbeat_at < ? AND cancel_requested = 1""",
+                (now, now - self.stale_after)
+            )
+
+            row = conn.execute(_NEXT_JOB_SQL).fetchone()
+            if row is None:
+                return None
+            job_id = row['job_id']
+            conn.execute(
+                """UPDATE jobs SET status = 'running', worker_id = ?, started_at = ?,
+                       heartbeat_at = ?, attempts = attempts + 1
+                   WHERE job_id = ?""",
+                (worker_id, now, now, job_id)
+            )
+            payload = conn.execute(
+                "SELECT user_id, payload FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+        return {"job_id": job_id, "user_id": payload['user_id'], "payload": decode_state(payload['payload'])}
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """
+        Record that worker_id is still running the job. Returns True if
+        cancellation has been requested; raises ClaimLost if the job is no
+        longer this worker's.
+        """
+        with self._transaction() as conn:
+            return self._heartbeat(conn, job_id, worker_id)
+
+    def _heartbeat(self, conn, job_id: str, worker_id: str) -> bool:
+        updated = conn.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND status = 'running' AND worker_id = ?",
+            (time.time(), job_id, worker_id)
+        ).rowcount
+        if not updated:
+            raise ClaimLost(f"job {job_id} is no longer claimed by {worker_id}")
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row['cancel_requested'])
+
+    def report_progress(self, job_id: str, worker_id: str, new_messages: List[str]) -> bool:
+        """
+        Append a running job's new progress messages and record a heartbeat.
+        Returns True if cancellation has been requested; raises ClaimLost
+        (adding nothing) if the job is no longer this worker's.
+        """
+        with self._transaction() as conn:
+            cancel_requested = self._heartbeat(conn, job_id, worker_id)
+            if new_messages:
+                start = conn.execute(
+                    "SELECT COUNT(*) FROM job_messages WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO job_messages (job_id, seq, message) VALUES (?, ?, ?)",
+                    [(job_id, start + i, message) for i, message in enumerate(new_messages)]
+                )
+        return cancel_requested
+
+    def finish(self, job_id: str, worker_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None):
+        """Mark a running job complete, failed or cancelled; raises ClaimLost if it isn't worker_id's"""
+        with self._connect() as conn:
+            updated = conn.execute(
+                """UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?
+                   WHERE job_id = ? AND status = 'running' AND worker_id = ?""",
+                (status, encode_state(result) if result is not None else None,
+                 error, time.time(), job_id, worker_id)
+            ).rowcount
+        if not updated:
+            raise ClaimLost(f"job {job_id} is no longer claimed by {worker_id}")
+
+
+def get_job_queue() -> JobQueue:
+    """Shared job queue at JOB_QUEUE_PATH (default data/jobs.sqlite)"""
+    global _job_queue
+    path = os.getenv('JOB_QUEUE_PATH', os.path.join('data', 'jobs.sqlite'))
+
+    with _job_queue_lock:
+        if _job_queue is None or _job_queue.path != path:
+            _job_queue = JobQueue(path)
+    return _job_queue
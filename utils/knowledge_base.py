@@ -0,0 +1,167 @@
+"""
+Cross-session company knowledge base
+Persists the shared (non-personalized) research for each company in SQLite
+with per-source fetch times, so later runs only refresh stale sources
+"""
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.entities import resolve_company
+from utils.state_codec import encode_state, decode_state
+
+# How long each source stays fresh (seconds)
+SOURCE_TTLS = {
+    "web_results": 24 * 3600,
+    "financial_data": 24 * 3600,
+    "wiki_data": 7 * 24 * 3600,
+    "news_data": 3600,
+    "conflicts": 24 * 3600,
+    "synthesized_data": 24 * 3600,
+}
+
+# Failed or empty lookups (None, [], {}) are retried sooner
+NEGATIVE_TTL = 6 * 3600
+
+# Sources computed from other sources: only fresh if every input is fresh
+# and they were computed after the inputs were fetched
+DERIVED_SOURCES = {
+    "conflicts": ("web_results", "financial_data", "wiki_data"),
+    "synthesized_data": ("web_results", "financial_data", "wiki_data", "news_data"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    entity_key TEXT PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    ticker TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_sources (
+    entity_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    payload BLOB,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (entity_key, source)
+);
+"""
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def make_entity_key(company_name: str) -> str:
+    """Canonical company ID used as the profile key (aliases and tickers share it)"""
+    return resolve_company(company_name)['canonical_id']
+
+
+class KnowledgeBase:
+    """SQLite-backed store of the latest shared research per company"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection per call (safe across threads), committed on success"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load_fresh(self, entity_key: str, now: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, float], Optional[str]]:
+        """
+        Return ({source: value}, {source: fetched_at}, ticker) for the sources
+        of a profile that are still fresh
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            profile = conn.execute(
+                "SELECT ticker FROM profiles WHERE entity_key = ?", (entity_key,)
+            ).fetchone()
+            if profile is None:
+                return {}, {}, None
+            rows = conn.execute(
+                "SELECT source, payload, fetched_at FROM profile_sources WHERE entity_key = ?",
+                (entity_key,)
+            ).fetchall()
+
+        values, fetched_at = {}, {}
+        for source, payload, fetched in rows:
+            if source not in SOURCE_TTLS:
+                continue
+            value = decode_state(payload)
+            ttl = SOURCE_TTLS[source] if value else NEGATIVE_TTL
+            if now - fetched <= ttl:
+                values[source] = value
+                fetched_at[source] = fetched
+
+        # Drop derived sources whose inputs are stale or newer than they are
+        for source, inputs in DERIVED_SOURCES.items():
+            if source not in values:
+                continue
+            if any(i not in values or fetched_at[i] > fetched_at[source] for i in inputs):
+                del values[source]
+                del fetched_at[source]
+
+        return values, fetched_at, profile[0]
+
+    def save(self, entity_key: str, company_name: str, sources: Dict[str, Any],
+             ticker: Optional[str] = None, fetched_at: Optional[float] = None):
+        """Upsert the given sources (None records a failed lookup)"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO profiles (entity_key, company_name, ticker, updated_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(entity_key) DO UPDATE SET
+                       company_name = excluded.company_name,
+                       ticker = COALESCE(excluded.ticker, profiles.ticker),
+                       updated_at = excluded.updated_at""",
+                (entity_key, company_name, ticker, fetched_at)
+            )
+            conn.executemany(
+                """INSERT OR REPLACE INTO profile_sources (entity_key, source, payload, fetched_at)
+                   VALUES (?, ?, ?, ?)""",
+                [
+                    (entity_key, source, encode_state(value) if value is not None else None, fetched_at)
+                    for source, value in sources.items()
+                    if source in SOURCE_TTLS
+                ]
+            )
+
+    def tickers(self) -> List[str]:
+        """Tickers of every stored company profile"""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT ticker FROM profiles WHERE ticker IS NOT NULL")]
+
+
+def get_knowledge_base() -> Optional[KnowledgeBase]:
+    """
+    Shared knowledge base at KNOWLEDGE_BASE_PATH (default data/knowledge_base.sqlite).
+    Set KNOWLEDGE_BASE_PATH to an empty value to disable it.
+    """
+    global _knowledge_base
+    path = os.getenv('KNOWLEDGE_BASE_PATH', os.path.join('data', 'knowledge_base.sqlite'))
+    if not path:
+        return None
+
+    with _knowledge_base_lock:
+        if _knowledge_base is None or _knowledge_base.path != path:
+            try:
+                _knowledge_base = KnowledgeBase(path)
+            except Exception as e:
+                print(f"Knowledge base unavailable: {e}")
+                return None
+    return _knowledge_base
@@ -0,0 +1,365 @@
+"""
+Run instrumentation
+Per-node wall time, provider calls (latency, retries, bytes received), cache
+hits and LLM tokens. Everything is aggregated into process-wide metrics
+served in Prometheus text format, collected per node for the run's timing
+summary in the final state, and charged to the run's usage account
+(utils.accounting).
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.tracing import KIND_CLIENT, current_span, span
+from utils.accounting import charge_call, charge_tokens
+
+# Latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Rough characters per token, used when the LLM response has no usage data
+CHARS_PER_TOKEN = 4
+
+
+# ============================================================================
+# PROCESS-WIDE METRICS (Prometheus)
+# ============================================================================
+
+class MetricsRegistry:
+    """Minimal thread-safe counters and histograms with Prometheus text output"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List[float]] = {}  # bucket counts + [sum, count]
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                data = self._histograms[key] = [0.0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: str = "") -> str:
+        parts = [f'{k}="{str(v)}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in sorted(self._help.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._labels(labels)} {value:g}")
+            else:
+                for (metric, labels), data in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(LATENCY_BUCKETS, data):
+                        le = 'le="%g"' % bound
+                        lines.append(f"{name}_bucket{self._labels(labels, le)} {count:g}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{self._labels(labels, le)} {data[-1]:g}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {data[-2]:g}")
+                    lines.append(f"{name}_count{self._labels(labels)} {data[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe("research_node_duration_seconds", "histogram", "Wall time of each workflow node")
+registry.describe("research_provider_duration_seconds", "histogram", "Wall time of outbound provider calls")
+registry.describe("research_provider_calls_total", "counter", "Outbound provider calls by outcome")
+registry.describe("research_provider_retries_total", "counter", "Retries of outbound provider calls")
+registry.describe("research_provider_bytes_total", "counter", "Approximate bytes received from providers")
+registry.describe("research_cache_requests_total", "counter", "Cache lookups by cache and result")
+registry.describe("research_llm_tokens_total", "counter", "LLM tokens by kind (estimated when not reported)")
+
+
+# ============================================================================
+# PER-NODE COLLECTION
+# ============================================================================
+
+# Collector for the node running in the current thread/context
+_current_node: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "current_node_metrics", default=None
+)
+
+
+def _new_node_entry(node: str) -> Dict[str, Any]:
+    return {
+        "node": node,
+        "seconds": 0.0,
+        "calls": [],
+        "cache": {},
+        "tokens": {"prompt": 0, "completion": 0},
+    }
+
+
+@contextmanager
+def node_timer(node: str):
+    """
+    Time a workflow node and collect the provider calls, cache lookups and
+    tokens recorded while it runs. Yields the node's timing entry.
+    """
+    entry = _new_node_entry(node)
+    token = _current_node.set(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["seconds"] = round(time.perf_counter() - start, 4)
+        _current_node.reset(token)
+        registry.observe("research_node_duration_seconds", entry["seconds"], node=node)
+
+
+def _payload_size(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    try:
+        return len(json.dumps(result, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_call(provider: str, seconds: float, ok: bool = True, retries: int = 0, nbytes: int = 0):
+    """Record one outbound provider call"""
+    registry.observe("research_provider_duration_seconds", seconds, provider=provider)
+    registry.inc("research_provider_calls_total", provider=provider, outcome="ok" if ok else "error")
+    if retries:
+        registry.inc("research_provider_retries_total", retries, provider=provider)
+    if nbytes:
+        registry.inc("research_provider_bytes_total", nbytes, provider=provider)
+    charge_call(provider, ok, retries)
+
+    entry = _current_node.get()
+    if entry is not None:
+        entry["calls"].append({
+            "provider": provider,
+            "seconds": round(seconds, 4),
+            "ok": ok,
+            "retries": retries,
+            "bytes": nbytes,
+        })
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    """Record cache lookups (e.g. knowledge base sources, embeddings)"""
+    if hits:
+        registry.inc("research_cache_requests_total", hits, cache=cache, result="hit")
+    if misses:
+        registry.inc("research_cache_requests_total", misses, cache=cache, result="miss")
+
+    active_span = current_span()
+    if active_span is not None:
+        active_span.add(f"cache.{cache}.hits", hits)
+        active_span.add(f"cache.{cache}.misses", misses)
+
+    entry = _current_node.get()
+    if entry is not None:
+        stats = entry["cache"].setdefault(cache, {"hits": 0, "misses": 0})
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+
+def record_tokens(model: str, prompt: int, completion: int):
+    registry.inc("research_llm_tokens_total", prompt, model=model, kind="prompt")
+    registry.inc("research_llm_tokens_total", completion, model=model, kind="completion")
+    charge_tokens(model, prompt, completion)
+
+    active_span = current_span()
+    if active_span is not None:
+        active_span.add("gen_ai.usage.input_tokens", prompt)
+        active_span.add("gen_ai.usage.output_tokens", completion)
+
+    entry = _current_node.get()
+    if entry is not None:
+        entry["tokens"]["prompt"] += prompt
+        entry["tokens"]["completion"] += completion
+
+
+class _RetryCounter(threading.local):
+    count = 0
+
+
+_retries = _RetryCounter()
+
+
+def record_retry():
+    """Call from inside an instrumented helper each time it retries"""
+    _retries.count += 1
+
+
+def instrument_call(provider: str, size_fn: Callable[[Any], int] = _payload_size):
+    """
+    Decorator for outbound helpers: records wall time, outcome, retries
+    (via record_retry) and approximate bytes received
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            outer_retries, _retries.count = _retries.count, 0
+            with span(f"{provider} {fn.__name__}", KIND_CLIENT, provider=provider) as call_span:
+                start = time.perf_counter()
+                ok, result = False, None
+                try:
+                    result = fn(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    retries = _retries.count
+                    _retries.count = outer_retries
+                    nbytes = size_fn(result) if ok else 0
+                    record_call(provider, time.perf_counter() - start, ok=ok, retries=retries, nbytes=nbytes)
+                    if call_span is not None:
+                        call_span.set("retries", retries)
+                        call_span.set("response.bytes", nbytes)
+        return wrapper
+    return decorator
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit that keeps the current node collector and trace span in the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class InstrumentedLLM:
+    """Wraps a chat model so every invoke() records latency and token usage"""
+
+    def __init__(self, llm, provider: str = "gemini"):
+        self._llm = llm
+        self._provider = provider
+
+    def invoke(self, prompt, *args, **kwargs):
+        model = getattr(self._llm, "model", None)
+        with span(f"llm {self._provider}", KIND_CLIENT, provider=self._provider,
+                  **{"gen_ai.system": self._provider, "gen_ai.request.model": model}):
+            start = time.perf_counter()
+            ok, response = False, None
+            try:
+                response = self._llm.invoke(prompt, *args, **kwargs)
+                ok = True
+                return response
+            finally:
+                content = getattr(response, "content", "") or ""
+                record_call(self._provider, time.perf_counter() - start, ok=ok, nbytes=len(content))
+                if ok:
+                    prompt_tokens, completion_tokens = _token_usage(prompt, response)
+                    record_tokens(self._provider, prompt_tokens, completion_tokens)
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+
+def _token_usage(prompt, response) -> Tuple[int, int]:
+    """Reported token counts if the response carries them, else an estimate"""
+    for attr in ("usage_metadata", "response_metadata"):
+        usage = getattr(response, attr, None) or {}
+        usage = usage.get("usage_metadata", usage) if isinstance(usage, dict) else {}
+        prompt_tokens = usage.get("input_tokens", usage.get("prompt_token_count"))
+        completion_tokens = usage.get("output_tokens", usage.get("candidates_token_count"))
+        if prompt_tokens is not None and completion_tokens is not None:
+            return int(prompt_tokens), int(completion_tokens)
+
+    content = getattr(response, "content", "") or ""
+    return len(str(prompt)) // CHARS_PER_TOKEN, len(content) // CHARS_PER_TOKEN
+
+
+# ============================================================================
+# RUN SUMMARY & ENDPOINT
+# ============================================================================
+
+def summarize_timings(timings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals over a run's per-node timing entries"""
+    summary = {
+        "total_seconds": 0.0,
+        "slowest_node": None,
+        "providers": {},
+        "tokens": {"prompt": 0, "completion": 0},
+        "cache": {},
+    }
+    slowest = -1.0
+    for entry in timings or []:
+        summary["total_seconds"] += entry.get("seconds", 0)
+        if entry.get("seconds", 0) > slowest:
+            slowest, summary["slowest_node"] = entry["seconds"], entry["node"]
+        for call in entry.get("calls", []):
+            stats = summary["providers"].setdefault(
+                call["provider"], {"calls": 0, "errors": 0, "retries": 0, "seconds": 0.0, "bytes": 0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += 0 if call["ok"] else 1
+            stats["retries"] += call["retries"]
+            stats["seconds"] = round(stats["seconds"] + call["seconds"], 4)
+            stats["bytes"] += call["bytes"]
+        for kind in ("prompt", "completion"):
+            summary["tokens"][kind] += entry.get("tokens", {}).get(kind, 0)
+        for cache, stats in entry.get("cache", {}).items():
+            total = summary["cache"].setdefault(cache, {"hits": 0, "misses": 0})
+            total["hits"] += stats["hits"]
+            total["misses"] += stats["misses"]
+    summary["total_seconds"] = round(summary["total_seconds"], 4)
+    return summary
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on localhost:port in a daemon thread
+    (port defaults to METRICS_PORT; nothing is started if it is unset/0)
+    """
+    port = int(port if port is not None else os.getenv('METRICS_PORT', '0') or 0)
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    except OSError as e:
+        print(f"Metrics server not started on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,42 @@
+"""
+Google News RSS
+Feed URLs and item parsing shared by the news agent (get_recent_news) and
+the watchlist monitor, which polls the same feeds with conditional requests
+"""
+import hashlib
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import feedparser
+
+from utils.entities import resolve_company
+
+
+def google_news_feed_url(company_name: str) -> str:
+    """Google News RSS search feed for a company (canonical name for known companies)"""
+    clean_name = resolve_company(company_name)['name']
+    return f"https://news.google.com/rss/search?q={quote(clean_name)}&hl=en-US&gl=US&ceid=US:en"
+
+
+def parse_feed(url: str, etag: Optional[str] = None, modified: Optional[str] = None):
+    """
+    Fetch and parse a feed. With the ETag / Last-Modified of the previous
+    fetch the request is conditional: an unchanged feed comes back with
+    status 304 and no entries.
+    """
+    return feedparser.parse(url, etag=etag, modified=modified)
+
+
+def news_item(entry) -> Dict[str, Any]:
+    return {
+        "title": entry.title,
+        "link": entry.link,
+        "published": entry.get('published', 'N/A'),
+        "source": entry.get('source', {}).get('title', 'Unknown')
+    }
+
+
+def news_item_id(entry) -> str:
+    """Stable ID of a feed entry (its guid, else its link)"""
+    key = entry.get('id') or entry.get('link') or entry.get('title', '')
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
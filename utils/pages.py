@@ -0,0 +1,326 @@
+"""
+Full-page enrichment for web search results
+Fetches the top result URLs concurrently over one pooled httpx client (with
+a per-host connection limit, a response-size cap and timeouts), extracts
+the main text with lxml and caches it by URL and ETag. The whole stage runs
+under a fixed time budget: pages not read in time are skipped and the
+results keep their Tavily snippets.
+
+Enable with WEB_PAGE_ENRICHMENT=true; see .env.example for the limits.
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from utils.metrics import instrument_call, record_cache, submit_with_context
+from utils.cassettes import cassette_call
+
+USER_AGENT = "Mozilla/5.0 (compatible; CompanyResearchAssistant/1.0)"
+
+# Paragraphs shorter than this are usually navigation, captions or buttons
+MIN_PARAGRAPH_CHARS = 40
+
+# Elements that never hold the article text
+_BOILERPLATE_XPATH = ("//script|//style|//noscript|//nav|//header|//footer|//aside|"
+                      "//form|//iframe|//svg|//*[@role='navigation']|//*[@aria-hidden='true']")
+
+_client = None
+_client_lock = threading.Lock()
+_host_limits: Dict[str, threading.BoundedSemaphore] = {}
+_host_limits_lock = threading.Lock()
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def page_enrichment_enabled() -> bool:
+    return os.getenv('WEB_PAGE_ENRICHMENT', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _setting(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+def get_http_client():
+    """Shared httpx client, so connections to a host are pooled across pages and runs"""
+    global _client
+    if _client is None:
+        import httpx
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    follow_redirects=True,
+                    headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+                    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                )
+    return _client
+
+
+@contextmanager
+def _host_slot(url: str):
+    """Limit concurrent requests per host (WEB_PAGE_PER_HOST) across all runs"""
+    host = urlsplit(url).hostname or ""
+    with _host_limits_lock:
+        limit = _host_limits.get(host)
+        if limit is None:
+            limit = _host_limits[host] = threading.BoundedSemaphore(int(_setting('WEB_PAGE_PER_HOST', '2')))
+    with limit:
+        yield
+
+
+@instrument_call("web_pages", size_fn=lambda page: len((page or {}).get("text", "")))
+@cassette_call("web_pages")
+def fetch_page(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+    """
+    GET a page (conditionally, when a cached ETag / Last-Modified is given)
+    and extract its main text. Returns {"status", "etag", "last_modified",
+    "text"}; status 304 means the cached text is still current.
+    """
+    import httpx
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    max_bytes = int(_setting('WEB_PAGE_MAX_BYTES', '2000000'))
+    timeout = _setting('WEB_PAGE_TIMEOUT', '4')
+
+    with _host_slot(url):
+        with get_http_client().stream("GET", url, headers=headers,
+                                      timeout=httpx.Timeout(timeout, connect=min(timeout, 2.0))) as response:
+            page = {
+                "status": response.status_code,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "text": "",
+            }
+            if response.status_code == 304:
+                return page
+            response.raise_for_status()
+            if "html" not in response.headers.get("content-type", "html"):
+                return page  # PDFs, images, feeds: keep the snippet
+
+            # Read up to the cap; a truncated page still parses, and the
+            # article text is usually near the top
+            body = bytearray()
+            for chunk in response.iter_bytes():
+                body += chunk
+                if len(body) >= max_bytes:
+                    del body[max_bytes:]
+                    break
+
+    page["text"] = extract_main_text(bytes(body))
+    return page
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+
+def extract_main_text(html: bytes, max_chars: Optional[int] = None) -> str:
+    """
+    Main text of an HTML page: the paragraphs of its <article> (or <main>,
+    else <body>) with navigation, headers, footers and scripts removed
+    """
+    import lxml.html
+    from lxml.etree import ParserError
+
+    if max_chars is None:
+        max_chars = int(_setting('WEB_PAGE_MAX_CHARS', '6000'))
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (ParserError, ValueError):
+        return ""
+
+    for element in doc.xpath(_BOILERPLATE_XPATH):
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    roots = doc.xpath("//article") or doc.xpath("//main") or doc.xpath("//body") or [doc]
+    # The longest <article> on pages that list several teasers
+    root = max(roots, key=lambda element: len(element.text_content()))
+
+    paragraphs, seen, total = [], set(), 0
+    for element in root.iter("p", "li", "blockquote"):
+        text = re.sub(r"\s+", " ", element.text_content()).strip()
+        if len(text) < MIN_PARAGRAPH_CHARS or text in seen:
+            continue
+        seen.add(text)
+        paragraphs.append(text)
+        total += len(text) + 1
+        if total >= max_chars:
+            break
+
+    if not paragraphs:
+        # No paragraph markup (div soup): fall back to all the text
+        paragraphs = [re.sub(r"\s+", " ", root.text_content()).strip()]
+
+    text = "\n".join(paragraphs)
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0]
+    return text
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class PageCache:
+    """Extracted page text by URL, with the validators to revalidate it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                       url TEXT PRIMARY KEY,
+                       etag TEXT,
+                       last_modified TEXT,
+                       text TEXT NOT NULL,
+                       fetched_at REAL NOT NULL
+                   )"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection per call (safe across threads), committed on success"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, text, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "text": row[2], "fetched_at": row[3]}
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], text: str):
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO pages (url, etag, last_modified, text, fetched_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (url, etag, last_modified, text, time.time())
+            )
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """
+    Shared page cache at WEB_PAGE_CACHE_PATH (default data/cache/pages.sqlite).
+    Set WEB_PAGE_CACHE_PATH to an empty value to disable it.
+    """
+    global _page_cache
+    path = os.getenv('WEB_PAGE_CACHE_PATH', os.path.join('data', 'cache', 'pages.sqlite'))
+    if not path:
+        return None
+
+    with _page_cache_lock:
+        if _page_cache is None or _page_cache.path != path:
+            try:
+                _page_cache = PageCache(path)
+            except Exception as e:
+                print(f"Page cache unavailable: {e}")
+                return None
+    return _page_cache
+
+
+def read_page(url: str) -> str:
+    """
+    Main text of url: from the cache while fresh (WEB_PAGE_CACHE_TTL),
+    otherwise fetched - conditionally when the cache has validators
+    """
+    cache = get_page_cache()
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None and time.time() - cached["fetched_at"] < _setting('WEB_PAGE_CACHE_TTL', '21600'):
+        record_cache("pages", hits=1)
+        return cached["text"]
+
+    page = fetch_page(url, *((cached["etag"], cached["last_modified"]) if cached else ()))
+    if page["status"] == 304 and cached is not None:
+        record_cache("pages", hits=1)
+        text = cached["text"]
+    else:
+        record_cache("pages", misses=1)
+        text = page["text"]
+
+    if cache is not None and (text or cached is None):
+        try:
+            cache.put(url, page["etag"] or (cached or {}).get("etag"),
+                      page["last_modified"] or (cached or {}).get("last_modified"), text)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not cache page {url}: {e}")
+    return text
+
+
+# ============================================================================
+# ENRICHMENT
+# ============================================================================
+
+def enrich_web_results(results: List[Dict], top_n: Optional[int] = None,
+                       budget: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Add the main page text ('page_text') to the top_n results in place,
+    reading the pages concurrently. Returns stats: pages read, failed and
+    skipped (still pending when the budget ran out) and seconds spent.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    if top_n is None:
+        top_n = int(_setting('WEB_PAGE_TOP_N', '5'))
+    if budget is None:
+        budget = _setting('WEB_PAGE_BUDGET', '5')
+
+    # url -> results pointing at it (each page is read once)
+    targets: Dict[str, List[Dict]] = {}
+    for result in results[:top_n]:
+        if result.get('url', '').startswith(('http://', 'https://')):
+            targets.setdefault(result['url'], []).append(result)
+    stats = {"read": 0, "failed": 0, "skipped": 0, "seconds": 0.0}
+    if not targets:
+        return stats
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="page-fetch")
+    futures = {submit_with_context(executor, read_page, url): url for url in targets}
+    try:
+        done, pending = wait(futures, timeout=budget)
+    finally:
+        # Don't wait for pages still loading; their requests end at WEB_PAGE_TIMEOUT
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    for future in done:
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"⚠️ Page fetch failed for {futures[future]}: {e}")
+            stats["failed"] += 1
+            continue
+        if text:
+            for result in targets[futures[future]]:
+                result['page_text'] = text
+            stats["read"] += 1
+        else:
+            stats["failed"] += 1
+    stats["skipped"] = len(pending)
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
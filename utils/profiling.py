@@ -0,0 +1,247 @@
+"""
+Opt-in profiling of single research runs
+Wraps one workflow run in cProfile (or a low-overhead stack sampler) plus
+tracemalloc, and writes the profile and top allocations to files named
+after the run ID. Nodes run on the graph's worker threads, so profiling is
+attached per node to the threads running this run only - other runs in the
+same process are not included. When profiling is off, nodes pay one dict
+lookup.
+
+Enabled by the operator with PROFILE_RUNS: "all" for every run, or a
+comma-separated list of company names. API callers can't turn it on -
+profiling is process-wide overhead and writes files on the server.
+"""
+import io
+import os
+import re
+import sys
+import time
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('data', 'profiles'))
+# "cprofile" (deterministic, every call) or "sample" (stack samples, lower overhead)
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 1
+
+# run_id -> profile of a run in progress
+_active: Dict[str, "RunProfile"] = {}
+_active_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False  # started by us (don't stop tracing someone else started)
+
+
+def should_profile(company: str = "") -> bool:
+    """Profile this run? (PROFILE_RUNS=all / company names)"""
+    setting = os.getenv('PROFILE_RUNS', '').strip().lower()
+    if not setting or setting in ('0', 'false', 'no', 'off'):
+        return False
+    if setting in ('1', 'true', 'yes', 'on', 'all'):
+        return True
+    return company.strip().lower() in {name.strip() for name in setting.split(',')}
+
+
+def get_run_profile(run_id: Optional[str]) -> Optional["RunProfile"]:
+    """The active profile for run_id (None when the run isn't profiled)"""
+    if run_id is None:
+        return None
+    return _active.get(run_id)
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _active_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _active_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class RunProfile:
+    """Profile data collected from the nodes of one run"""
+
+    def __init__(self, run_id: str, mode: str = PROFILE_MODE):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.run_id = run_id
+        self.mode = mode
+        self.nodes: List[str] = []
+        self.skipped: List[str] = []
+        self.paths: List[str] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stats: Optional[pstats.Stats] = None
+        self._samples: Counter = Counter()
+        self._threads: Dict[int, int] = {}  # thread ident -> nodes running on it
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    # Collection
+
+    @contextmanager
+    def node(self, name: str):
+        """Profile the calling thread while a node of this run executes"""
+        with self._lock:
+            self.nodes.append(name)
+        if self.mode == "sample":
+            ident = threading.get_ident()
+            with self._lock:
+                self._threads[ident] = self._threads.get(ident, 0) + 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._threads[ident] -= 1
+                    if not self._threads[ident]:
+                        del self._threads[ident]
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active cProfile per process; skip this
+            # node if another profiled run holds it
+            with self._lock:
+                self.skipped.append(name)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+
+    def _sample_loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            with self._lock:
+                idents = list(self._threads)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self._samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        _start_tracemalloc()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True,
+                                             name=f"profile-{self.run_id}")
+            self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        _stop_tracemalloc()
+        return snapshot
+
+    # Output
+
+    def write(self, snapshot, directory: str = PROFILE_DIR) -> List[str]:
+        """Write the profile and report files; returns their paths"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, re.sub(r"[^\w\-.]+", "_", self.run_id))
+        report = io.StringIO()
+        report.write(f"Run {self.run_id} - {self.mode} profile, "
+                     f"{time.perf_counter() - self.started:.2f}s wall\n")
+        report.write(f"Nodes: {', '.join(self.nodes)}\n")
+        if self.skipped:
+            report.write(f"Not profiled (profiler busy): {', '.join(self.skipped)}\n")
+        report.write("\n")
+
+        if self.mode == "cprofile" and self._stats is not None:
+            self._stats.dump_stats(f"{base}.prof")
+            self.paths.append(f"{base}.prof")
+            self._stats.stream = report
+            report.write(f"Top {TOP_FUNCTIONS} functions by cumulative time\n")
+            self._stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        elif self.mode == "sample":
+            with open(f"{base}.folded", "w", encoding="utf-8") as f:
+                for stack, count in self._samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.paths.append(f"{base}.folded")
+            total = sum(self._samples.values()) or 1
+            leaves = Counter()
+            for stack, count in self._samples.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            report.write(f"{total} samples every {SAMPLE_INTERVAL * 1000:g} ms - "
+                         f"top {TOP_FUNCTIONS} frames by self samples\n")
+            for label, count in leaves.most_common(TOP_FUNCTIONS):
+                report.write(f"{count / total:>7.1%}  {count:>6}  {label}\n")
+
+        if snapshot is not None:
+            report.write(f"\nTop {TOP_ALLOCATIONS} allocation sites still live at the end of the run "
+                         f"(process-wide while it ran)\n")
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                report.write(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  "
+                             f"{frame.filename}:{frame.lineno}\n")
+
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        self.paths.append(f"{base}.txt")
+        return self.paths
+
+
+@contextmanager
+def profile_run(state: Dict, run_id: str, enabled: bool, mode: Optional[str] = None):
+    """
+    Profile the workflow run started inside the block (state is its initial
+    state). Yields the RunProfile, or None when disabled; the files are
+    written on exit and listed in its paths.
+    """
+    if not enabled:
+        yield None
+        return
+
+    profile = RunProfile(run_id, mode or PROFILE_MODE)
+    state['profile_run_id'] = run_id
+    with _active_lock:
+        _active[run_id] = profile
+    profile.start()
+    try:
+        yield profile
+    finally:
+        with _active_lock:
+            _active.pop(run_id, None)
+        snapshot = profile.stop()
+        try:
+            paths = profile.write(snapshot)
+            print(f"📈 Profile for run {run_id} written to {', '.join(paths)}")
+        except OSError as e:
+            print(f"⚠️ Could not write profile for run {run_id}: {e}")
@@ -0,0 +1,162 @@
+"""
+Compact record types for research payloads
+Slotted dataclasses (no per-instance __dict__) with interned source names,
+convertible to and from the dict shapes used in workflow state and exports
+"""
+import sys
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, FrozenSet, Optional, Tuple
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """Base for slotted records; dict-style get() keeps display code working on both"""
+    __slots__ = ()
+
+    # Fields omitted from to_dict() when they hold their default value
+    _optional_fields: ClassVar[Tuple[str, ...]] = ()
+    # Fields whose string values are interned (few distinct values)
+    _interned_fields: ClassVar[Tuple[str, ...]] = ()
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def field_names(cls) -> FrozenSet[str]:
+        return frozenset(f.name for f in fields(cls))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.field_names() else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.field_names():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        for f in fields(self):
+            if f.name in self._optional_fields and data[f.name] == f.default:
+                del data[f.name]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """Build a record, or return None if data has keys the record can't hold"""
+        if not isinstance(data, dict) or not set(data) <= cls.field_names():
+            return None
+        return cls(**{k: _intern(v) if k in cls._interned_fields else v for k, v in data.items()})
+
+
+@dataclass(slots=True)
+class WebResult(Record):
+    title: str = ""
+    snippet: str = ""
+    url: str = ""
+    source: str = "Tavily"
+    confidence: float = 0.8
+    duplicates_merged: int = 0
+    page_text: str = ""  # main text of the page, when enriched (utils.pages)
+
+    _optional_fields: ClassVar[Tuple[str, ...]] = ("duplicates_merged", "page_text")
+    _interned_fields: ClassVar[Tuple[str, ...]] = ("source",)
+
+
+@dataclass(slots=True)
+class NewsItem(Record):
+    title: str = ""
+    link: str = ""
+    published: str = ""
+    source: str = ""
+    confidence: float = 0.75
+    duplicates_merged: int = 0
+
+    _optional_fields: ClassVar[Tuple[str, ...]] = ("duplicates_merged",)
+    _interned_fields: ClassVar[Tuple[str, ...]] = ("source",)
+
+
+@dataclass(slots=True)
+class SourceRef(Record):
+    title: str = ""
+    url: str = ""
+    confidence: float = 0.0
+
+
+@dataclass(slots=True)
+class Conflict(Record):
+    description: str = ""
+    sources: str = "Unknown"
+    confidence: str = "MEDIUM"
+
+    _interned_fields: ClassVar[Tuple[str, ...]] = ("sources", "confidence")
+
+
+@dataclass(slots=True)
+class FinancialSnapshot(Record):
+    ticker: str = ""
+    revenue: Optional[Any] = None
+    market_cap: Optional[Any] = None
+    pe_ratio: Optional[float] = None
+    employees: Optional[Any] = None
+    sector: Optional[str] = None
+    industry: Optional[str] = None
+    website: Optional[str] = None
+    description: Optional[str] = None
+    source: str = ""
+    confidence: float = 0.0
+    hedge: Optional[Dict[str, Any]] = None
+    trends: Optional[Dict[str, Any]] = None
+
+    _optional_fields: ClassVar[Tuple[str, ...]] = ("hedge", "trends")
+    _interned_fields: ClassVar[Tuple[str, ...]] = ("ticker", "sector", "industry", "source")
+
+
+# State keys holding lists of records, and the single-record keys
+RECORD_LIST_FIELDS = {
+    "web_results": WebResult,
+    "news_data": NewsItem,
+    "sources": SourceRef,
+    "conflicts": Conflict,
+}
+RECORD_FIELDS = {
+    "financial_data": FinancialSnapshot,
+}
+
+
+def _compact(record_type, value):
+    record = record_type.from_dict(value)
+    return value if record is None else record
+
+
+def _expand(value):
+    return value.to_dict() if isinstance(value, Record) else value
+
+
+def compact_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a workflow state with research payloads stored as records.
+    Dicts with fields a record doesn't know are kept as they are.
+    """
+    compact = dict(state)
+    for key, record_type in RECORD_LIST_FIELDS.items():
+        if compact.get(key):
+            compact[key] = [_compact(record_type, item) for item in compact[key]]
+    for key, record_type in RECORD_FIELDS.items():
+        if compact.get(key):
+            compact[key] = _compact(record_type, compact[key])
+    return compact
+
+
+def expand_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a (compacted) workflow state with records converted back to dicts"""
+    expanded = dict(state)
+    for key in RECORD_LIST_FIELDS:
+        if expanded.get(key):
+            expanded[key] = [_expand(item) for item in expanded[key]]
+    for key in RECORD_FIELDS:
+        if expanded.get(key):
+            expanded[key] = _expand(expanded[key])
+    return expanded
+
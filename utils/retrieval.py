@@ -0,0 +1,277 @@
+"""
+Retrieval stage for synthesis
+Chunks gathered research, embeds it locally with sentence-transformers and
+selects the most relevant chunks for each synthesis section
+"""
+import os
+import uuid
+import threading
+from typing import Dict, List, Optional
+
+from utils.state import ResearchState
+from utils.embedding_store import EmbeddingStore
+from utils.metrics import record_cache
+
+# Lazily loaded sentence-transformers model (shared across runs)
+_embedding_model = None
+_embedding_model_error = None
+_embedding_model_lock = threading.Lock()
+_embedding_store = None
+
+
+# ============================================================
+# CHUNKING
+# ============================================================
+
+def chunk_text(text: str, max_words: int = 120, overlap: int = 30) -> List[str]:
+    """Split text into overlapping word windows"""
+    words = (text or "").split()
+    if not words:
+        return []
+    if len(words) <= max_words:
+        return [" ".join(words)]
+
+    chunks = []
+    step = max(1, max_words - overlap)
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + max_words]))
+        if start + max_words >= len(words):
+            break
+    return chunks
+
+
+def build_research_corpus(state: ResearchState, max_words: int = 120) -> List[Dict]:
+    """Chunk every gathered research source into retrievable passages"""
+    corpus = []
+
+    def add(text, source, title="", url=""):
+        for chunk in chunk_text(text, max_words=max_words):
+            corpus.append({"text": chunk, "source": source, "title": title, "url": url})
+
+    wiki_data = state.get('wiki_data') or {}
+    if wiki_data.get('summary'):
+        add(wiki_data['summary'], "Wikipedia", wiki_data.get('title', ''), wiki_data.get('url', ''))
+
+    financial_data = state.get('financial_data') or {}
+    if financial_data.get('description'):
+        add(financial_data['description'], financial_data.get('source', 'Financial'),
+            financial_data.get('ticker', ''))
+
+    for result in state.get('web_results') or []:
+        text = result.get('snippet', '')
+        if result.get('page_text'):
+            text = f"{text}\n{result['page_text']}"
+        if result.get('title'):
+            text = f"{result['title']}. {text}"
+        add(text, result.get('source', 'Web'), result.get('title', ''), result.get('url', ''))
+
+    for news in state.get('news_data') or []:
+        title = news.get('title', '')
+        add(f"{title} ({news.get('published', 'N/A')})", news.get('source', 'News'),
+            title, news.get('link', ''))
+
+    return corpus
+
+
+# ============================================================
+# EMBEDDINGS
+# ============================================================
+
+def get_embedding_model():
+    """Load the local sentence-transformers model, or None if unavailable"""
+    global _embedding_model, _embedding_model_error
+    if _embedding_model is not None or _embedding_model_error is not None:
+        return _embedding_model
+
+    with _embedding_model_lock:
+        if _embedding_model is None and _embedding_model_error is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                model_name = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+                _embedding_model = SentenceTransformer(model_name)
+            except Exception as e:
+                # Remember the failure so every run doesn't retry the import/download
+                _embedding_model_error = e
+                print(f"Embedding model unavailable: {e}")
+    return _embedding_model
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """
+    Shared on-disk embedding cache for the loaded model
+    (EMBEDDING_CACHE_DIR, set it empty to disable; EMBEDDING_CACHE_SIZE entries)
+    """
+    global _embedding_store
+    if _embedding_store is not None:
+        return _embedding_store
+
+    model = get_embedding_model()
+    cache_dir = os.getenv('EMBEDDING_CACHE_DIR', os.path.join('data', 'cache', 'embeddings'))
+    if model is None or not cache_dir:
+        return None
+
+    with _embedding_model_lock:
+        if _embedding_store is None:
+            try:
+                _embedding_store = EmbeddingStore(
+                    dim=model.get_sentence_embedding_dimension(),
+                    capacity=int(os.getenv('EMBEDDING_CACHE_SIZE', '50000')),
+                    path=cache_dir,
+                    model_name=os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+                )
+            except Exception as e:
+                print(f"Embedding cache unavailable: {e}")
+                return None
+    return _embedding_store
+
+
+def embed_texts(texts: List[str], batch_size: int = 32):
+    """
+    Embed texts in batches. Returns an (n, dim) float32 array of unit vectors.
+    Texts already in the embedding cache are not re-embedded.
+    """
+    import numpy as np
+
+    model = get_embedding_model()
+    if model is None:
+        raise RuntimeError("sentence-transformers model is not available")
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    def encode(batch):
+        return model.encode(
+            batch,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    store = get_embedding_store()
+    if store is None:
+        return np.asarray(encode(texts), dtype=np.float32)
+
+    hits, misses = store.hits, store.misses
+    vectors = store.get_or_embed(texts, encode, batch_size=batch_size)
+    record_cache("embeddings", hits=store.hits - hits, misses=store.misses - misses)
+    return vectors
+
+
+# ============================================================
+# INDEX
+# ============================================================
+
+class ResearchIndex:
+    """
+    Per-run index over research chunks.
+    Backend is "memory" (NumPy dot products) or "chromadb" (ephemeral collection),
+    chosen with RETRIEVAL_BACKEND.
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        self.backend = (backend or os.getenv('RETRIEVAL_BACKEND', 'memory')).lower()
+        self.chunks: List[Dict] = []
+        self._vectors = None
+        self._client = None
+        self._collection = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add(self, chunks: List[Dict], batch_size: int = 32):
+        """Embed and index chunks"""
+        if not chunks:
+            return
+        vectors = embed_texts([c['text'] for c in chunks], batch_size=batch_size)
+        offset = len(self.chunks)
+        self.chunks.extend(chunks)
+
+        if self.backend == 'chromadb':
+            if self._collection is None:
+                import chromadb
+                self._client = chromadb.Client()
+                self._collection = self._client.create_collection(
+                    name=f"research-{uuid.uuid4().hex}",
+                    metadata={"hnsw:space": "cosine"}
+                )
+            self._collection.add(
+                ids=[str(offset + i) for i in range(len(chunks))],
+                embeddings=vectors.tolist(),
+                documents=[c['text'] for c in chunks]
+            )
+        else:
+            import numpy as np
+            self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+
+    def search_many(self, queries: List[str], k: int = 4) -> List[List[int]]:
+        """Return the indices of the top-k chunks for each query"""
+        if not self.chunks or not queries:
+            return [[] for _ in queries]
+        k = min(k, len(self.chunks))
+        query_vectors = embed_texts(queries)
+
+        if self.backend == 'chromadb':
+            response = self._collection.query(query_embeddings=query_vectors.tolist(), n_results=k)
+            return [[int(i) for i in ids] for ids in response['ids']]
+
+        import numpy as np
+        scores = query_vectors @ self._vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([int(i) for i in ordered])
+        return results
+
+    def close(self):
+        """Drop the chromadb collection, if any"""
+        if self._collection is not None:
+            try:
+                self._client.delete_collection(self._collection.name)
+            except Exception:
+                pass
+            self._collection = None
+
+
+def retrieve_section_evidence(state: ResearchState, section_queries: Dict[str, str],
+                              k: Optional[int] = None) -> Optional[Dict]:
+    """
+    Select the top-k research chunks for each synthesis section.
+
+    Returns {"chunks": [...], "sections": {section: [chunk positions]}} where
+    positions index into "chunks" (only chunks selected by some section are
+    kept), or None if retrieval is disabled or unavailable so callers can fall
+    back to positional selection.
+    """
+    if os.getenv('SYNTHESIS_RETRIEVAL', 'true').strip().lower() in ('0', 'false', 'no', 'off'):
+        return None
+    if k is None:
+        k = int(os.getenv('SYNTHESIS_TOP_K', '4'))
+
+    corpus = build_research_corpus(state)
+    if not corpus or get_embedding_model() is None:
+        return None
+
+    index = ResearchIndex()
+    try:
+        index.add(corpus)
+        sections = list(section_queries)
+        hits = index.search_many([section_queries[s] for s in sections], k=k)
+    except Exception as e:
+        print(f"Retrieval error: {e}")
+        return None
+    finally:
+        index.close()
+
+    selected: List[Dict] = []
+    positions: Dict[int, int] = {}
+    section_hits = {}
+    for section, chunk_ids in zip(sections, hits):
+        section_hits[section] = []
+        for chunk_id in chunk_ids:
+            if chunk_id not in positions:
+                positions[chunk_id] = len(selected)
+                selected.append(corpus[chunk_id])
+            section_hits[section].append(positions[chunk_id])
+
+    return {"chunks": selected, "sections": section_hits, "corpus_size": len(corpus)}
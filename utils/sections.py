@@ -0,0 +1,160 @@
+"""
+Section cache for incremental synthesis and plan refreshes
+Generated documents (the research synthesis, account plans) are split into
+their "## " sections. Each section is stored with a hash of the inputs it
+was written from, so a refresh only regenerates the sections whose inputs
+changed and splices them back between the unchanged ones.
+
+Set SECTION_CACHE_PATH to an empty value to always regenerate everything.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+_section_cache = None
+_section_cache_lock = threading.Lock()
+
+
+# ============================================================================
+# MARKDOWN SECTIONS
+# ============================================================================
+
+def _heading_key(heading: str) -> str:
+    """Compare headings without emoji, markup or case ("## 🎯 Executive Summary" -> "executive summary")"""
+    return " ".join(re.sub(r"[^\w\s&/-]", " ", heading).lower().split())
+
+
+def split_sections(markdown: str, names: Iterable[str]) -> Dict[str, str]:
+    """
+    Body of each named "## " section found in markdown (text up to the next
+    "## " heading); sections that aren't there are left out
+    """
+    wanted = {_heading_key(name): name for name in names}
+    sections: Dict[str, str] = {}
+    current, lines = None, []
+    for line in (markdown or "").splitlines():
+        if line.startswith("## "):
+            if current is not None:
+                sections[current] = "\n".join(lines).strip()
+            current, lines = wanted.get(_heading_key(line[3:])), []
+        elif current is not None:
+            lines.append(line)
+    if current is not None:
+        sections[current] = "\n".join(lines).strip()
+    return sections
+
+
+def join_sections(sections: Dict[str, str], order: Iterable[str]) -> str:
+    """Markdown of the given sections in order, skipping missing ones"""
+    return "\n\n".join(f"## {name}\n{sections[name]}" for name in order if name in sections)
+
+
+def input_hash(*parts: Any) -> str:
+    """Stable hash of a section's inputs (any JSON-serializable values)"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class SectionCache:
+    """Latest content of each section of a document, with its input hash"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS sections (
+                       scope TEXT NOT NULL,
+                       section TEXT NOT NULL,
+                       input_hash TEXT NOT NULL,
+                       content TEXT NOT NULL,
+                       updated_at REAL NOT NULL,
+                       PRIMARY KEY (scope, section)
+                   )"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection per call (safe across threads), committed on success"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def reusable(self, scope: str, hashes: Dict[str, str]) -> Dict[str, str]:
+        """Cached content of the sections of scope whose input hash is unchanged"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT section, input_hash, content FROM sections WHERE scope = ?", (scope,)
+            ).fetchall()
+        return {section: content for section, stored_hash, content in rows
+                if hashes.get(section) == stored_hash}
+
+    def store(self, scope: str, hashes: Dict[str, str], contents: Dict[str, str]):
+        """Remember freshly generated sections (only those with a hash)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO sections (scope, section, input_hash, content, updated_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [(scope, section, hashes[section], content, now)
+                 for section, content in contents.items() if section in hashes]
+            )
+
+
+def get_section_cache() -> Optional[SectionCache]:
+    """
+    Shared section cache at SECTION_CACHE_PATH (default data/cache/sections.sqlite).
+    Set SECTION_CACHE_PATH to an empty value to disable it.
+    """
+    global _section_cache
+    path = os.getenv('SECTION_CACHE_PATH', os.path.join('data', 'cache', 'sections.sqlite'))
+    if not path:
+        return None
+
+    with _section_cache_lock:
+        if _section_cache is None or _section_cache.path != path:
+            try:
+                _section_cache = SectionCache(path)
+            except Exception as e:
+                print(f"Section cache unavailable: {e}")
+                return None
+    return _section_cache
+
+
+def reusable_sections(scope: str, hashes: Dict[str, str]) -> Dict[str, str]:
+    """Sections that can be reused as-is ({} when the cache is off or unreadable)"""
+    cache = get_section_cache()
+    if cache is None or not scope:
+        return {}
+    try:
+        return cache.reusable(scope, hashes)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not read cached sections: {e}")
+        return {}
+
+
+def store_sections(scope: str, hashes: Dict[str, str], contents: Dict[str, str]):
+    cache = get_section_cache()
+    if cache is None or not scope or not contents:
+        return
+    try:
+        cache.store(scope, hashes, contents)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not cache sections: {e}")
+
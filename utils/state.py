@@ -1,7 +1,8 @@
 """
 State definitions for the two-phase research workflow
 """
-from typing import TypedDict, Optional, List, Dict
+import operator
+from typing import TypedDict, Optional, List, Dict, Annotated
 from datetime import datetime
 
 
@@ -56,16 +57,26 @@ class ResearchState(TypedDict, total=False):
     
     # Processing & Verification
     conflicts: List[Dict[str, any]]
-    progress_messages: List[str]
+    progress_messages: Annotated[List[str], operator.add]  # Append-only
     synthesized_data: Optional[str]
     
     # Output
     account_plan: Optional[Dict[str, any]]
     generic_plan: Optional[Dict[str, any]]  # Generic plan for comparison
-    sources: List[Dict[str, any]]
+    sources: Annotated[List[Dict[str, any]], operator.add]  # Append-only
+    
+    # Shared knowledge base
+    profile_key: Optional[str]  # Normalized company key for the knowledge base
+    reused_sources: List[str]  # Sources loaded from the knowledge base this run
     
     # Control Flow
     next_node: str
+    completed_nodes: Annotated[List[str], operator.add]  # Nodes that have run (or whose output was reused)
+    timings: Annotated[List[Dict[str, any]], operator.add]  # Per-node wall time, provider calls, tokens
+    timing_summary: Optional[Dict[str, any]]  # Run totals, set when the workflow ends
+    profile_run_id: Optional[str]  # Set when this run is being profiled (utils.profiling)
+    trace_parent: Optional[str]  # traceparent of the run's root span when tracing (utils.tracing)
+    usage_run_id: Optional[str]  # Run that provider usage is charged to (utils.accounting)
     needs_user_input: bool
     user_response: Optional[str]
     current_question: Optional[str]
@@ -99,9 +110,50 @@ def create_initial_state(
         generic_plan=None,
         sources=[],
         next_node="",
+        completed_nodes=[],
+        timings=[],
+        timing_summary=None,
+        profile_run_id=None,
+        trace_parent=None,
+        usage_run_id=None,
         needs_user_input=False,
         user_response=None,
         current_question=None,
         created_at=datetime.now().isoformat(),
         updated_at=datetime.now().isoformat()
-    )
\ No newline at end of file
+    )
+
+
+# ============================================================================
+# STATE DELTAS
+# ============================================================================
+
+# List fields nodes only ever append to; deltas carry just the new items
+APPEND_ONLY_KEYS = ("progress_messages", "sources", "completed_nodes", "timings")
+
+
+def state_delta(before: Dict, after: Dict) -> Dict:
+    """
+    Changes a node made: new items for append-only lists, and every other
+    key whose value was reassigned or changed
+    """
+    delta = {}
+    for key, value in after.items():
+        old = before.get(key)
+        if key in APPEND_ONLY_KEYS:
+            added = list(value or [])[len(old or []):]
+            if added:
+                delta[key] = added
+        elif value is not old and value != old:
+            delta[key] = value
+    return delta
+
+
+def apply_state_delta(state: Dict, delta: Dict) -> Dict:
+    """Apply a node's delta to an accumulated state in place (and return it)"""
+    for key, value in delta.items():
+        if key in APPEND_ONLY_KEYS:
+            state[key] = list(state.get(key) or []) + list(value)
+        else:
+            state[key] = value
+    return state
@@ -0,0 +1,132 @@
+"""
+Binary codec for research state
+Compact, versioned encoding for checkpoints, caches and the job queue:
+MessagePack (compact JSON if msgpack isn't installed) with zstd or zlib
+compression for larger payloads
+"""
+import os
+import json
+import zlib
+from datetime import date
+from typing import Any, Dict, Optional
+
+from utils.records import Record
+
+MAGIC = b"RS"
+# Bump when the state layout changes; register a migration for the old version
+SCHEMA_VERSION = 1
+
+# Header: MAGIC + schema version + encoding + compression (one byte each)
+ENCODING_MSGPACK = b"m"
+ENCODING_JSON = b"j"
+COMPRESSION_NONE = b"-"
+COMPRESSION_ZLIB = b"z"
+COMPRESSION_ZSTD = b"Z"
+HEADER_SIZE = len(MAGIC) + 3
+
+# Payloads smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv('STATE_CODEC_COMPRESS_MIN_BYTES', '1024'))
+ZLIB_LEVEL = 3
+ZSTD_LEVEL = 3
+
+# schema version -> function upgrading a decoded object to the next version
+MIGRATIONS: Dict[int, Any] = {}
+
+
+def _default(value):
+    """
+    Fallback for the values the encoders don't know: records and
+    dates/datetimes (as ISO strings). Anything else raises TypeError, so
+    state that wouldn't decode back to the same value fails when encoded.
+    """
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Can't encode {type(value).__name__} in research state")
+
+
+def _msgpack():
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        return None
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def encode_state(obj: Any, compression: Optional[str] = "auto") -> bytes:
+    """
+    Encode a state (or any JSON-like value) to bytes.
+    compression: "auto" (zstd if installed, else zlib), "zstd", "zlib" or None.
+    """
+    msgpack = _msgpack()
+    if msgpack is not None:
+        encoding = ENCODING_MSGPACK
+        body = msgpack.packb(obj, use_bin_type=True, default=_default)
+    else:
+        encoding = ENCODING_JSON
+        body = json.dumps(obj, separators=(",", ":"), default=_default).encode("ascii")
+
+    method = COMPRESSION_NONE
+    if compression and len(body) >= COMPRESS_MIN_BYTES:
+        zstd = _zstd()
+        if compression in ("auto", "zstd") and zstd is not None:
+            method = COMPRESSION_ZSTD
+            body = zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+        elif compression in ("auto", "zlib", "zstd"):
+            method = COMPRESSION_ZLIB
+            body = zlib.compress(body, ZLIB_LEVEL)
+
+    return MAGIC + bytes([SCHEMA_VERSION]) + encoding + method + body
+
+
+def decode_state(data: Any) -> Any:
+    """
+    Decode bytes from encode_state, migrating older schema versions.
+    Plain JSON text (str or bytes without the header) is accepted for data
+    written before the codec existed.
+    """
+    if data is None:
+        return None
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    if not data.startswith(MAGIC):
+        return json.loads(data.decode("utf-8"))
+
+    version = data[len(MAGIC)]
+    encoding = data[len(MAGIC) + 1:len(MAGIC) + 2]
+    method = data[len(MAGIC) + 2:HEADER_SIZE]
+    body = data[HEADER_SIZE:]
+
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"State was written by a newer schema (v{version}, this is v{SCHEMA_VERSION})")
+
+    if method == COMPRESSION_ZSTD:
+        zstd = _zstd()
+        if zstd is None:
+            raise ValueError("State is zstd-compressed but the zstandard package is not installed")
+        body = zstd.ZstdDecompressor().decompress(body)
+    elif method == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+
+    if encoding == ENCODING_MSGPACK:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise ValueError("State is MessagePack-encoded but the msgpack package is not installed")
+        obj = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    else:
+        obj = json.loads(body.decode("utf-8"))
+
+    while version < SCHEMA_VERSION:
+        obj = MIGRATIONS[version](obj)
+        version += 1
+    return obj
@@ -0,0 +1,358 @@
+"""
+Span tracing for research runs
+Spans for every workflow node, LLM call and provider call, linked
+parent-to-child and exported in OTLP/JSON - as JSON lines to a local file
+(the OpenTelemetry collector's file format) or POSTed to an OTLP/HTTP
+collector (Jaeger, Tempo, the OTel collector) - so a run can be viewed as
+a waterfall.
+
+Configure with TRACE_EXPORT (file / otlp; unset disables tracing),
+TRACE_FILE and TRACE_OTLP_ENDPOINT. View a file locally with:
+    python -m utils.tracing data/traces/traces.jsonl [--trace <trace id>]
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import argparse
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'company-research-assistant')
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# Finished spans of a trace are held until its local root ends; cap them
+# so a trace whose root never ends can't grow without bound
+MAX_PENDING_SPANS = 5000
+# Recently exported traces, so late spans are exported instead of held
+RECENT_TRACES = 1000
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation; attributes follow OpenTelemetry naming where one exists"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "local_root",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str],
+                 local_root: bool, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.local_root = local_root
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value for this span"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def add(self, key: str, value: float):
+        """Increment a numeric attribute (cache hits, tokens, ...)"""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace_id, parent span id) from a W3C traceparent, or None if invalid"""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+# ============================================================================
+# EXPORTERS
+# ============================================================================
+
+class SpanExporter(ABC):
+    """
+    Collects finished spans per trace and exports a trace when its local
+    root ends. Spans finishing after that (e.g. an abandoned hedged request)
+    are exported on their own. Exports happen on a background thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Span]] = {}
+        self._exported: "OrderedDict[str, None]" = OrderedDict()
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue()
+        threading.Thread(target=self._run, daemon=True, name="trace-export").start()
+
+    def on_end(self, span: Span):
+        with self._lock:
+            if span.trace_id in self._exported:
+                batch = [span]
+            else:
+                spans = self._pending.setdefault(span.trace_id, [])
+                if len(spans) < MAX_PENDING_SPANS:
+                    spans.append(span)
+                if not span.local_root:
+                    return
+                batch = self._pending.pop(span.trace_id)
+                self._exported[span.trace_id] = None
+                while len(self._exported) > RECENT_TRACES:
+                    self._exported.popitem(last=False)
+        self._queue.put(batch)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                self.export(self._request(batch))
+            except Exception as e:
+                print(f"⚠️ Trace export failed: {e}")
+
+    @staticmethod
+    def _request(spans: List[Span]) -> Dict[str, Any]:
+        """OTLP ExportTraceServiceRequest (JSON encoding)"""
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "research-assistant"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]}
+
+    @abstractmethod
+    def export(self, request: Dict[str, Any]):
+        """Send one OTLP/JSON request (called on the export thread)"""
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued traces are exported"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+
+class FileExporter(SpanExporter):
+    """One OTLP/JSON request per line, as the OTel collector's file exporter writes"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, request: Dict[str, Any]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, separators=(",", ":")) + "\n")
+
+
+class OTLPExporter(SpanExporter):
+    """POSTs OTLP/JSON to a collector's /v1/traces endpoint"""
+
+    def __init__(self, endpoint: str):
+        super().__init__()
+        self.endpoint = endpoint
+
+    def export(self, request: Dict[str, Any]):
+        import requests
+        response = requests.post(self.endpoint, json=request, timeout=10)
+        response.raise_for_status()
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_loaded = False
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    """Exporter configured by TRACE_EXPORT (None when tracing is off)"""
+    global _exporter, _exporter_loaded
+    if _exporter_loaded:
+        return _exporter
+    with _exporter_lock:
+        if not _exporter_loaded:
+            mode = os.getenv('TRACE_EXPORT', '').strip().lower()
+            if mode == "file":
+                _exporter = FileExporter(os.getenv('TRACE_FILE', os.path.join('data', 'traces', 'traces.jsonl')))
+            elif mode == "otlp":
+                _exporter = OTLPExporter(os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'))
+            if _exporter is not None:
+                # The export thread is a daemon; don't lose the last traces on exit
+                atexit.register(_exporter.flush)
+            _exporter_loaded = True
+    return _exporter
+
+
+def set_exporter(exporter: Optional[SpanExporter]):
+    """Install an exporter programmatically (e.g. from a benchmark script)"""
+    global _exporter, _exporter_loaded
+    with _exporter_lock:
+        _exporter, _exporter_loaded = exporter, True
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, parent: Union[None, str, Span] = None,
+         root: bool = False, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Trace the block as a span, a child of parent (a Span or traceparent
+    string) or else of the current span. Yields None when tracing is off.
+    root=True marks the span that ends (and exports) its trace locally.
+    """
+    exporter = get_exporter()
+    if exporter is None:
+        yield None
+        return
+
+    if isinstance(parent, str):
+        parent = parse_traceparent(parent)
+    elif isinstance(parent, Span):
+        parent = (parent.trace_id, parent.span_id)
+    elif parent is None:
+        current = _current_span.get()
+        parent = (current.trace_id, current.span_id) if current is not None else None
+
+    trace_id, parent_id = parent if parent else (os.urandom(16).hex(), None)
+    current = Span(name, kind, trace_id, parent_id, root or parent is None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        exporter.on_end(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def traced(name: str, kind: int = KIND_INTERNAL, root: bool = False):
+    """Decorator: trace every call of the function as a span"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind, root=root):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace_run(state: Dict, name: str = "research_run", parent: Optional[str] = None, **attributes):
+    """
+    Root span for one workflow run. Its traceparent is stored in the
+    state so nodes (which run on the graph's threads) attach to it.
+    """
+    with span(name, KIND_SERVER, parent=parent, root=True,
+              company=state.get('target_company_name'), **attributes) as run_span:
+        if run_span is not None:
+            state['trace_parent'] = run_span.traceparent
+        yield run_span
+
+
+# ============================================================================
+# WATERFALL VIEW
+# ============================================================================
+
+def load_traces(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """trace id -> spans from an OTLP/JSON lines file"""
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line).get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for s in scope_spans.get("spans", []):
+                        traces.setdefault(s["traceId"], []).append(s)
+    return traces
+
+
+def format_waterfall(spans: List[Dict[str, Any]], width: int = 50) -> str:
+    """Text waterfall: one line per span, indented by depth, with a time bar"""
+    start = min(int(s["startTimeUnixNano"]) for s in spans)
+    end = max(int(s["endTimeUnixNano"]) for s in spans)
+    total = max(end - start, 1)
+    ids = {s["spanId"] for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in sorted(spans, key=lambda s: int(s["startTimeUnixNano"])):
+        parent = s.get("parentSpanId") if s.get("parentSpanId") in ids else None
+        children.setdefault(parent, []).append(s)
+
+    lines = [f"trace {spans[0]['traceId']}  {total / 1e9:.3f}s"]
+
+    def walk(parent, depth):
+        for s in children.get(parent, []):
+            s_start = int(s["startTimeUnixNano"]) - start
+            s_len = int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])
+            offset = int(s_start / total * width)
+            bar = " " * offset + "█" * max(1, int(s_len / total * width))
+            failed = " ✗" if s.get("status", {}).get("code") == 2 else ""
+            label = ("  " * depth + s["name"])[:38]
+            lines.append(f"{label:<38} {s_len / 1e9:>7.3f}s |{bar:<{width}}|{failed}")
+            walk(s["spanId"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show traces from an OTLP/JSON lines file as waterfalls")
+    parser.add_argument("path", nargs="?", default=os.getenv('TRACE_FILE', os.path.join('data', 'traces', 'traces.jsonl')))
+    parser.add_argument("--trace", help="trace ID to show (default: the last 3 traces)")
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    selected = [args.trace] if args.trace else list(traces)[-3:]
+    for trace_id in selected:
+        print(format_waterfall(traces[trace_id]))
+        print()
+
+
+if __name__ == "__main__":
+    main()
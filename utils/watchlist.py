@@ -0,0 +1,302 @@
+"""
+Watchlist news monitoring
+Reps add target companies to a watchlist; a poller (monitor.py) checks
+each company's Google News feed on a schedule with conditional requests,
+remembers which items it has seen, and appends only new items to a change
+feed that the app and API read from.
+
+Each company is polled once no matter how many reps watch it. Polls are
+spread out with jitter and run in batches, so hundreds of companies cost a
+steady trickle of mostly-304 requests.
+"""
+import os
+import time
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from utils.entities import resolve_company
+from utils.dedup import news_title_key
+from utils.metrics import instrument_call, record_cache
+from utils.news_feed import google_news_feed_url, news_item, news_item_id, parse_feed
+
+# Polls of one company are jittered by +/- this fraction of the interval
+POLL_JITTER = 0.1
+# Failed polls back off exponentially up to this long
+MAX_BACKOFF = 6 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id TEXT NOT NULL,
+    company_key TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (user_id, company_key)
+);
+CREATE INDEX IF NOT EXISTS watchlist_company ON watchlist (company_key);
+CREATE TABLE IF NOT EXISTS feeds (
+    company_key TEXT PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    feed_url TEXT NOT NULL,
+    etag TEXT,
+    modified TEXT,
+    baseline_done INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_polled_at REAL,
+    next_poll_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feeds_due ON feeds (next_poll_at);
+CREATE TABLE IF NOT EXISTS seen_items (
+    company_key TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    title_key TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (company_key, item_id)
+);
+CREATE INDEX IF NOT EXISTS seen_title ON seen_items (company_key, title_key);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_key TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT,
+    published TEXT,
+    source TEXT,
+    detected_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_company ON changes (company_key, seq);
+"""
+
+_watchlist = None
+_watchlist_lock = threading.Lock()
+
+
+@instrument_call("google_news", size_fn=lambda feed: len(feed.entries))
+def poll_feed(url: str, etag: Optional[str], modified: Optional[str]):
+    """One conditional fetch of a company's feed"""
+    feed = parse_feed(url, etag=etag, modified=modified)
+    status = feed.get('status')
+    if status is None or status >= 400 or (feed.get('bozo') and not feed.entries and status != 304):
+        raise RuntimeError(f"feed fetch failed (status {status}): {feed.get('bozo_exception', '')}")
+    return feed
+
+
+class Watchlist:
+    """SQLite store of watched companies, their feed state, seen items and the change feed"""
+
+    def __init__(self, path: str, poll_interval: Optional[float] = None):
+        self.path = path
+        # Seconds between polls of one company
+        self.poll_interval = poll_interval or float(os.getenv('WATCH_POLL_INTERVAL', '900'))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection per call (safe across threads), committed on success"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------------- watchlist ----------------
+
+    def add(self, company_name: str, user_id: str = "anonymous") -> str:
+        """Watch a company for user_id; returns its company key"""
+        company = resolve_company(company_name)
+        key, name, now = company['canonical_id'], company['name'] or company_name, time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO watchlist (user_id, company_key, company_name, added_at) VALUES (?, ?, ?, ?)",
+                (user_id, key, name, now)
+            )
+            # New feeds are due right away (spread over a few seconds)
+            conn.execute(
+                """INSERT OR IGNORE INTO feeds (company_key, company_name, feed_url, next_poll_at)
+                   VALUES (?, ?, ?, ?)""",
+                (key, name, google_news_feed_url(company_name), now + random.uniform(0, 5))
+            )
+        return key
+
+    def remove(self, company_name: str, user_id: str = "anonymous"):
+        """Stop watching; the feed is dropped once no user watches it"""
+        key = resolve_company(company_name)['canonical_id']
+        with self._connect() as conn:
+            conn.execute("DELETE FROM watchlist WHERE user_id = ? AND company_key = ?", (user_id, key))
+            if not conn.execute("SELECT 1 FROM watchlist WHERE company_key = ? LIMIT 1", (key,)).fetchone():
+                conn.execute("DELETE FROM feeds WHERE company_key = ?", (key,))
+                conn.execute("DELETE FROM seen_items WHERE company_key = ?", (key,))
+
+    def companies(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Watched companies (for one user, or all) with their feed's poll state"""
+        sql = """SELECT w.user_id, w.company_key, w.company_name, f.last_polled_at, f.next_poll_at, f.failures
+                 FROM watchlist w LEFT JOIN feeds f ON f.company_key = w.company_key"""
+        params: tuple = ()
+        if user_id is not None:
+            sql += " WHERE w.user_id = ?"
+            params = (user_id,)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql + " ORDER BY w.company_name", params)]
+
+    # ---------------- polling ----------------
+
+    def _next_poll(self, now: float, failures: int = 0) -> float:
+        interval = min(self.poll_interval * 2 ** failures, MAX_BACKOFF) if failures else self.poll_interval
+        return now + interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    def due_feeds(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT * FROM feeds WHERE next_poll_at <= ? ORDER BY next_poll_at LIMIT ?", (now, limit)
+            )]
+
+    def next_poll_at(self) -> Optional[float]:
+        """When the next feed comes due (None when nothing is watched)"""
+        with self._connect() as conn:
+            return conn.execute("SELECT MIN(next_poll_at) FROM feeds").fetchone()[0]
+
+    def _apply_poll(self, conn, feed: Dict[str, Any], result, now: float) -> int:
+        """Store one poll's outcome; returns the number of new items added to the change feed"""
+        key = feed['company_key']
+        if isinstance(result, Exception):
+            conn.execute(
+                "UPDATE feeds SET failures = failures + 1, last_polled_at = ?, next_poll_at = ? WHERE company_key = ?",
+                (now, self._next_poll(now, feed['failures'] + 1), key)
+            )
+            return 0
+
+        new_items = 0
+        if result.get('status') == 304:
+            record_cache("news_feeds", hits=1)
+            # Unchanged feed: the items of the last full fetch (which share
+            # its seen_at) are still in it
+            conn.execute(
+                """UPDATE seen_items SET seen_at = ? WHERE company_key = ? AND seen_at =
+                       (SELECT MAX(seen_at) FROM seen_items WHERE company_key = ?)""",
+                (now, key, key)
+            )
+        else:
+            record_cache("news_feeds", misses=1)
+            for entry in result.entries:
+                item_id = news_item_id(entry)
+                item = news_item(entry)
+                title_key = news_title_key(item['title']).lower()
+                # Syndicated copies of a story we already reported get a new guid
+                repeat = conn.execute("SELECT 1 FROM seen_items WHERE company_key = ? AND title_key = ? LIMIT 1",
+                                      (key, title_key)).fetchone()
+                # seen_at is the latest sighting, so items still in the
+                # feed are never pruned and reported again
+                if conn.execute("UPDATE seen_items SET seen_at = ? WHERE company_key = ? AND item_id = ?",
+                                (now, key, item_id)).rowcount:
+                    continue  # Seen before
+                conn.execute(
+                    "INSERT INTO seen_items (company_key, item_id, title_key, seen_at) VALUES (?, ?, ?, ?)",
+                    (key, item_id, title_key, now)
+                )
+                # The first poll only records what's already out there
+                if feed['baseline_done'] and not repeat:
+                    conn.execute(
+                        """INSERT INTO changes (company_key, company_name, title, link, published, source, detected_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        (key, feed['company_name'], item['title'], item['link'], item['published'],
+                         item['source'], now)
+                    )
+                    new_items += 1
+
+        conn.execute(
+            """UPDATE feeds SET etag = COALESCE(?, etag), modified = COALESCE(?, modified), baseline_done = 1,
+                   failures = 0, last_polled_at = ?, next_poll_at = ? WHERE company_key = ?""",
+            (result.get('etag'), result.get('modified'), now, self._next_poll(now), key)
+        )
+        return new_items
+
+    def poll_due(self, batch_size: int = 50, concurrency: int = 4) -> Dict[str, int]:
+        """
+        Poll every feed that is due, batch_size at a time with concurrency
+        requests in flight. Returns counts of feeds polled, unchanged (304),
+        failed and new items.
+        """
+        stats = {"polled": 0, "unchanged": 0, "failed": 0, "new_items": 0}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="news-poll") as pool:
+            while True:
+                feeds = self.due_feeds(batch_size)
+                if not feeds:
+                    break
+
+                def fetch(feed):
+                    try:
+                        return poll_feed(feed['feed_url'], feed['etag'], feed['modified'])
+                    except Exception as e:
+                        return e
+
+                results = list(pool.map(fetch, feeds))
+                now = time.time()
+                # One write transaction per batch
+                with self._connect() as conn:
+                    for feed, result in zip(feeds, results):
+                        stats["new_items"] += self._apply_poll(conn, feed, result, now)
+                        stats["polled"] += 1
+                        if isinstance(result, Exception):
+                            stats["failed"] += 1
+                        elif result.get('status') == 304:
+                            stats["unchanged"] += 1
+        return stats
+
+    def prune(self, retention_days: Optional[int] = None):
+        """
+        Forget changes older than WATCH_RETENTION_DAYS (default 30), and
+        seen items that haven't been in their feed for that long
+        """
+        if retention_days is None:
+            retention_days = int(os.getenv('WATCH_RETENTION_DAYS', '30'))
+        cutoff = time.time() - retention_days * 86400
+        with self._connect() as conn:
+            conn.execute("DELETE FROM seen_items WHERE seen_at < ?", (cutoff,))
+            conn.execute("DELETE FROM changes WHERE detected_at < ?", (cutoff,))
+
+    # ---------------- change feed ----------------
+
+    def changes(self, since: int = 0, user_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        New items after sequence number since (oldest first), for the
+        companies user_id watches (or all); pass the last seq back as since
+        to continue
+        """
+        if user_id is None:
+            sql, params = "SELECT * FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)
+        else:
+            sql = """SELECT c.* FROM changes c JOIN watchlist w ON w.company_key = c.company_key
+                     WHERE c.seq > ? AND w.user_id = ? ORDER BY c.seq LIMIT ?"""
+            params = (since, user_id, limit)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def recent_changes(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """The user's latest new items, newest first"""
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                """SELECT c.* FROM changes c JOIN watchlist w ON w.company_key = c.company_key
+                   WHERE w.user_id = ? ORDER BY c.seq DESC LIMIT ?""", (user_id, limit)
+            )]
+
+
+def get_watchlist() -> Watchlist:
+    """Shared watchlist at WATCHLIST_PATH (default data/watchlist.sqlite)"""
+    global _watchlist
+    path = os.getenv('WATCHLIST_PATH', os.path.join('data', 'watchlist.sqlite'))
+
+    with _watchlist_lock:
+        if _watchlist is None or _watchlist.path != path:
+            _watchlist = Watchlist(path)
+    return _watchlist
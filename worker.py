@@ -0,0 +1,177 @@
+"""
+Research worker
+Runs queued research jobs in separate processes, so runs survive browser
+disconnects and don't compete with the Streamlit UI for the GIL
+
+Run with:
+    python worker.py --processes 2
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import threading
+import traceback
+import multiprocessing
+from dotenv import load_dotenv
+
+from utils.job_queue import get_job_queue, ClaimLost, COMPLETE, FAILED, CANCELLED
+from utils.state import apply_state_delta
+from utils.metrics import start_metrics_server
+from utils.profiling import profile_run, should_profile
+from utils.tracing import trace_run
+from utils.accounting import account_run
+
+load_dotenv()
+
+# Seconds an idle worker waits before checking the queue again
+POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))
+
+
+class Heartbeat:
+    """Keeps a job's claim alive from a background thread, so slow nodes don't get it requeued"""
+
+    def __init__(self, queue, job_id: str, worker_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        interval = max(self.queue.stale_after / 3, 1.0)
+        while not self._stop.wait(interval):
+            try:
+                self.queue.heartbeat(self.job_id, self.worker_id)
+            except ClaimLost:
+                self.lost.set()
+                return
+            except Exception as e:
+                print(f"⚠️ Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"heartbeat-{self.job_id[:8]}")
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(queue, workflow, job, worker_id: str):
+    """
+    Run one job's workflow, reporting new progress messages after every
+    node (and a heartbeat in the background meanwhile). The result is the
+    initial state with every node's delta applied. A job this worker no
+    longer owns (requeued as stale) stops at the next node with ClaimLost.
+    Jobs matching PROFILE_RUNS are profiled into files named after the job ID;
+    with TRACE_EXPORT set, each job is traced. Provider usage is charged to
+    the job and its user.
+    """
+    payload = job['payload']
+    with trace_run(payload, "research_job", job_id=job['job_id']), \
+            account_run(payload, job['job_id'], job['user_id']), \
+            profile_run(payload, job['job_id'], should_profile(payload.get('target_company_name', ''))), \
+            Heartbeat(queue, job['job_id'], worker_id) as heartbeat:
+        _stream_job(queue, workflow, job, worker_id, heartbeat)
+
+
+def _stream_job(queue, workflow, job, worker_id: str, heartbeat: Heartbeat):
+    job_id = job['job_id']
+    state = dict(job['payload'])
+
+    for step_output in workflow.stream(job['payload']):
+        # Each step is {node_name: changes that node made}
+        node, delta = next(iter(step_output.items()))
+        if node == "__end__":
+            break
+        if not isinstance(delta, dict):
+            continue
+        apply_state_delta(state, delta)
+
+        if heartbeat.lost.is_set():
+            raise ClaimLost(f"job {job_id} is no longer claimed by {worker_id}")
+        if queue.report_progress(job_id, worker_id, delta.get('progress_messages') or []):
+            queue.finish(job_id, worker_id, CANCELLED, result=state)
+            print(f"🛑 Job {job_id} cancelled")
+            return
+
+    queue.finish(job_id, worker_id, COMPLETE, result=state)
+    print(f"✅ Job {job_id} complete")
+
+
+def worker_loop(worker_index: int = 0, max_jobs: int = 0):
+    """Claim and run jobs until stopped (or after max_jobs jobs, if set)"""
+    # Imported here so each process builds its own clients and workflow
+    from workflow import create_research_workflow
+
+    queue = get_job_queue()
+    workflow = create_research_workflow()
+    # Each process serves its own /metrics on METRICS_PORT + worker index
+    metrics_port = int(os.getenv('METRICS_PORT', '0') or 0)
+    if metrics_port:
+        start_metrics_server(metrics_port + worker_index)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    jobs_done = 0
+
+    print(f"👷 Worker {worker_id} started")
+    while not max_jobs or jobs_done < max_jobs:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        print(f"🔬 Job {job['job_id']} ({job['payload'].get('target_company_name', '')}) started")
+        try:
+            run_job(queue, workflow, job, worker_id)
+        except ClaimLost:
+            # Another worker owns the job now; drop this run's results
+            print(f"⚠️ Job {job['job_id']} was requeued while running here - stopped")
+        except Exception as e:
+            try:
+                queue.finish(job['job_id'], worker_id, FAILED, error=str(e))
+            except ClaimLost:
+                pass
+            print(f"❌ Job {job['job_id']} failed: {e}")
+            traceback.print_exc()
+        jobs_done += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued research jobs")
+    parser.add_argument("--processes", type=int, default=int(os.getenv('JOB_WORKERS', '2')),
+                        help="number of worker processes")
+    parser.add_argument("--max-jobs", type=int, default=0,
+                        help="exit each process after this many jobs (0 = run forever)")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        worker_loop(0, args.max_jobs)
+        return
+
+    processes = [
+        multiprocessing.Process(target=worker_loop, args=(i, args.max_jobs), daemon=True)
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop(None, None)
+
+
+if __name__ == "__main__":
+    main()
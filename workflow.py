@@ -3,8 +3,13 @@ LangGraph workflow for Phase 2 (Target Company Research)
 Full implementation with all agents
 """
 from langgraph.graph import StateGraph, END
-from utils.state import ResearchState
+from utils.state import ResearchState, APPEND_ONLY_KEYS, state_delta
+from utils.metrics import node_timer, summarize_timings
+from utils.profiling import get_run_profile
+from utils.tracing import span
+from utils.accounting import use_run_usage
 from agents.research import web_search_node, financial_node, wikipedia_node, news_node
+from agents.knowledge import load_profile_node, save_profile_node
 from agents.synthesis import (
     verification_node, 
     synthesis_node, 
@@ -13,57 +18,110 @@ from agents.synthesis import (
 )
 
 
+# Nodes in the order the supervisor runs them. Each runs once; sources
+# reused from the knowledge base are marked complete up front.
+WORKFLOW_SEQUENCE = [
+    "load_profile",
+    "web_search",
+    "financial",
+    "wikipedia",
+    "news",
+    "verification",
+    "synthesis",
+    "save_profile",
+    "personalized_plan",
+    "generic_plan_generator",
+]
+
+
 def supervisor_node(state: ResearchState) -> ResearchState:
     """
     Supervisor agent that routes to appropriate research agents
-    Sequential flow: Research → Verify → Synthesize → Generate Plans
+    Sequential flow: Knowledge Base → Research → Verify → Synthesize → Save → Generate Plans
     """
-    # Check what stage we're at
-    # Use 'key not in state' to check if a node has RUN (not if it succeeded)
-    # This prevents infinite loops when nodes fail and set fields to None
+    # Route on which nodes have RUN (not whether they succeeded), so nodes that
+    # fail and set their fields to None don't loop. Checking 'key not in state'
+    # doesn't work: unset state keys are read back as None.
+    completed = state.get('completed_nodes') or []
 
-    if 'web_results' not in state:
-        state["next_node"] = "web_search"
-    elif 'financial_data' not in state:
-        state["next_node"] = "financial"
-    elif 'wiki_data' not in state:
-        state["next_node"] = "wikipedia"
-    elif 'news_data' not in state:
-        state["next_node"] = "news"
-    elif 'conflicts' not in state:  # THIS IS THE KEY FIX
-        state["next_node"] = "verification"
-    elif 'synthesized_data' not in state:
-        state["next_node"] = "synthesis"
-    elif 'account_plan' not in state:
-        state["next_node"] = "personalized_plan"
-    elif 'generic_plan' not in state:
-        state["next_node"] = "generic_plan"
-    else:
-        state["next_node"] = "end"
+    state["next_node"] = "end"
+    for node in WORKFLOW_SEQUENCE:
+        if node not in completed:
+            state["next_node"] = node
+            break
+    
+    if state["next_node"] == "end":
+        state["timing_summary"] = summarize_timings(state.get('timings'))
     
     return state
 
 
+def _call_node(node, state: ResearchState, name: str) -> ResearchState:
+    """Run a node, under the run's profiler if this run is being profiled"""
+    profile = get_run_profile(state.get('profile_run_id'))
+    if profile is None:
+        return node(state)
+    with profile.node(name):
+        return node(state)
+
+
+def _emit_delta(node, name: str = None):
+    """
+    Wrap a node so it returns only the changes it made (new progress
+    messages, sources, etc. and reassigned keys) instead of the full state.
+    Named nodes also record themselves in completed_nodes, add their
+    timing entry (wall time, provider calls, cache hits, tokens) to timings,
+    are traced as a span of the run and charge their provider usage to it.
+    """
+    def run(state: ResearchState) -> ResearchState:
+        # Nodes append to lists in place; give them copies so the graph's
+        # channels are only updated through the returned delta
+        working = dict(state)
+        for key in APPEND_ONLY_KEYS:
+            working[key] = list(state.get(key) or [])
+
+        if name is None:
+            working = node(working)
+        else:
+            # Nodes run on the graph's threads: parent the span explicitly
+            with span(f"node {name}", parent=state.get('trace_parent'), node=name), \
+                    use_run_usage(state.get('usage_run_id')), node_timer(name) as timing:
+                working = _call_node(node, working, name)
+            working['completed_nodes'] = working['completed_nodes'] + [name]
+            working['timings'] = working['timings'] + [timing]
+        return state_delta(state, working)
+    return run
+
+
 def create_research_workflow():
     """
     Create the complete LangGraph workflow for Phase 2
     
     Flow:
+    0. Knowledge Base (reuse fresh research)
     1. Web Search → 2. Financial → 3. Wikipedia → 4. News
-    5. Verification → 6. Synthesis → 7. Personalized Plan → 8. Generic Plan
+    5. Verification → 6. Synthesis → Save to Knowledge Base
+    7. Personalized Plan → 8. Generic Plan
     """
     workflow = StateGraph(ResearchState)
     
     # Add all nodes
-    workflow.add_node("supervisor", supervisor_node)
-    workflow.add_node("web_search", web_search_node)
-    workflow.add_node("financial", financial_node)
-    workflow.add_node("wikipedia", wikipedia_node)
-    workflow.add_node("news", news_node)
-    workflow.add_node("verification", verification_node)
-    workflow.add_node("synthesis", synthesis_node)
-    workflow.add_node("personalized_plan", personalized_plan_generator_node)
-    workflow.add_node("generic_plan", generic_plan_generator_node)
+    workflow.add_node("supervisor", _emit_delta(supervisor_node))
+    nodes = {
+        "load_profile": load_profile_node,
+        "web_search": web_search_node,
+        "financial": financial_node,
+        "wikipedia": wikipedia_node,
+        "news": news_node,
+        "verification": verification_node,
+        "synthesis": synthesis_node,
+        "save_profile": save_profile_node,
+        "personalized_plan": personalized_plan_generator_node,
+        # Not "generic_plan": node names can't collide with state keys
+        "generic_plan_generator": generic_plan_generator_node,
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, _emit_delta(node, name))
     
     # Set entry point
     workflow.set_entry_point("supervisor")
@@ -72,25 +130,16 @@ def create_research_workflow():
     workflow.add_conditional_edges(
         "supervisor",
         lambda s: s["next_node"],
-        {
-            "web_search": "web_search",
-            "financial": "financial",
-            "wikipedia": "wikipedia",
-            "news": "news",
-            "verification": "verification",
-            "synthesis": "synthesis",
-            "personalized_plan": "personalized_plan",
-            "generic_plan": "generic_plan",
-            "end": END
-        }
+        {**{name: name for name in nodes}, "end": END}
     )
     
     # All nodes return to supervisor for routing
-    for node in ["web_search", "financial", "wikipedia", "news", 
-                 "verification", "synthesis", "personalized_plan", "generic_plan"]:
-        workflow.add_edge(node, "supervisor")
+    for name in nodes:
+        workflow.add_edge(name, "supervisor")
     
-    return workflow.compile()
+    # Each node visit takes several graph steps (node, its edges, supervisor,
+    # supervisor edges), more than langgraph's default limit of 25 allows
+    return workflow.compile().with_config({"recursion_limit": 4 * (len(nodes) + 2)})
 
 
 # Test the workflow
@@ -102,12 +151,13 @@ if __name__ == "__main__":
         print("✅ Workflow created successfully!")
         print("   Phase 2 fully implemented")
         print("\n📊 Workflow Steps:")
+        print("   0. Knowledge Base (reuse fresh research)")
         print("   1. Web Search")
         print("   2. Financial Data")
         print("   3. Wikipedia")
         print("   4. News")
         print("   5. Verification")
-        print("   6. Synthesis")
+        print("   6. Synthesis (then saved to the Knowledge Base)")
         print("   7. Personalized Plan")
         print("   8. Generic Plan (for comparison)")
     except Exception as e: